@@ -0,0 +1,189 @@
+import concurrent.futures
+import json
+import os
+import shutil
+import subprocess
+from dataclasses import dataclass, field
+
+from cache import contentHash
+from expressions import parameterValue
+
+# written next to the fetched pipelines, it has no .json extension so it's never parsed
+MANIFEST_NAME = ".fetch-manifest"
+
+
+@dataclass
+class Factory:
+    Name: str
+    ResourceGroup: str
+    Subscription: str
+
+
+@dataclass
+class RefreshResult:
+    Factory: str
+    Written: list[str] = field(default_factory=list)
+    Unchanged: list[str] = field(default_factory=list)
+    Deleted: list[str] = field(default_factory=list)
+
+
+class AzureCLIFetcher:
+    """
+    Lists pipelines with `az datafactory pipeline list`.
+    """
+
+    def __init__(self):
+        # az is az.cmd on Windows, which is why the original call needed shell=True
+        self.az = shutil.which("az")
+
+    def isAvailable(self) -> bool:
+        return self.az is not None
+
+    def listPipelines(self, factory: Factory) -> list[dict]:
+        pipelines_json = subprocess.run(
+            [
+                self.az,
+                "datafactory",
+                "pipeline",
+                "list",
+                "--factory-name",
+                factory.Name,
+                "--resource-group",
+                factory.ResourceGroup,
+                "--subscription",
+                factory.Subscription,
+                "--output",
+                "json",
+            ],
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout
+        return json.loads(pipelines_json)
+
+
+class DirectoryFetcher:
+    """
+    Stand-in for the Azure CLI, reads <directory>/<factory name>.json
+    which holds what `az datafactory pipeline list` would print.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def isAvailable(self) -> bool:
+        return os.path.isdir(self.directory)
+
+    def listPipelines(self, factory: Factory) -> list[dict]:
+        with open(os.path.join(self.directory, f"{factory.Name}.json"), "r") as file:
+            return json.load(file)
+
+
+def loadManifest(target_dir: str) -> dict[str, dict[str, str]]:
+    manifest_path = os.path.join(target_dir, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path, "r") as manifest_file:
+        return json.load(manifest_file)
+
+
+def refreshFactory(fetcher, factory: Factory, target_dir: str) -> RefreshResult:
+    """
+    Only pipelines whose etag (or content, when there's no etag) changed are rewritten,
+    so file hashes of untouched pipelines stay the same for the incremental cache.
+    Pipelines that were fetched before and are gone from the factory are deleted.
+    """
+    result = RefreshResult(factory.Name)
+    os.makedirs(target_dir, exist_ok=True)
+    manifest = loadManifest(target_dir)
+    current: dict[str, dict[str, str]] = {}
+
+    for pipeline in fetcher.listPipelines(factory):
+        pipeline_name = pipeline["name"]
+        pipeline_json = json.dumps(pipeline, indent=2)
+        entry = {
+            "etag": pipeline.get("etag") or "",
+            "hash": contentHash(pipeline_json),
+        }
+        current[pipeline_name] = entry
+
+        pipeline_path = os.path.join(target_dir, f"{pipeline_name}.json")
+        previous = manifest.get(pipeline_name)
+        if previous is not None and os.path.exists(pipeline_path):
+            same_etag = entry["etag"] != "" and previous["etag"] == entry["etag"]
+            if same_etag or previous["hash"] == entry["hash"]:
+                result.Unchanged.append(pipeline_name)
+                continue
+        with open(pipeline_path, "w") as pipeline_file:
+            pipeline_file.write(pipeline_json)
+        result.Written.append(pipeline_name)
+
+    for pipeline_name in manifest:
+        if pipeline_name not in current:
+            pipeline_path = os.path.join(target_dir, f"{pipeline_name}.json")
+            if os.path.exists(pipeline_path):
+                os.remove(pipeline_path)
+            result.Deleted.append(pipeline_name)
+
+    with open(os.path.join(target_dir, MANIFEST_NAME), "w") as manifest_file:
+        json.dump(current, manifest_file, indent=2)
+    return result
+
+
+def refreshPipelines(
+    fetcher, factories: list[Factory], pipeline_dir: str
+) -> list[RefreshResult]:
+    # a single factory writes straight into pipeline_dir, several get a directory each
+    def targetDir(factory: Factory) -> str:
+        if len(factories) == 1:
+            return pipeline_dir
+        return os.path.join(pipeline_dir, factory.Name)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(factories)) as executor:
+        futures = [
+            executor.submit(refreshFactory, fetcher, factory, targetDir(factory))
+            for factory in factories
+        ]
+        return [future.result() for future in futures]
+
+
+def parseFactories(factories: str) -> list[Factory]:
+    # ADF_FACTORIES="subscription/resource_group/factory_name,subscription/..."
+    parsed = []
+    for factory in factories.split(","):
+        factory = factory.strip()
+        if factory == "":
+            continue
+        subscription, resource_group, name = factory.split("/")
+        parsed.append(Factory(name, resource_group, subscription))
+    return parsed
+
+
+def loadGlobalParameters(path: str) -> dict[str, str]:
+    """
+    The global parameters of a factory, from its JSON as ADF exports it or
+    `az datafactory show` prints it: properties.globalParameters with a type and value each.
+    Values that aren't strings, numbers or booleans are left out.
+    """
+    with open(path, "r") as factory_file:
+        factory = json.load(factory_file)
+    properties = factory.get("properties") or factory
+    global_parameters = {}
+    for name, parameter in (properties.get("globalParameters") or {}).items():
+        value = parameterValue((parameter or {}).get("value"))
+        if value is not None:
+            global_parameters[name] = value
+    return global_parameters
+
+
+def listPipelineFiles(pipeline_dir: str) -> list[str]:
+    # pipelines from several factories live in subdirectories
+    pipeline_paths = []
+    for directory, subdirectories, files in os.walk(pipeline_dir):
+        subdirectories[:] = sorted(
+            name for name in subdirectories if not name.startswith(".")
+        )
+        for file_name in sorted(files):
+            if file_name.endswith(".json") and not file_name.startswith("."):
+                pipeline_paths.append(os.path.join(directory, file_name))
+    return pipeline_paths
@@ -0,0 +1,197 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import asdict, replace
+
+from generate import GeneratorConfig, generate
+
+# Each size scales the defaults of GeneratorConfig
+SIZES = {
+    "small": 0.1,
+    "medium": 1,
+    "large": 10,
+}
+SCALED_FIELDS = ("Tables", "Views", "StoredProcedures", "Pipelines")
+
+STAGES = [
+    "countReferences",
+    "analyzePipelines",
+    "createReport",
+    "exportImagesAndTreeStructures",
+]
+
+RESULTS_FILE = os.path.join("benchmarks", "results.jsonl")
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def sizeConfig(size: str, seed: int) -> GeneratorConfig:
+    scale = SIZES[size]
+    config = GeneratorConfig(Seed=seed)
+    scaled = {
+        name: max(1, int(getattr(config, name) * scale)) for name in SCALED_FIELDS
+    }
+    return replace(config, **scaled)
+
+
+def runStages(workdir: str, export: bool, use_cache: bool) -> dict:
+    """
+    Runs in a fresh interpreter so nothing one size imported or cached leaks into the next.
+    Peak memory is what tracemalloc sees in this process, pipeline parsing workers and
+    the Mermaid renderer aren't included.
+    """
+    os.chdir(workdir)
+    os.environ.update(
+        {
+            "MSSQL_SERVER_DATA_DIR": os.path.join("data", "MSSQL"),
+            "PIPELINE_DIR": os.path.join("data", "pipelines"),
+            "OUTPUT_DIR": "benchmark",
+            "CACHE": "True" if use_cache else "False",
+            "CACHE_DIR": "cache",
+        }
+    )
+    from engine import Engine, configFromEnvironment
+
+    engine = Engine(configFromEnvironment())
+
+    stages = {}
+    tracemalloc.start()
+    for stage in STAGES:
+        if stage == "exportImagesAndTreeStructures" and not export:
+            continue
+        tracemalloc.reset_peak()
+        start = time.perf_counter()
+        getattr(engine, stage)()
+        seconds = time.perf_counter() - start
+        stages[stage] = {
+            "seconds": round(seconds, 4),
+            "peak_bytes": tracemalloc.get_traced_memory()[1],
+        }
+    tracemalloc.stop()
+    engine.cache.save()
+    return stages
+
+
+def runSize(
+    size: str, seed: int, workdir: str, export: bool, warm: bool
+) -> dict[str, dict]:
+    config = sizeConfig(size, seed)
+    start = time.perf_counter()
+    generate(config, os.path.join(workdir, "data"))
+    print(f"{size}: generated in {time.perf_counter() - start:.2f}s")
+    shutil.copy(os.path.join(REPO_DIR, "mermaid-config.json"), workdir)
+
+    runs = {}
+    for mode in ("cold", "warm") if warm else ("cold",):
+        metrics_file = os.path.join(workdir, f"{mode}-metrics.json")
+        command = [
+            sys.executable,
+            os.path.abspath(__file__),
+            "--stage-run",
+            workdir,
+            "--metrics",
+            metrics_file,
+        ]
+        if export:
+            command.append("--export")
+        if warm:  # the cold run fills the cache the warm run reads
+            command.append("--cache")
+        # report.py prints a line per object, only the metrics are interesting here
+        env = dict(os.environ, PYTHONPATH=REPO_DIR)
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL, env=env)
+        with open(metrics_file, "r") as file:
+            runs[mode] = json.load(file)
+    return {"config": asdict(config), "runs": runs}
+
+
+def gitRevision() -> str:
+    completed = subprocess.run(
+        ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True
+    )
+    return completed.stdout.strip() if completed.returncode == 0 else ""
+
+
+def previousResult(results_file: str, size: str, config: dict) -> dict | None:
+    if not os.path.exists(results_file):
+        return None
+    previous = None
+    with open(results_file, "r") as file:
+        for line in file:
+            result = json.loads(line)
+            if result["size"] == size and result["config"] == config:
+                previous = result
+    return previous
+
+
+def printResult(result: dict, previous: dict | None):
+    for mode, stages in result["runs"].items():
+        for stage, metrics in stages.items():
+            line = (
+                f"{result['size']:>6} {mode:>4} {stage:<30}"
+                f" {metrics['seconds']:>9.3f}s {metrics['peak_bytes'] / 2**20:>9.1f} MiB"
+            )
+            before = (previous or {}).get("runs", {}).get(mode, {}).get(stage)
+            if before is not None and before["seconds"] > 0:
+                change = metrics["seconds"] / before["seconds"] - 1
+                line += f"  {change:+.0%} vs {previous['revision'] or 'previous'}"
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time each report.py stage against generated data of several sizes"
+    )
+    parser.add_argument("--sizes", default="small,medium", help=",".join(SIZES))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--results", default=RESULTS_FILE)
+    parser.add_argument(
+        "--export", action="store_true", help="include the PDF/JSON export stage"
+    )
+    parser.add_argument(
+        "--warm", action="store_true", help="run again with the cache of the first run"
+    )
+    parser.add_argument("--keep", action="store_true", help="keep the generated data")
+    parser.add_argument("--stage-run", help=argparse.SUPPRESS)
+    parser.add_argument("--cache", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--metrics", help=argparse.SUPPRESS)
+    arguments = parser.parse_args()
+
+    if arguments.stage_run is not None:
+        stages = runStages(arguments.stage_run, arguments.export, arguments.cache)
+        with open(arguments.metrics, "w") as file:
+            json.dump(stages, file)
+        return
+
+    revision = gitRevision()
+    for size in arguments.sizes.split(","):
+        workdir = tempfile.mkdtemp(prefix=f"benchmark-{size}-")
+        try:
+            result = {
+                "size": size,
+                "revision": revision,
+                "python": platform.python_version(),
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                **runSize(
+                    size, arguments.seed, workdir, arguments.export, arguments.warm
+                ),
+            }
+        finally:
+            if arguments.keep:
+                print(f"{size}: data kept in {workdir}")
+            else:
+                shutil.rmtree(workdir, ignore_errors=True)
+        printResult(result, previousResult(arguments.results, size, result["config"]))
+
+        os.makedirs(os.path.dirname(arguments.results) or ".", exist_ok=True)
+        with open(arguments.results, "a") as results_file:
+            results_file.write(json.dumps(result) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+import hashlib
+import json
+import os
+from dataclasses import asdict
+
+from pipelines import PipelineResult
+
+CACHE_VERSION = 5
+
+
+def contentHash(*parts: str | bytes) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        digest.update(part.encode() if isinstance(part, str) else part)
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class RunCache:
+    """
+    On-disk cache for incremental runs.
+    - definitions: hash of a view/procedure definition -> names the tokenizer extracted from it.
+      Names aren't resolved against the catalog, so these entries never go stale.
+    - pipelines: hash of a pipeline file -> PipelineResult. Results are resolved against the
+      catalog, so they're dropped whenever the table/view/procedure name set changes.
+    - outputs: report or diagram -> fingerprint of the inputs it was generated from.
+      Also dropped when the name set changes, so everything is regenerated.
+    - output_files: files an output wrote that its caller can't know beforehand, ex. the
+      part diagrams of a pipeline, checked by isCurrent() like the ones it's given.
+    Entries that weren't used by this run are pruned on save.
+    Without a path nothing is stored or loaded and every output is regenerated, unless
+    keep_in_memory is set, then the cache lives as long as the process.
+    """
+
+    def __init__(self, path: str | None, keep_in_memory: bool = False):
+        self.path = path
+        self.enabled = path is not None or keep_in_memory
+        self.catalog = ""
+        self.definitions: dict[str, list] = {}
+        self.pipelines: dict[str, dict] = {}
+        self.outputs: dict[str, str] = {}
+        self.output_files: dict[str, list[str]] = {}
+        self.used_definitions: set[str] = set()
+        self.used_pipelines: set[str] = set()
+        self.hits = 0
+        self.misses = 0
+        if path is not None and os.path.exists(path):
+            with open(path, "r") as cache_file:
+                try:
+                    stored = json.load(cache_file)
+                except json.JSONDecodeError:
+                    stored = {}
+            if stored.get("version") == CACHE_VERSION:
+                self.catalog = stored["catalog"]
+                self.definitions = stored["definitions"]
+                self.pipelines = stored["pipelines"]
+                self.outputs = stored["outputs"]
+                self.output_files = stored["output_files"]
+
+    def definitionNames(
+        self, definition: str, extract
+    ) -> tuple[str, dict[tuple[str, ...], int]]:
+        definition_hash = contentHash(definition)
+        self.used_definitions.add(definition_hash)
+        cached = self.definitions.get(definition_hash)
+        if cached is not None:
+            self.hits += 1
+            return definition_hash, {tuple(parts): count for parts, count in cached}
+        self.misses += 1
+        names = extract(definition)
+        if self.enabled:
+            self.definitions[definition_hash] = [
+                [list(parts), count] for parts, count in names.items()
+            ]
+        return definition_hash, names
+
+    def setCatalog(self, names) -> bool:
+        # Invalidation rule: pipeline results and outputs depend on which names exist
+        catalog = contentHash(*sorted(names))
+        changed = catalog != self.catalog
+        if changed:
+            if self.catalog != "":
+                print("Catalog names changed, cached pipelines and outputs invalidated")
+            self.catalog = catalog
+            self.pipelines = {}
+            self.outputs = {}
+            self.output_files = {}
+        return changed
+
+    def pipelineResult(self, file_hash: str) -> PipelineResult | None:
+        self.used_pipelines.add(file_hash)
+        cached = self.pipelines.get(file_hash)
+        if cached is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return PipelineResult(**cached)
+
+    def storePipelineResult(self, file_hash: str, result: PipelineResult):
+        if self.enabled:
+            self.pipelines[file_hash] = asdict(result)
+
+    def isCurrent(self, output: str, fingerprint: str, files: list[str]) -> bool:
+        return (
+            self.enabled
+            and self.outputs.get(output) == fingerprint
+            and all(os.path.exists(file) for file in files)
+            and all(os.path.exists(file) for file in self.output_files.get(output, []))
+        )
+
+    def markOutput(self, output: str, fingerprint: str, files: list[str] | None = None):
+        self.outputs[output] = fingerprint
+        if files:
+            self.output_files[output] = list(files)
+        else:
+            self.output_files.pop(output, None)
+
+    def startRun(self, reads_catalog: bool = True):
+        """
+        Another run in the same process, only what it uses is kept on save, so the entries
+        of edited and deleted files don't pile up. A run that doesn't read the catalog
+        again still uses the definitions of the last one that did.
+        """
+        self.hits = 0
+        self.misses = 0
+        self.used_pipelines.clear()
+        if reads_catalog:
+            self.used_definitions.clear()
+
+    def save(self):
+        self.definitions = {
+            key: value
+            for key, value in self.definitions.items()
+            if key in self.used_definitions
+        }
+        self.pipelines = {
+            key: value
+            for key, value in self.pipelines.items()
+            if key in self.used_pipelines
+        }
+        if self.path is None:
+            return
+        stored = {
+            "version": CACHE_VERSION,
+            "catalog": self.catalog,
+            "definitions": self.definitions,
+            "pipelines": self.pipelines,
+            "outputs": self.outputs,
+            "output_files": self.output_files,
+        }
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        temporary_path = self.path + ".tmp"
+        with open(temporary_path, "w") as cache_file:
+            json.dump(stored, cache_file)
+        os.replace(temporary_path, self.path)
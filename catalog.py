@@ -0,0 +1,151 @@
+import csv
+import locale
+import sys
+from typing import Iterator
+
+from errors import EngineError
+
+# SSMS "Copy with Headers" puts this row first, it isn't an object
+HEADER_DEFINITION = "definition"
+
+# same queries as queries.sql
+TABLES_QUERY = """
+SELECT SCHEMA_NAME(schema_id) + '.' + name FROM sys.tables ORDER BY schema_id, name
+"""
+
+VIEWS_QUERY = """
+SELECT SCHEMA_NAME(schema_id) + '.' + name, definition FROM sys.views v
+INNER JOIN sys.sql_modules m
+ON v.object_id = m.object_id
+WHERE v.schema_id != 4 -- Exclude sys schema
+ORDER BY schema_id, name
+"""
+
+STORED_PROCEDURES_QUERY = """
+SELECT SCHEMA_NAME(schema_id) + '.' + name, definition FROM sys.procedures p
+INNER JOIN sys.sql_modules m
+ON p.object_id = m.object_id
+WHERE p.schema_id != 4 -- Exclude sys schema
+ORDER BY schema_id, name
+"""
+
+# the server's own dependency tracking, one row per referencing object and referenced entity
+DEPENDENCIES_QUERY = """
+SELECT OBJECT_SCHEMA_NAME(d.referencing_id) + '.' + OBJECT_NAME(d.referencing_id),
+    COALESCE(d.referenced_schema_name, ''), d.referenced_entity_name
+FROM sys.sql_expression_dependencies d
+INNER JOIN sys.objects o
+ON o.object_id = d.referencing_id
+WHERE d.referencing_class = 1 AND o.type IN ('V', 'P')
+"""
+
+
+def raiseFieldSizeLimit():
+    # generated procedures are far bigger than csv's 128KB default field limit
+    limit = sys.maxsize
+    while True:
+        try:
+            csv.field_size_limit(limit)
+            return
+        except OverflowError:  # C long is 32 bits on Windows
+            limit //= 2
+
+
+def iterTables(path: str) -> Iterator[str]:
+    with open(path, "r") as tables_file:
+        for line in tables_file:
+            table_name = line.strip()
+            if table_name != "":
+                yield table_name
+
+
+def definitionsEncoding() -> str:
+    # what open() reads the exports with, the byte offsets are counted in it too
+    return locale.getpreferredencoding(False)
+
+
+def iterDefinitions(path: str) -> Iterator[tuple[str, str, int, int]]:
+    """
+    Yield (name, definition, offset, length) one row at a time, offset and length are the
+    bytes of the row in the file, so the definition can be read again later without
+    keeping it, see definitions.py.
+    The caller is expected to keep what it extracts and drop the definition text,
+    so memory stays proportional to the number of objects, not the size of the export.
+    """
+    raiseFieldSizeLimit()
+    encoding = definitionsEncoding()
+    position = 0
+
+    def lines(definitions_file) -> Iterator[str]:
+        # csv reads a line at a time and only as many as the row needs, so position is
+        # always where the next row starts once a row has been returned
+        nonlocal position
+        for line in definitions_file:
+            position += len(line.encode(encoding))
+            yield line
+
+    with open(path, "r", newline="", encoding=encoding) as definitions_file:
+        reader = csv.reader(lines(definitions_file), delimiter="\t")
+        start = 0
+        for line_number, row in enumerate(reader):
+            offset, start = start, position
+            if len(row) < 2:
+                continue
+            if line_number == 0 and row[1].strip().lower() == HEADER_DEFINITION:
+                continue
+            yield row[0], row[1], offset, position - offset
+
+
+def connect(connection_string: str):
+    try:
+        import pyodbc
+    except ImportError:
+        raise EngineError(
+            "pyodbc is needed to read the catalog from SQL Server: pip install pyodbc"
+        )
+    return pyodbc.connect(connection_string, readonly=True)
+
+
+def iterQuery(connection, query: str, batch_size: int) -> Iterator[tuple]:
+    """
+    Works with any DB-API connection, rows are fetched in batches of batch_size.
+    """
+    cursor = connection.cursor()
+    try:
+        cursor.execute(query)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        cursor.close()
+
+
+def iterDatabaseTables(connection, batch_size: int) -> Iterator[str]:
+    for row in iterQuery(connection, TABLES_QUERY, batch_size):
+        yield row[0]
+
+
+def iterDatabaseDefinitions(
+    connection, query: str, batch_size: int
+) -> Iterator[tuple[str, str]]:
+    for name, definition in iterQuery(connection, query, batch_size):
+        # definition is NULL for encrypted modules
+        yield name, definition or ""
+
+
+def fetchDependencies(
+    connection, batch_size: int
+) -> dict[str, dict[tuple[str, ...], int]]:
+    """
+    Referenced names per lowercased referencing object, in the shape extractNames() returns.
+    The server records each reference once, so every count is 1.
+    """
+    dependencies: dict[str, dict[tuple[str, ...], int]] = {}
+    for referencing, schema, entity in iterQuery(
+        connection, DEPENDENCIES_QUERY, batch_size
+    ):
+        names = dependencies.setdefault(referencing.lower(), {})
+        names[(schema.lower(), entity.lower())] = 1
+    return dependencies
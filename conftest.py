@@ -0,0 +1 @@
+# lets the tests import the modules of the repository root, ex. `from catalog import ...`
@@ -0,0 +1,334 @@
+import argparse
+import csv
+import io
+import json
+import mmap
+import os
+import re
+import threading
+from array import array
+from bisect import bisect_right
+from dataclasses import dataclass
+from typing import Iterable, Iterator
+
+from dotenv import load_dotenv
+
+from catalog import raiseFieldSizeLimit
+from graph import STORED_PROCEDURE, VIEW
+from tsql import DOT, iterNames, qualifiedCandidates, tokenize
+
+DEFINITIONS_NAME = "definition-offsets.json"
+DEFINITIONS_VERSION = 1
+SNIPPET_CONTEXT = 2  # lines shown before and after a reference
+DEFINITION_KINDS = (VIEW, STORED_PROCEDURE)
+
+
+@dataclass
+class Snippet:
+    FirstLine: int  # 1 based line number of Lines[0] in the definition
+    Lines: list[str]
+    ReferenceLines: list[int]  # line numbers of the references the snippet is shown for
+
+
+class DefinitionStore:
+    """
+    Where every view and stored procedure definition is instead of the definition itself:
+    the byte offset and length of its row in the file it was read from, by node ID. A
+    definition is read through a memory map of its file only when it's asked for, so the
+    store costs 16 bytes per definition however long the definitions are.
+    The maps are opened on first use and shared, reading them is safe from several threads.
+    """
+
+    def __init__(self):
+        self.files: dict[str, str] = {}
+        self.encodings: dict[str, str] = {}
+        self.offsets: dict[str, array] = {}
+        self.lengths: dict[str, array] = {}
+        self.maps: dict[str, mmap.mmap] = {}
+        self.lock = threading.Lock()
+
+    def setFile(self, kind: str, path: str, encoding: str):
+        self.files[kind] = os.path.abspath(path)
+        self.encodings[kind] = encoding
+        self.offsets[kind] = array("q")
+        self.lengths[kind] = array("q")
+
+    def add(self, kind: str, node_id: int, offset: int, length: int):
+        offsets, lengths = self.offsets[kind], self.lengths[kind]
+        while len(offsets) <= node_id:
+            offsets.append(-1)  # no definition, ex. a procedure only a pipeline names
+            lengths.append(0)
+        # a name read twice keeps its last definition, like its hash in the graph
+        offsets[node_id] = offset
+        lengths[node_id] = length
+
+    def map(self, kind: str) -> mmap.mmap:
+        with self.lock:
+            mapped = self.maps.get(kind)
+            if mapped is None:
+                with open(self.files[kind], "rb") as file:
+                    mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+                self.maps[kind] = mapped
+            return mapped
+
+    def definition(self, kind: str, node_id: int) -> str | None:
+        offsets = self.offsets.get(kind)
+        if offsets is None or node_id >= len(offsets) or offsets[node_id] < 0:
+            return None
+        offset, length = offsets[node_id], self.lengths[kind][node_id]
+        row_text = self.map(kind)[offset : offset + length].decode(self.encodings[kind])
+        raiseFieldSizeLimit()
+        for row in csv.reader(io.StringIO(row_text, newline=""), delimiter="\t"):
+            return row[1] if len(row) >= 2 else None
+        return None
+
+    def snippets(
+        self,
+        kind: str,
+        node_id: int,
+        referenced: str,
+        context: int = SNIPPET_CONTEXT,
+    ) -> list[Snippet]:
+        # where the definition of kind/node_id names referenced, ex. a table it reads
+        definition = self.definition(kind, node_id)
+        if definition is None:
+            return []
+        return definitionSnippets(definition, referenced, context)
+
+    def write(self, names: dict[str, list[str]], path: str):
+        """
+        Write the offsets with the names of their objects and the size and modification
+        time of the files they point into, so definitions.py can tell when a file changed
+        after the run. Swapped in like writeIndex().
+        """
+        objects = {}
+        for kind, file_path in self.files.items():
+            status = os.stat(file_path)
+            objects[kind] = {
+                "file": file_path,
+                "encoding": self.encodings[kind],
+                "size": status.st_size,
+                "mtime_ns": status.st_mtime_ns,
+                "names": names[kind][: len(self.offsets[kind])],
+                "offsets": self.offsets[kind].tolist(),
+                "lengths": self.lengths[kind].tolist(),
+            }
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        temporary_path = path + ".tmp"
+        with open(temporary_path, "w") as file:
+            json.dump(
+                {"version": DEFINITIONS_VERSION, "objects": objects},
+                file,
+                separators=(",", ":"),
+            )
+        os.replace(temporary_path, path)
+
+    def close(self):
+        with self.lock:
+            for mapped in self.maps.values():
+                mapped.close()
+            self.maps = {}
+
+
+def loadDefinitionStore(path: str) -> tuple[DefinitionStore, dict[str, list[str]]]:
+    # the store a run wrote and the names of its objects by kind
+    if os.path.isdir(path):
+        path = os.path.join(path, DEFINITIONS_NAME)
+    with open(path, "r") as file:
+        data = json.load(file)
+    if data.get("version") != DEFINITIONS_VERSION:
+        raise ValueError(
+            f"{path} is version {data.get('version')}, expected {DEFINITIONS_VERSION}"
+        )
+    store = DefinitionStore()
+    names = {}
+    for kind, values in data["objects"].items():
+        file_path = values["file"]
+        status = os.stat(file_path)
+        if (status.st_size, status.st_mtime_ns) != (values["size"], values["mtime_ns"]):
+            raise ValueError(f"{file_path} changed since the run, run report.py again")
+        store.files[kind] = file_path
+        store.encodings[kind] = values["encoding"]
+        store.offsets[kind] = array("q", values["offsets"])
+        store.lengths[kind] = array("q", values["lengths"])
+        names[kind] = values["names"]
+    return store, names
+
+
+def spoolDefinitions(
+    definitions: Iterable[tuple[str, str]], path: str, encoding: str = "utf-8"
+) -> Iterator[tuple[str, str, int, int]]:
+    """
+    Pass (name, definition) rows on with their offset and length in path, where they're
+    written in the layout of an SSMS export as they go by. Definitions read from the server
+    can then be looked up later like the ones of a CSV export.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter="\t", lineterminator="\n")
+    offset = 0
+    with open(path, "wb") as file:
+        for name, definition in definitions:
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerow((name, definition))
+            row = buffer.getvalue().encode(encoding)
+            file.write(row)
+            yield name, definition, offset, len(row)
+            offset += len(row)
+
+
+def referenceLines(definition: str, referenced: str) -> list[int]:
+    """
+    1 based line numbers of the names in the definition that can read as referenced, the
+    same candidates NameMatcher tries.
+    """
+    target = referenced.lower()
+    line_starts = [match.end() for match in re.finditer("\n", definition)]
+    return sorted(
+        {
+            bisect_right(line_starts, position) + 1
+            for parts, position in iterNames(definition)
+            if target in qualifiedCandidates(parts)
+        }
+    )
+
+
+def definitionSnippets(
+    definition: str, referenced: str, context: int = SNIPPET_CONTEXT
+) -> list[Snippet]:
+    # references whose context lines touch or overlap share a snippet
+    lines = [line.removesuffix("\r") for line in definition.split("\n")]
+    snippets: list[Snippet] = []
+    for line_number in referenceLines(definition, referenced):
+        first = max(1, line_number - context)
+        last = min(len(lines), line_number + context)
+        if snippets and first <= snippets[-1].FirstLine + len(snippets[-1].Lines):
+            previous = snippets[-1]
+            previous_last = previous.FirstLine + len(previous.Lines) - 1
+            previous.Lines.extend(lines[previous_last:last])
+            previous.ReferenceLines.append(line_number)
+            continue
+        snippets.append(Snippet(first, lines[first - 1 : last], [line_number]))
+    return snippets
+
+
+def snippetJSON(snippet: Snippet) -> dict:
+    return {
+        "first_line": snippet.FirstLine,
+        "lines": snippet.Lines,
+        "reference_lines": snippet.ReferenceLines,
+    }
+
+
+def findObject(names: dict[str, list[str]], text: str) -> list[tuple[str, int, str]]:
+    # "X", "dbo.X" and "[dbo].[X]" all find dbo.X, like index.py
+    parts = tuple(value.lower() for kind, value, _ in tokenize(text) if kind != DOT)
+    candidates = set(qualifiedCandidates(parts)) | {text.strip().lower()}
+    return [
+        (kind, node_id, name)
+        for kind in DEFINITION_KINDS
+        for node_id, name in enumerate(names.get(kind, []))
+        if name.lower() in candidates
+    ]
+
+
+def printSnippets(snippets: list[Snippet]):
+    width = len(str(max(s.FirstLine + len(s.Lines) - 1 for s in snippets)))
+    for snippet in snippets:
+        for line_number, line in enumerate(snippet.Lines, snippet.FirstLine):
+            marker = ">" if line_number in snippet.ReferenceLines else " "
+            print(f"{marker}{line_number:>{width}}  {line}")
+        print()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Show where a view or stored procedure references an object, "
+        "read from the catalog files of the last report.py run"
+    )
+    parser.add_argument(
+        "name", help="the view or stored procedure, ex. dbo.Load_Orders"
+    )
+    parser.add_argument(
+        "referenced",
+        nargs="?",
+        help="the table, view or procedure it references, "
+        "without it the whole definition is printed",
+    )
+    parser.add_argument(
+        "--context",
+        type=int,
+        default=SNIPPET_CONTEXT,
+        help="lines shown before and after every reference",
+    )
+    parser.add_argument(
+        "--offsets", help=f"defaults to reports/$OUTPUT_DIR/{DEFINITIONS_NAME}"
+    )
+    parser.add_argument("--json", action="store_true")
+    arguments = parser.parse_args()
+
+    offsets_path = arguments.offsets
+    if offsets_path is None:
+        load_dotenv()
+        offsets_path = os.path.join(
+            "reports", os.getenv("OUTPUT_DIR") or "", DEFINITIONS_NAME
+        )
+    try:
+        store, names = loadDefinitionStore(offsets_path)
+    except (OSError, ValueError) as error:
+        print(error)
+        exit(1)
+
+    try:
+        objects = findObject(names, arguments.name)
+        if not objects:
+            print(f"{arguments.name} is not a view or stored procedure of the run")
+            exit(1)
+        results = []
+        for kind, node_id, name in objects:
+            definition = store.definition(kind, node_id) or ""
+            if arguments.referenced is None:
+                lines = definition.split("\n")
+                snippets = [Snippet(1, [line.removesuffix("\r") for line in lines], [])]
+            else:
+                snippets = definitionSnippets(
+                    definition, arguments.referenced, arguments.context
+                )
+            results.append((kind, name, snippets))
+    finally:
+        store.close()
+
+    if arguments.json:
+        print(
+            json.dumps(
+                [
+                    {
+                        "kind": kind,
+                        "name": name,
+                        "snippets": [snippetJSON(snippet) for snippet in snippets],
+                    }
+                    for kind, name, snippets in results
+                ],
+                indent=2,
+            )
+        )
+        return
+    for kind, name, snippets in results:
+        if arguments.referenced is None:
+            print(f"{kind} {name}:")
+        else:
+            lines = [str(line) for s in snippets for line in s.ReferenceLines]
+            if lines:
+                print(
+                    f"{kind} {name} names {arguments.referenced} on line"
+                    f" {', '.join(lines)}"
+                )
+            else:
+                print(f"{kind} {name} doesn't name {arguments.referenced}")
+        if snippets:
+            printSnippets(snippets)
+
+
+if __name__ == "__main__":
+    main()
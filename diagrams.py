@@ -0,0 +1,179 @@
+from collections import deque
+from dataclasses import dataclass
+
+from graph import CIRCULAR_GROUP, GROUPS, PIPELINE, RELATIONS, DependencyGraph
+
+# (group, child kind, child ID, reference count, circular)
+Reference = tuple
+
+
+@dataclass
+class DiagramLimits:
+    """
+    Mermaid render time grows much faster than linearly with the size of the diagram,
+    so every diagram stays under these limits. MaxEdges has to stay below maxEdges in
+    mermaid-config.json.
+    """
+
+    MaxNodes: int = 300
+    MaxEdges: int = 900
+    MaxDepth: int = 8  # object levels below the root of a diagram
+
+
+@dataclass
+class Diagram:
+    Name: str  # file name without extension, "<pipeline>" or "<pipeline>.part2"
+    Lines: list[str]
+    Nodes: int
+    Edges: int
+
+
+def label(text: str) -> str:
+    return '"' + text.replace('"', "#quot;") + '"'
+
+
+def edgeLabel(group: str, count: int) -> str:
+    return group if count == 1 else f"{group} x{count}"
+
+
+def references(graph: DependencyGraph, kind: str, node_id: int) -> list[Reference]:
+    found = []
+    for group in GROUPS[kind]:
+        child_kind = RELATIONS[(kind, group)]
+        for child, count in graph.children(kind, node_id, group):
+            circular = child_kind == kind and graph.isCircular(kind, node_id, child)
+            found.append((group, child_kind, child, count, circular))
+    return found
+
+
+class MermaidBuilder:
+    """
+    Turns the dependency graph below one pipeline into one or more Mermaid flowcharts.
+    Every object is a single vertex per diagram however many objects reference it, and the
+    group ("Tables", "Stored Procedures", ...) is the label of the edge.
+    An object deeper than MaxDepth isn't expanded, dependent pipelines point to their own
+    diagram and anything else is continued in a part diagram. Once a diagram is full, the
+    references still to draw are collapsed into one "more" vertex per object and continued
+    in a part diagram too, so no diagram is bigger than the limits.
+    """
+
+    def __init__(self, graph: DependencyGraph, limits: DiagramLimits):
+        self.graph = graph
+        self.limits = DiagramLimits(
+            max(3, limits.MaxNodes), max(3, limits.MaxEdges), max(1, limits.MaxDepth)
+        )
+
+    def build(self, kind: str, node_id: int) -> list[Diagram]:
+        name = self.graph.name(kind, node_id)
+        # part roots, (kind, ID) and the references to draw under it, None for all of them
+        self.parts: list[tuple[tuple, tuple | None]] = [((kind, node_id), None)]
+        self.part_indexes: dict[tuple, int] = {}
+        diagrams = []
+        index = 0
+        while index < len(self.parts):
+            part_name = name if index == 0 else self.partName(name, index)
+            diagrams.append(self.buildPart(name, part_name, *self.parts[index]))
+            index += 1
+        return diagrams
+
+    def partName(self, name: str, index: int) -> str:
+        return f"{name}.part{index + 1}"
+
+    def continueIn(self, item: tuple, pending: tuple | None) -> int:
+        key = (item, pending)
+        if key not in self.part_indexes:
+            self.part_indexes[key] = len(self.parts)
+            self.parts.append(key)
+        return self.part_indexes[key]
+
+    def buildPart(
+        self, name: str, part_name: str, root: tuple, pending: tuple | None
+    ) -> Diagram:
+        graph = self.graph
+        limits = self.limits
+        lines = ["graph TD"]
+        vertices: dict[tuple, str] = {}
+        edges = 0
+        # objects with references left to draw, and those references
+        overflow: dict[tuple, list[Reference]] = {}
+        drawn: set[tuple] = set()  # objects with at least one reference drawn
+
+        def addVertex(item: tuple, text: str, style: str = "") -> str:
+            vertex = f"N{len(vertices)}"
+            vertices[item] = vertex
+            lines.append(vertex + "[" + label(text) + "]" + style)
+            return vertex
+
+        def fits(item: tuple, new_vertices: int, new_references: bool) -> bool:
+            # every object with references not drawn yet keeps room for a "more" vertex and edge
+            reserved = len(overflow) + len(queue) + (0 if item in overflow else 1)
+            reserved += 1 if new_references else 0
+            return (
+                len(vertices) + new_vertices + reserved <= limits.MaxNodes
+                and edges + 1 + reserved <= limits.MaxEdges
+            )
+
+        root_text = graph.name(*root)
+        if part_name != name:
+            root_text += f" (continued from {name})"
+        addVertex(root, root_text, ":::root")
+        queue = deque([(root, 0, pending)])
+        while queue:
+            item, depth, item_references = queue.popleft()
+            if item_references is None:
+                item_references = references(graph, *item)
+            for reference in item_references:
+                group, child_kind, child, count, circular = reference
+                child_item = (child_kind, child)
+                new_vertex = child_item not in vertices
+                child_references = []
+                if new_vertex and not circular and not graph.isMissing(*child_item):
+                    child_references = references(graph, child_kind, child)
+                # below MaxDepth the child's references are all left for another diagram
+                cut = depth + 1 >= limits.MaxDepth and len(child_references) > 0
+                if not fits(item, 1 if new_vertex else 0, len(child_references) > 0):
+                    overflow.setdefault(item, []).append(reference)
+                    continue
+                if new_vertex:
+                    child_name = graph.name(child_kind, child)
+                    if graph.isMissing(child_kind, child):
+                        addVertex(
+                            child_item, f"{child_name} (nonexistent)", ":::missing"
+                        )
+                    elif circular:
+                        addVertex(child_item, child_name, ":::linked")
+                    else:
+                        addVertex(child_item, child_name)
+                    if cut:
+                        overflow[child_item] = child_references
+                    elif len(child_references) > 0:
+                        queue.append((child_item, depth + 1, child_references))
+                arrow = "-.->" if circular else "-->"
+                text = edgeLabel(CIRCULAR_GROUP if circular else group, count)
+                lines.append(
+                    f"{vertices[item]} {arrow}|{label(text)}| {vertices[child_item]}"
+                )
+                edges += 1
+                drawn.add(item)
+
+        more = 0
+        for item, item_references in overflow.items():
+            if item[0] == PIPELINE and item != root and item not in drawn:
+                # a dependent pipeline that wasn't expanded at all has a diagram of its own
+                text = f"{len(item_references)} references, see {graph.name(*item)}"
+            else:
+                index = self.continueIn(item, tuple(item_references))
+                continued = self.partName(name, index)
+                text = f"{len(item_references)} more references, see {continued}"
+            lines.append(f"M{more}[{label(text)}]:::more")
+            lines.append(f"{vertices[item]} -.- M{more}")
+            more += 1
+            edges += 1
+
+        lines += [
+            "classDef root stroke-width:3px",
+            "classDef missing stroke:#c00,stroke-dasharray:4",
+            "classDef linked stroke-dasharray:4",
+            "classDef more fill:#eee,stroke-dasharray:2",
+        ]
+        return Diagram(part_name, lines, len(vertices) + more, edges)
@@ -0,0 +1,1166 @@
+import concurrent.futures
+import json
+import os
+import pprint
+import shutil
+import subprocess
+import threading
+import time
+from array import array
+from dataclasses import dataclass, field
+from typing import Iterable, Mapping
+
+from adf import (
+    AzureCLIFetcher,
+    DirectoryFetcher,
+    Factory,
+    listPipelineFiles,
+    loadGlobalParameters,
+    parseFactories,
+    refreshPipelines,
+)
+from cache import RunCache, contentHash
+from catalog import (
+    STORED_PROCEDURES_QUERY,
+    VIEWS_QUERY,
+    connect,
+    definitionsEncoding,
+    fetchDependencies,
+    iterDatabaseDefinitions,
+    iterDatabaseTables,
+    iterDefinitions,
+    iterTables,
+)
+from definitions import DEFINITIONS_NAME, DefinitionStore, snippetJSON, spoolDefinitions
+from diagrams import Diagram, DiagramLimits, MermaidBuilder
+from errors import EngineError
+from exporters import JSON_FORMATS, saveJSON
+from graph import (
+    DATAFLOW,
+    PIPELINE,
+    RELATIONS,
+    STORED_PROCEDURE,
+    TABLE,
+    VIEW,
+    DependencyGraph,
+    PipelineResolution,
+    resolvePipelineOrder,
+)
+from index import INDEX_NAME, writeIndex
+from matcher import NameIndex, NameIndexes, NameMatcher
+from metrics import RunMetrics
+from pipelines import (
+    PipelineCatalog,
+    PipelineResult,
+    initWorker,
+    parsePipelineFile,
+    passParameters,
+)
+from renderer import MermaidRenderer, RenderResult, startRenderer
+from reports import (
+    REPORT_FILES,
+    REPORT_FORMATS,
+    REPORT_TITLES,
+    reportFiles,
+    writeReport,
+)
+from snapshot import SNAPSHOT_NAME, writeSnapshot
+from stages import StageScheduler, StageStats
+from tsql import extractNames
+from watch import PollingWatcher
+
+
+@dataclass
+class Config:
+    """
+    Everything one analysis reads from the environment, see configFromEnvironment().
+    Outputs go to reports/<OutputDir>, images/<OutputDir> and debug/<OutputDir>, so
+    analyses running side by side need different OutputDir values.
+    """
+
+    OutputDir: str
+    PipelineDir: str
+    MssqlSource: str = "csv"  # "csv" or "database"
+    MssqlDataDir: str = ""
+    MssqlConnectionString: str | None = None
+    MssqlBatchSize: int = 1000
+    MssqlUseDependencies: bool = False
+    Factories: list[Factory] = field(default_factory=list)
+    AdfRefresh: bool = False
+    AdfFetcherDir: str = ""
+    AdfGlobalParameters: str = ""  # factory JSON with the global parameters
+    PipelineWorkers: int = field(default_factory=lambda: os.cpu_count() or 1)
+    MermaidRenderers: int = 2
+    RenderTimeout: float = (
+        120.0  # seconds one PDF can take before its renderer is killed
+    )
+    MermaidConfig: str = "mermaid-config.json"
+    Limits: DiagramLimits = field(default_factory=DiagramLimits)
+    JsonFormat: str = "tree"
+    # definition lines around each reference, normalized only
+    JsonSnippets: bool = False
+    ReportFormats: list[str] = field(default_factory=lambda: ["txt"])
+    ReportWorkers: int = 1
+    DiagramWorkers: int = 1
+    JsonWorkers: int = 2
+    StageQueueSize: int = 16
+    Cache: bool = True
+    CacheDir: str = "cache"
+    Debug: bool = False
+    Profile: str | None = None
+    WatchInterval: float = 0.5
+
+
+def configFromEnvironment(environment: Mapping[str, str] = os.environ) -> Config:
+    """
+    Build a Config from the environment variables described in the README, or from any
+    mapping with the same keys (ex. the values of a .env file).
+    """
+
+    def value(name: str) -> str | None:
+        return environment.get(name) or None
+
+    def number(name: str, default):
+        text = value(name)
+        if text is None:
+            return default
+        try:
+            return type(default)(text)
+        except ValueError:
+            raise EngineError(f"{name} must be a number, got {text!r}")
+
+    output_dir = value("OUTPUT_DIR")
+    if output_dir is None:
+        raise EngineError("OUTPUT_DIR not set")
+    pipeline_dir = value("PIPELINE_DIR")
+    if pipeline_dir is None:
+        raise EngineError("PIPELINE_DIR not set")
+    json_format = value("JSON_FORMAT") or "tree"
+    if json_format not in JSON_FORMATS:
+        raise EngineError(f"JSON_FORMAT must be one of {JSON_FORMATS}")
+    json_snippets = value("JSON_SNIPPETS") == "True"
+    if json_snippets and json_format != "normalized":
+        raise EngineError('JSON_SNIPPETS needs JSON_FORMAT="normalized"')
+
+    report_formats = [
+        report_format.strip()
+        for report_format in (value("REPORT_FORMATS") or "txt").split(",")
+        if report_format.strip()
+    ]
+    if len(report_formats) == 0 or not set(report_formats) <= set(REPORT_FORMATS):
+        raise EngineError(f"REPORT_FORMATS must be a list of {REPORT_FORMATS}")
+
+    factories = parseFactories(value("ADF_FACTORIES") or "")
+    single_factory = (
+        value("ADF_FACTORY_NAME"),
+        value("ADF_RESOURCE_GROUP"),
+        value("ADF_SUBSCRIPTION"),
+    )
+    if len(factories) == 0 and None not in single_factory:
+        factories = [Factory(*single_factory)]
+
+    default_limits = DiagramLimits()
+    return Config(
+        OutputDir=output_dir,
+        PipelineDir=pipeline_dir,
+        MssqlSource=value("MSSQL_SOURCE") or "csv",
+        MssqlDataDir=value("MSSQL_SERVER_DATA_DIR") or "",
+        MssqlConnectionString=value("MSSQL_CONNECTION_STRING"),
+        MssqlBatchSize=number("MSSQL_BATCH_SIZE", 1000),
+        MssqlUseDependencies=value("MSSQL_USE_DEPENDENCIES") == "True",
+        Factories=factories,
+        AdfRefresh=value("ADF_REFRESH") == "True",
+        AdfFetcherDir=value("ADF_FETCHER_DIR") or "",
+        AdfGlobalParameters=value("ADF_GLOBAL_PARAMETERS") or "",
+        PipelineWorkers=max(1, number("PIPELINE_WORKERS", os.cpu_count() or 1)),
+        MermaidRenderers=number("MERMAID_RENDERERS", 2),
+        RenderTimeout=number("MERMAID_RENDER_TIMEOUT", 120.0),
+        Limits=DiagramLimits(
+            number("MERMAID_MAX_NODES", default_limits.MaxNodes),
+            number("MERMAID_MAX_EDGES", default_limits.MaxEdges),
+            number("MERMAID_MAX_DEPTH", default_limits.MaxDepth),
+        ),
+        JsonFormat=json_format,
+        JsonSnippets=json_snippets,
+        ReportFormats=report_formats,
+        ReportWorkers=max(1, number("REPORT_WORKERS", 1)),
+        DiagramWorkers=max(1, number("DIAGRAM_WORKERS", 1)),
+        JsonWorkers=max(1, number("JSON_WORKERS", 2)),
+        # items a stage can have waiting before whoever feeds it blocks
+        StageQueueSize=max(1, number("STAGE_QUEUE_SIZE", 16)),
+        Cache=value("CACHE") != "False",
+        CacheDir=value("CACHE_DIR") or "cache",
+        Debug=value("DEBUG") == "True",
+        Profile=value("PROFILE"),
+        WatchInterval=number("WATCH_INTERVAL", 0.5),
+    )
+
+
+def checkDirectory(dir_path: str) -> str:
+    if not os.path.exists(dir_path) or not os.path.isdir(dir_path):
+        raise EngineError(f"{dir_path} does not exist or isn't directory")
+    return dir_path
+
+
+def saveMermaid(mermaid_text: str, filename: str):
+    print("Saving Mermaid to", filename)
+    with open(filename, "w", encoding="utf-8") as file:
+        file.write(mermaid_text + "\n")
+
+
+class Engine:
+    """
+    The state of one analysis: one catalog and one set of pipelines, read and written
+    according to its Config and nothing else. Engines don't share mutable state, so several
+    can run at the same time on threads or in a process pool.
+    name_indexes shares the table/view name index between engines reading the same
+    catalog, renderer shares one pool of Mermaid renderer processes, it's left open.
+    """
+
+    def __init__(
+        self,
+        config: Config,
+        name_indexes: NameIndexes | None = None,
+        renderer: MermaidRenderer | None = None,
+    ):
+        self.config = config
+        self.report_dir = os.path.join("reports", config.OutputDir)
+        self.image_dir = os.path.join("images", config.OutputDir)
+        self.debug_dir = os.path.join("debug", config.OutputDir)
+        # every table, view, stored procedure and pipeline exactly once, the reports are
+        # views over it
+        self.graph = DependencyGraph()
+        # the graph before any pipeline was added, kept by watch mode to start over from
+        self.catalog_graph: DependencyGraph | None = None
+        # key: kind, value: transitive counts by node ID, set by prepareReports()
+        self.downstream_counts: dict[str, array] = {}
+        self.upstream_counts: dict[str, array] = {}
+        self.name_indexes = name_indexes or NameIndexes()
+        self.names: NameIndex | None = None  # set once every table and view is known
+        self.renderer = renderer  # shared by every export thread
+        self.owns_renderer = renderer is None
+        # set once the renderer failed to start, every later export goes straight to mmdc
+        self.renderer_failed = False
+        self.metrics = RunMetrics(config.Profile)
+        self.cache = RunCache(None)
+        if config.Cache:
+            self.cache = RunCache(
+                os.path.join(config.CacheDir, config.OutputDir, "run-cache.json")
+            )
+        # key: pipeline_name, value: hash of its inputs
+        self.pipeline_fingerprints: dict[str, str] = {}
+        # key: name, value: value, what pipeline().globalParameters resolves to
+        self.global_parameters: dict[str, str] = {}
+        # where each view and procedure definition can be read again, not the text itself
+        self.definitions = DefinitionStore()
+
+    def countReferences(self):
+        self.definitions.close()
+        self.definitions = DefinitionStore()
+        if self.config.MssqlSource == "database":
+            self.countDatabaseReferences()
+        else:
+            path_prefix = checkDirectory(self.config.MssqlDataDir)
+            views_path = os.path.join(path_prefix, "Views.csv")
+            stored_procedures_path = os.path.join(path_prefix, "StoredProcedures.csv")
+            self.definitions.setFile(VIEW, views_path, definitionsEncoding())
+            self.definitions.setFile(
+                STORED_PROCEDURE, stored_procedures_path, definitionsEncoding()
+            )
+
+            # every file is streamed a row at a time, only the extracted references are kept
+            with self.metrics.stage("addTables"):
+                self.addTables(iterTables(os.path.join(path_prefix, "Tables.csv")))
+            with self.metrics.stage("addViews"):
+                self.addViews(iterDefinitions(views_path))
+            with self.metrics.stage("addStoredProcedures"):
+                self.addStoredProcedures(iterDefinitions(stored_procedures_path))
+
+        if self.config.AdfGlobalParameters:
+            if not os.path.exists(self.config.AdfGlobalParameters):
+                raise EngineError(f"{self.config.AdfGlobalParameters} does not exist")
+            self.global_parameters = loadGlobalParameters(
+                self.config.AdfGlobalParameters
+            )
+
+        graph = self.graph
+        # pipeline results also depend on the global parameters their expressions use
+        self.cache.setCatalog(
+            [f"{kind}:{name}" for kind in graph.names for name in graph.names[kind]]
+            + [
+                f"global:{name}={value}"
+                for name, value in self.global_parameters.items()
+            ]
+        )
+        print("Tables, Views, Stored Procedure References counted")
+
+    def countDatabaseReferences(self):
+        # same catalog queries as queries.sql, streamed straight from the server in batches
+        if self.config.MssqlConnectionString is None:
+            raise EngineError("MSSQL_CONNECTION_STRING not set")
+        batch_size = self.config.MssqlBatchSize
+
+        # the definitions are written next to the reports as they're read, to be looked up
+        # later like the files of a CSV export
+        views_path = os.path.join(self.report_dir, "definitions", "Views.csv")
+        stored_procedures_path = os.path.join(
+            self.report_dir, "definitions", "StoredProcedures.csv"
+        )
+        self.definitions.setFile(VIEW, views_path, "utf-8")
+        self.definitions.setFile(STORED_PROCEDURE, stored_procedures_path, "utf-8")
+
+        connection = connect(self.config.MssqlConnectionString)
+        try:
+            dependencies = None
+            if self.config.MssqlUseDependencies:
+                with self.metrics.stage("fetchDependencies"):
+                    dependencies = fetchDependencies(connection, batch_size)
+            with self.metrics.stage("addTables"):
+                self.addTables(iterDatabaseTables(connection, batch_size))
+            with self.metrics.stage("addViews"):
+                self.addViews(
+                    spoolDefinitions(
+                        iterDatabaseDefinitions(connection, VIEWS_QUERY, batch_size),
+                        views_path,
+                    ),
+                    dependencies,
+                )
+            with self.metrics.stage("addStoredProcedures"):
+                self.addStoredProcedures(
+                    spoolDefinitions(
+                        iterDatabaseDefinitions(
+                            connection, STORED_PROCEDURES_QUERY, batch_size
+                        ),
+                        stored_procedures_path,
+                    ),
+                    dependencies,
+                )
+        finally:
+            connection.close()
+
+    def definitionNames(
+        self,
+        name: str,
+        definition: str,
+        dependencies: dict[str, dict[tuple[str, ...], int]] | None,
+    ) -> tuple[str, dict[tuple[str, ...], int]]:
+        self.metrics.count("definitions_scanned")
+        self.metrics.count("definition_bytes", len(definition))
+        if dependencies is None:
+            return self.cache.definitionNames(definition, extractNames)
+        # sys.sql_expression_dependencies already has the references, nothing to tokenize
+        return contentHash(definition), dependencies.get(name.lower(), {})
+
+    def addTables(self, table_names: Iterable[str]):
+        for table_name in table_names:
+            self.graph.add(TABLE, table_name)
+
+    def addViews(
+        self,
+        views: Iterable[tuple[str, str, int, int]],
+        dependencies: dict[str, dict[tuple[str, ...], int]] | None = None,
+    ):
+        graph = self.graph
+        # views are read once, their names are resolved after every view name is known
+        pending_views: list[tuple[int, dict[tuple[str, ...], int]]] = []
+        # (name, definition, offset and length of the definition's row in its file)
+        for view_name, definition, offset, length in views:
+            view_name = view_name.lower()
+            view_id = graph.add(VIEW, view_name)
+            self.definitions.add(VIEW, view_id, offset, length)
+            graph.hashes[VIEW][view_id], names = self.definitionNames(
+                view_name, definition, dependencies
+            )
+            pending_views.append((view_id, names))
+
+        # one index over every table and view name, shared with the pipeline Lookups
+        # and with every other engine reading the same catalog
+        key = contentHash(*graph.names[TABLE], "", *graph.names[VIEW])
+        self.names = self.name_indexes.get(key, graph.names[TABLE], graph.names[VIEW])
+        names_index = self.names
+
+        for view_id, names in pending_views:
+            # check for Table reference
+            hits = names_index.matcher.resolveNames(names)
+            self.metrics.count("names_matched", len(hits))
+            for lowercase_name, references_in_def in hits.items():
+                table_name = names_index.tables.get(lowercase_name)
+                if table_name is not None:
+                    table_id = graph.get(TABLE, table_name)
+                    graph.link(VIEW, view_id, "Tables", table_id, references_in_def)
+
+            # views built on views, CREATE VIEW names the view itself so that's skipped
+            for lowercase_name, references_in_def in hits.items():
+                view_name = names_index.views.get(lowercase_name)
+                if view_name is not None:
+                    other_id = graph.get(VIEW, view_name)
+                    if other_id != view_id:
+                        graph.link(VIEW, view_id, "Views", other_id, references_in_def)
+
+    def addStoredProcedures(
+        self,
+        stored_procedures: Iterable[tuple[str, str, int, int]],
+        dependencies: dict[str, dict[tuple[str, ...], int]] | None = None,
+    ):
+        graph = self.graph
+        names_index = self.names
+        # EXEC targets are resolved once every procedure name is known
+        pending_calls: list[tuple[int, dict[tuple[str, ...], int]]] = []
+        for sp_name, definition, offset, length in stored_procedures:
+            sp_id = graph.add(STORED_PROCEDURE, sp_name)
+            self.definitions.add(STORED_PROCEDURE, sp_id, offset, length)
+            graph.hashes[STORED_PROCEDURE][sp_id], names = self.definitionNames(
+                sp_name, definition, dependencies
+            )
+            hits = names_index.matcher.resolveNames(names)
+            self.metrics.count("names_matched", len(hits))
+            for lowercase_name, references_in_def in hits.items():
+                table_name = names_index.tables.get(lowercase_name)
+                if table_name is not None:
+                    table_id = graph.get(TABLE, table_name)
+                    graph.link(
+                        STORED_PROCEDURE, sp_id, "Tables", table_id, references_in_def
+                    )
+
+            for lowercase_name, references_in_def in hits.items():
+                view_name = names_index.views.get(lowercase_name)
+                if view_name is not None:
+                    view_id = graph.get(VIEW, view_name)
+                    graph.link(
+                        STORED_PROCEDURE, sp_id, "Views", view_id, references_in_def
+                    )
+            pending_calls.append((sp_id, names))
+
+        lowercase_procedures = {
+            sp_name.lower(): sp_name for sp_name in graph.names[STORED_PROCEDURE]
+        }
+        procedure_matcher = NameMatcher(list(lowercase_procedures))
+        for sp_id, names in pending_calls:
+            hits = procedure_matcher.resolveNames(names)
+            for lowercase_name, references_in_def in hits.items():
+                # CREATE PROCEDURE names the procedure itself
+                callee_id = graph.get(
+                    STORED_PROCEDURE, lowercase_procedures[lowercase_name]
+                )
+                if callee_id != sp_id:
+                    graph.link(
+                        STORED_PROCEDURE,
+                        sp_id,
+                        "Stored Procedures",
+                        callee_id,
+                        references_in_def,
+                    )
+
+    def referencedBy(self, kind: str, node_id: int) -> dict[str, list[tuple[str, int]]]:
+        # key: parent_kind.group, value: [(parent_name, count)]
+        graph = self.graph
+        references = {}
+        for (parent_kind, group), child_kind in RELATIONS.items():
+            if child_kind == kind:
+                references[f"{parent_kind}.{group}"] = [
+                    (graph.name(parent_kind, parent_id), count)
+                    for parent_id, count in graph.parents(parent_kind, group, node_id)
+                ]
+        return references
+
+    def createFileReport(self, kind: str):
+        title = REPORT_TITLES[kind]
+        print(f"Creating {title} report")
+        writeReport(
+            self.graph,
+            kind,
+            self.report_dir,
+            self.config.ReportFormats,
+            self.upstream_counts,
+            self.downstream_counts,
+        )
+        print(f"{title.capitalize()} report created")
+
+    def prepareReports(self) -> str | None:
+        """
+        Computes the closure counts the reports need and returns the fingerprint to mark the
+        reports with once they're written, None if they're unchanged since the last run.
+        """
+        os.makedirs(self.report_dir, exist_ok=True)
+
+        report_files = reportFiles(self.report_dir, self.config.ReportFormats)
+        # every report is built from the whole catalog and every pipeline
+        fingerprint = contentHash(
+            self.cache.catalog,
+            ",".join(self.config.ReportFormats),
+            *(
+                node_hash
+                for kind in (VIEW, STORED_PROCEDURE, PIPELINE)
+                for node_hash in self.graph.hashes[kind]
+            ),
+        )
+        if self.cache.isCurrent("reports", fingerprint, report_files):
+            print("Reports unchanged since last run")
+            return None
+
+        self.graph.buildIndexes()
+        with self.metrics.stage("closure"):
+            self.downstream_counts, self.upstream_counts = self.graph.closureCounts()
+        return fingerprint
+
+    def addReportStage(self, scheduler: StageScheduler):
+        scheduler.addStage("reports", self.createFileReport, self.config.ReportWorkers)
+
+    def enqueueReports(self, scheduler: StageScheduler):
+        for kind in REPORT_FILES:
+            scheduler.put("reports", kind)
+
+    def createReport(self):
+        fingerprint = self.prepareReports()
+        if fingerprint is None:
+            return
+        scheduler = StageScheduler(self.config.StageQueueSize)
+        self.addReportStage(scheduler)
+        self.enqueueReports(scheduler)
+        self.recordStageStats(scheduler.close())
+        self.cache.markOutput("reports", fingerprint)
+
+    def linkDependentPipelines(
+        self, dependent_pipelines: dict[str, dict[str, int]]
+    ) -> PipelineResolution:
+        # every pipeline node exists now, so ExecutePipeline references become edges
+        graph = self.graph
+        resolution = resolvePipelineOrder(
+            {
+                pipeline_name: list(children)
+                for pipeline_name, children in dependent_pipelines.items()
+            }
+        )
+        for cycle_index, cycle in enumerate(resolution.Cycles):
+            print("Circular ExecutePipeline references between:", ", ".join(cycle))
+            for pipeline_name in cycle:
+                graph.setCycle(
+                    PIPELINE, graph.get(PIPELINE, pipeline_name), cycle_index
+                )
+        for pipeline_name, missing in resolution.Missing.items():
+            print(
+                f"{pipeline_name} executes nonexistent pipelines:", ", ".join(missing)
+            )
+
+        for pipeline_name in resolution.Order:
+            pipeline_id = graph.get(PIPELINE, pipeline_name)
+            for child, ref_count in dependent_pipelines[pipeline_name].items():
+                child_id = graph.get(PIPELINE, child)
+                if child_id is None:
+                    child_id = graph.add(PIPELINE, child, missing=True)
+                graph.link(
+                    PIPELINE, pipeline_id, "Dependent Pipelines", child_id, ref_count
+                )
+        return resolution
+
+    def computePipelineFingerprints(self, order: list[str]):
+        # a pipeline's diagram only changes if it, its procedures/views or a dependent
+        # pipeline did
+        graph = self.graph
+        for pipeline_name in order:
+            pipeline_id = graph.get(PIPELINE, pipeline_name)
+            inputs = [self.cache.catalog, graph.hashes[PIPELINE][pipeline_id]]
+            for sp_id, _ in graph.children(PIPELINE, pipeline_id, "Stored Procedures"):
+                inputs.append(graph.hashes[STORED_PROCEDURE][sp_id])
+                inputs.extend(
+                    graph.hashes[VIEW][view_id]
+                    for view_id, _ in graph.children(STORED_PROCEDURE, sp_id, "Views")
+                )
+            for child_id, _ in graph.children(
+                PIPELINE, pipeline_id, "Dependent Pipelines"
+            ):
+                if graph.isMissing(PIPELINE, child_id) or graph.isCircular(
+                    PIPELINE, pipeline_id, child_id
+                ):
+                    continue
+                inputs.append(
+                    self.pipeline_fingerprints[graph.name(PIPELINE, child_id)]
+                )
+            self.pipeline_fingerprints[pipeline_name] = contentHash(*inputs)
+
+    def fetchADFPipelines(self):
+        print("Fetching ADF Pipelines")
+        if self.config.AdfFetcherDir:
+            # local stand-in for the Azure CLI
+            fetcher = DirectoryFetcher(self.config.AdfFetcherDir)
+        else:
+            fetcher = AzureCLIFetcher()
+        if not fetcher.isAvailable():
+            print("Azure CLI not installed or az command not callable. Exiting...")
+            return
+
+        if len(self.config.Factories) == 0:
+            raise EngineError(
+                "ADF_FACTORY_NAME, ADF_RESOURCE_GROUP, or ADF_SUBSCRIPTION not set"
+            )
+        for result in refreshPipelines(
+            fetcher, self.config.Factories, self.config.PipelineDir
+        ):
+            print(
+                f"{result.Factory}: {len(result.Written)} written, "
+                f"{len(result.Unchanged)} unchanged, {len(result.Deleted)} deleted"
+            )
+
+    def pipelineCatalog(self) -> PipelineCatalog:
+        graph = self.graph
+        return PipelineCatalog(
+            self.names.matcher,
+            self.names.tables,
+            {
+                graph.name(STORED_PROCEDURE, sp_id)
+                for sp_id in graph.existing(STORED_PROCEDURE)
+            },
+            self.global_parameters,
+        )
+
+    def parsePipelines(self, pipeline_paths: list[str]) -> list[PipelineResult]:
+        catalog = self.pipelineCatalog()
+        workers = min(self.config.PipelineWorkers, max(1, len(pipeline_paths)))
+        self.metrics.count("pipelines_parsed", len(pipeline_paths))
+        if workers == 1:
+            return [parsePipelineFile(path, catalog) for path in pipeline_paths]
+
+        print(f"Parsing {len(pipeline_paths)} pipelines with {workers} processes")
+        self.metrics.count("pipeline_worker_processes", workers)
+        chunksize = max(1, len(pipeline_paths) // (workers * 4))
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers, initializer=initWorker, initargs=(catalog,)
+        ) as executor:
+            # map keeps the input order, so merging is deterministic
+            return list(
+                executor.map(parsePipelineFile, pipeline_paths, chunksize=chunksize)
+            )
+
+    def analyzePipelines(self, fetch: bool = True):
+        graph = self.graph
+        pipeline_dir = checkDirectory(self.config.PipelineDir)
+        # Build Tree
+        pipeline_dependencies: dict[str, dict[str, int]] = {}
+        pipeline_paths = listPipelineFiles(pipeline_dir)
+        if fetch and (len(pipeline_paths) == 0 or self.config.AdfRefresh):
+            with self.metrics.stage("fetch"):
+                self.fetchADFPipelines()
+            pipeline_paths = listPipelineFiles(pipeline_dir)
+
+        # only pipelines whose file changed since the last run are parsed again
+        file_hashes: list[str] = []
+        results: list[PipelineResult | None] = []
+        for path in pipeline_paths:
+            with open(path, "rb") as pipeline_file:
+                file_hash = contentHash(pipeline_file.read())
+            file_hashes.append(file_hash)
+            results.append(self.cache.pipelineResult(file_hash))
+        changed = [index for index, result in enumerate(results) if result is None]
+        print(
+            f"{len(pipeline_paths) - len(changed)} pipelines unchanged since last run"
+        )
+        with self.metrics.stage("parse"):
+            parsed = self.parsePipelines([pipeline_paths[index] for index in changed])
+        for index, result in zip(changed, parsed):
+            self.cache.storePipelineResult(file_hashes[index], result)
+            results[index] = result
+
+        # a pipeline is one graph node and one set of images by name, so two factories
+        # can't both have a pipeline with the same name
+        paths_by_name: dict[str, str] = {}
+        for result, path in zip(results, pipeline_paths):
+            other_path = paths_by_name.setdefault(result.Name, path)
+            if other_path != path:
+                raise EngineError(
+                    f"pipeline {result.Name} is in both {other_path} and {path}, "
+                    "analyze those factories separately (ex. one --env file each)"
+                )
+
+        # what parameterized references resolve to with the values callers pass, on top of
+        # the cached results
+        with self.metrics.stage("passParameters"):
+            passed = passParameters(results, self.pipelineCatalog())
+        for result, passed_result, file_hash in zip(results, passed, file_hashes):
+            if passed_result is not result:
+                # a caller changing what it passes has to redraw the pipeline
+                file_hash = contentHash(
+                    file_hash, json.dumps(passed_result.TotalReferences, sort_keys=True)
+                )
+                self.metrics.count("pipelines_resolved_with_caller_parameters")
+            result = passed_result
+            pipeline_id = graph.add(PIPELINE, result.Name)
+            graph.hashes[PIPELINE][pipeline_id] = file_hash
+
+            for table, ref_count in result.TotalReferences["table"].items():
+                table_id = graph.get(TABLE, table)
+                graph.link(PIPELINE, pipeline_id, "Tables", table_id, ref_count)
+            for sp_name, ref_count in result.TotalReferences["sp"].items():
+                sp_id = graph.get(STORED_PROCEDURE, sp_name)
+                graph.link(PIPELINE, pipeline_id, "Stored Procedures", sp_id, ref_count)
+            bad_stored_procedures: dict[str, int] = {}
+            for sp_name in result.BadStoredProcedures:
+                bad_stored_procedures[sp_name] = (
+                    bad_stored_procedures.get(sp_name, 0) + 1
+                )
+            for sp_name, ref_count in bad_stored_procedures.items():
+                sp_id = graph.add(STORED_PROCEDURE, sp_name, missing=True)
+                graph.link(PIPELINE, pipeline_id, "Stored Procedures", sp_id, ref_count)
+            for dataflow_name, ref_count in result.TotalReferences["df"].items():
+                dataflow_id = graph.add(DATAFLOW, dataflow_name)
+                graph.link(PIPELINE, pipeline_id, "Data Flows", dataflow_id, ref_count)
+            pipeline_dependencies[result.Name] = result.TotalReferences["dp"]
+        # Attach dependent pipelines
+        with self.metrics.stage("linkDependentPipelines"):
+            resolution = self.linkDependentPipelines(pipeline_dependencies)
+            self.computePipelineFingerprints(resolution.Order)
+
+    def savePDF(self, mermaid_text: str, pipeline_pdf: str) -> RenderResult:
+        print("Saving PDF to", pipeline_pdf)
+        if self.renderer is not None:
+            result = self.renderer.render(mermaid_text, pipeline_pdf)
+            if result.Ok:
+                print(f"{pipeline_pdf} created successfully")
+                return result
+            print(f"{pipeline_pdf} failed: {result.Error}")
+            if not result.RendererFailed:
+                return result
+            # the diagram may be fine, mmdc gets a go at it
+
+        # mmdc is mmdc.cmd on Windows, which needed shell=True before which() found it
+        mmdc = shutil.which("mmdc")
+        if mmdc is None:
+            print(f"{pipeline_pdf} failed: mmdc not found")
+            return RenderResult(pipeline_pdf, False, "mmdc not found")
+        self.metrics.count("mmdc_processes")
+        # a stale PDF from an earlier run mustn't count as this render's output
+        if os.path.exists(pipeline_pdf):
+            os.remove(pipeline_pdf)
+        try:
+            completed = subprocess.run(
+                [
+                    mmdc,
+                    "--input",
+                    "-",
+                    "--output",
+                    pipeline_pdf,
+                    "--configFile",
+                    self.config.MermaidConfig,
+                ],
+                input=mermaid_text.encode(),
+                capture_output=True,
+                timeout=self.config.RenderTimeout,
+            )
+        except subprocess.TimeoutExpired:
+            error = f"mmdc didn't finish within {self.config.RenderTimeout:g}s"
+            print(f"{pipeline_pdf} failed: {error}")
+            return RenderResult(pipeline_pdf, False, error)
+        if completed.returncode != 0 or not os.path.exists(pipeline_pdf):
+            error = completed.stderr.decode(errors="replace").strip()
+            if error == "":
+                error = (
+                    f"mmdc exited with {completed.returncode}"
+                    if completed.returncode != 0
+                    else "mmdc didn't write it"
+                )
+            print(f"{pipeline_pdf} failed: {error}")
+            return RenderResult(pipeline_pdf, False, error)
+        print(f"{pipeline_pdf} created successfully")
+        return RenderResult(pipeline_pdf, True)
+
+    def diagramFiles(self, diagram_name: str) -> list[str]:
+        files = [os.path.join(self.image_dir, "pdf", f"{diagram_name}.pdf")]
+        if self.config.Debug:
+            files.append(os.path.join(self.image_dir, "mermaid", f"{diagram_name}.mmd"))
+        return files
+
+    def pipelineOutputFiles(self, pipeline_name: str) -> list[str]:
+        # its part diagrams are only known once it's built, the cache records them
+        return self.diagramFiles(pipeline_name) + [
+            os.path.join(self.image_dir, "json", f"{pipeline_name}.json")
+        ]
+
+    def exportFingerprint(self, pipeline_name: str) -> str:
+        # switching JSON_FORMAT or the diagram limits has to rewrite otherwise unchanged
+        # pipelines
+        return contentHash(
+            self.pipeline_fingerprints[pipeline_name],
+            self.config.JsonFormat,
+            str(self.config.JsonSnippets),
+            repr(self.config.Limits),
+        )
+
+    def removeStaleParts(self, pipeline_name: str):
+        # a pipeline that shrank leaves the part diagrams of the previous run behind
+        prefix = f"{pipeline_name}.part"
+        for sub_dir, extension in (("pdf", ".pdf"), ("mermaid", ".mmd")):
+            directory = os.path.join(self.image_dir, sub_dir)
+            for file_name in os.listdir(directory):
+                if (
+                    file_name.startswith(prefix)
+                    and file_name.endswith(extension)
+                    and file_name[len(prefix) : -len(extension)].isdigit()
+                ):
+                    os.remove(os.path.join(directory, file_name))
+
+    def renderDiagram(self, diagram: Diagram) -> RenderResult:
+        mermaid_text = "\n".join(diagram.Lines)
+        if self.config.Debug:
+            mermaid_file = os.path.join(
+                self.image_dir, "mermaid", f"{diagram.Name}.mmd"
+            )
+            saveMermaid(mermaid_text, mermaid_file)
+        # call MermaidJS to generate the diagram
+        pipeline_pdf = os.path.join(self.image_dir, "pdf", f"{diagram.Name}.pdf")
+        return self.savePDF(mermaid_text, pipeline_pdf)
+
+    def prepareExport(self) -> tuple["Exporter", list[int]] | None:
+        """
+        The exporter and the pipelines whose diagrams changed, in dependency order,
+        None if there is nothing to export.
+        """
+        # Ensure MermaidJS is installed
+        has_mermaidJS = shutil.which("mmdc") is not None
+        if not has_mermaidJS:
+            print("MermaidJS not installed or mmdc command not callable. Exiting...")
+            return None
+
+        os.makedirs(os.path.join(self.image_dir, "mermaid"), exist_ok=True)
+        os.makedirs(os.path.join(self.image_dir, "pdf"), exist_ok=True)
+        os.makedirs(os.path.join(self.image_dir, "json"), exist_ok=True)
+
+        # pipeline_fingerprints is filled in dependency order, dependent pipelines first
+        changed_pipelines = [
+            self.graph.get(PIPELINE, pipeline_name)
+            for pipeline_name in self.pipeline_fingerprints
+            if not self.cache.isCurrent(
+                f"pipeline:{pipeline_name}",
+                self.exportFingerprint(pipeline_name),
+                self.pipelineOutputFiles(pipeline_name),
+            )
+        ]
+        unchanged = len(self.pipeline_fingerprints) - len(changed_pipelines)
+        print(f"{unchanged} pipeline diagrams unchanged since last run")
+        if len(changed_pipelines) == 0:
+            return None
+
+        # one long-lived renderer (Node + Chromium) instead of one mmdc per PDF
+        if self.renderer is None and not self.renderer_failed:
+            self.renderer = startRenderer(
+                self.config.MermaidRenderers,
+                self.config.MermaidConfig,
+                self.config.RenderTimeout,
+            )
+            self.renderer_failed = self.renderer is None
+        self.graph.buildIndexes()
+        return Exporter(self), changed_pipelines
+
+    def finishExport(self, exporter: "Exporter", keep_renderer: bool):
+        if self.renderer is not None:
+            self.metrics.count("renderer_processes_started", self.renderer.started())
+            # watch mode renders again on the next change, a shared renderer isn't ours
+            if self.owns_renderer and not keep_renderer:
+                self.renderer.close()
+                self.renderer = None
+        exporter.report()
+
+    def exportImagesAndTreeStructures(self, keep_renderer: bool = False):
+        prepared = self.prepareExport()
+        if prepared is None:
+            return
+        exporter, pipeline_ids = prepared
+        scheduler = StageScheduler(self.config.StageQueueSize)
+        exporter.addStages(scheduler)
+        exporter.enqueue(pipeline_ids)
+        try:
+            self.recordStageStats(scheduler.close())
+        finally:
+            self.finishExport(exporter, keep_renderer)
+
+    def recordStageStats(self, stats: dict[str, StageStats]):
+        for name, stage_stats in stats.items():
+            self.metrics.count(f"stage_items.{name}", stage_stats.Items)
+            self.metrics.count(
+                f"stage_busy_ms.{name}", int(stage_stats.BusySeconds * 1000)
+            )
+            self.metrics.count(
+                f"stage_blocked_ms.{name}", int(stage_stats.BlockedSeconds * 1000)
+            )
+
+    def writeOutputs(self, keep_renderer: bool = False):
+        """
+        The index, the snapshot, the reports and the pipeline exports at the same time: the
+        closure counts are computed first, then the report files, the index, the snapshot and
+        the diagrams, JSON and PDFs of every changed pipeline are written by the stages of
+        one scheduler.
+        """
+        report_fingerprint = self.prepareReports()
+        prepared = self.prepareExport()
+
+        scheduler = StageScheduler(self.config.StageQueueSize)
+        # queried with index.py, no need to run the whole script to see what uses an object
+        index_path = os.path.join(self.report_dir, INDEX_NAME)
+        scheduler.addStage("index", lambda path: writeIndex(self.graph, path), 1)
+        # compared between runs with snapshot.py
+        snapshot_path = os.path.join(self.report_dir, SNAPSHOT_NAME)
+        scheduler.addStage("snapshot", lambda path: writeSnapshot(self.graph, path), 1)
+        # read by definitions.py to show where an object is referenced
+        definitions_path = os.path.join(self.report_dir, DEFINITIONS_NAME)
+        scheduler.addStage(
+            "definitions",
+            lambda path: self.definitions.write(self.graph.names, path),
+            1,
+        )
+        self.addReportStage(scheduler)
+        if prepared is not None:
+            exporter, pipeline_ids = prepared
+            exporter.addStages(scheduler)
+
+        scheduler.put("index", index_path)
+        scheduler.put("snapshot", snapshot_path)
+        scheduler.put("definitions", definitions_path)
+        if report_fingerprint is not None:
+            self.enqueueReports(scheduler)
+        try:
+            if prepared is not None:
+                exporter.enqueue(pipeline_ids)
+            self.recordStageStats(scheduler.close())
+        finally:
+            if prepared is not None:
+                self.finishExport(exporter, keep_renderer)
+        if report_fingerprint is not None:
+            self.cache.markOutput("reports", report_fingerprint)
+
+    def loadCatalog(self):
+        with self.metrics.stage("countReferences"):
+            self.countReferences()
+        if self.config.Debug:
+            graph = self.graph
+            os.makedirs(self.debug_dir, exist_ok=True)
+            with open(
+                os.path.join(self.debug_dir, "raw-table-result.txt"), "w"
+            ) as result_file:
+                pprint.pp(
+                    {
+                        graph.name(TABLE, table_id): self.referencedBy(TABLE, table_id)
+                        for table_id in graph.existing(TABLE)
+                    },
+                    result_file,
+                )
+            with open(
+                os.path.join(self.debug_dir, "raw-view-result.txt"), "w"
+            ) as result_file:
+                pprint.pp(
+                    {
+                        graph.name(VIEW, view_id): self.referencedBy(VIEW, view_id)
+                        for view_id in graph.existing(VIEW)
+                    },
+                    result_file,
+                )
+
+    def updateOutputs(self, fetch: bool = True, keep_renderer: bool = False):
+        # everything after the catalog: pipelines, the index, reports and diagrams
+        with self.metrics.stage("analyzePipelines"):
+            self.analyzePipelines(fetch)
+        with self.metrics.stage("writeOutputs"):
+            self.writeOutputs(keep_renderer)
+        self.cache.save()
+        print(f"Cache: {self.cache.hits} hits, {self.cache.misses} misses")
+
+        self.metrics.count("cache_hits", self.cache.hits)
+        self.metrics.count("cache_misses", self.cache.misses)
+        for kind in self.graph.names:
+            self.metrics.count(f"graph_nodes.{kind}", self.graph.size(kind))
+            self.metrics.count(f"graph_edges.{kind}", self.graph.edgeCount(kind))
+        self.metrics.save(self.report_dir)
+        for line in self.metrics.summary():
+            print(line)
+
+    def run(self, watching: bool = False):
+        # one whole analysis, watching keeps what watch() needs afterwards
+        if watching and not self.cache.enabled:
+            # without a cache every change would parse every pipeline again
+            self.cache = RunCache(None, keep_in_memory=True)
+        self.loadCatalog()
+        if watching:
+            self.catalog_graph = self.graph.copy()
+        self.updateOutputs(keep_renderer=watching)
+
+    def catalogFiles(self) -> list[str]:
+        global_parameters = (
+            [self.config.AdfGlobalParameters] if self.config.AdfGlobalParameters else []
+        )
+        if self.config.MssqlSource == "database":
+            # restart to read the server again
+            return global_parameters
+        return [
+            os.path.join(self.config.MssqlDataDir, file_name)
+            for file_name in ("Tables.csv", "Views.csv", "StoredProcedures.csv")
+        ] + global_parameters
+
+    def watch(self):
+        """
+        Keep the graph of tables, views and stored procedures in memory and update the
+        outputs whenever a pipeline or catalog file changes, call after run(watching=True).
+        A pipeline edit only parses that pipeline, starting from a copy of the catalog
+        graph, a catalog edit reads the catalog again with the definitions that didn't
+        change coming from the cache. Reports, the index and the diagrams of the pipelines
+        whose fingerprint changed are rewritten, like any other run.
+        """
+        pipeline_dir = checkDirectory(self.config.PipelineDir)
+        catalog_files = self.catalogFiles()
+        watcher = PollingWatcher(
+            lambda: listPipelineFiles(pipeline_dir) + catalog_files,
+            self.config.WatchInterval,
+        )
+        if self.catalog_graph is None:
+            self.catalog_graph = self.graph.copy()
+        print(f"Watching {pipeline_dir} and {len(catalog_files)} catalog files")
+        try:
+            while True:
+                changed = watcher.wait()
+                start_time = time.perf_counter()
+                print(f"{len(changed)} files changed")
+                self.metrics = RunMetrics(self.config.Profile)
+                reads_catalog = any(path in catalog_files for path in changed)
+                self.cache.startRun(reads_catalog)
+                self.pipeline_fingerprints.clear()
+                if reads_catalog:
+                    self.graph = DependencyGraph()
+                    self.loadCatalog()
+                    self.catalog_graph = self.graph.copy()
+                else:
+                    self.graph = self.catalog_graph.copy()
+                self.updateOutputs(fetch=False, keep_renderer=True)
+                print(f"Updated in {time.perf_counter() - start_time:.2f}s")
+        except KeyboardInterrupt:
+            print("Stopped watching")
+        finally:
+            self.close()
+
+    def definitionSnippets(
+        self, kind: str, node_id: int, referenced: str
+    ) -> list[dict]:
+        return [
+            snippetJSON(snippet)
+            for snippet in self.definitions.snippets(kind, node_id, referenced)
+        ]
+
+    def close(self):
+        if self.renderer is not None and self.owns_renderer:
+            self.renderer.close()
+            self.renderer = None
+        self.definitions.close()
+
+
+@dataclass
+class PipelineExport:
+    # a pipeline's outputs are only marked current once every one of them was written
+    Name: str
+    Fingerprint: str
+    Pending: int
+    PartFiles: list[str]  # the files of its part diagrams, see pipelineOutputFiles()
+    Ok: bool = True
+
+
+class Exporter:
+    """
+    The export as three stages: "diagrams" builds a pipeline's diagrams and hands them to
+    "render" and the pipeline to "json". Pipelines are put in the order their dependent
+    pipelines were resolved, so PDFs start rendering as soon as the first diagram is built.
+    """
+
+    def __init__(self, engine: Engine):
+        self.engine = engine
+        self.lock = threading.Lock()
+        self.failed: list[str] = []
+        self.rendered = 0
+
+    def addStages(self, scheduler: StageScheduler):
+        config = self.engine.config
+        self.scheduler = scheduler
+        scheduler.addStage("diagrams", self.buildDiagrams, config.DiagramWorkers)
+        # one render thread per renderer process keeps every process busy
+        scheduler.addStage("render", self.render, config.MermaidRenderers)
+        scheduler.addStage("json", self.writeJSON, config.JsonWorkers)
+
+    def enqueue(self, pipeline_ids: list[int]):
+        for pipeline_id in pipeline_ids:
+            self.scheduler.put("diagrams", pipeline_id)
+
+    def buildDiagrams(self, pipeline_id: int):
+        engine = self.engine
+        pipeline_name = engine.graph.name(PIPELINE, pipeline_id)
+        diagrams = MermaidBuilder(engine.graph, engine.config.Limits).build(
+            PIPELINE, pipeline_id
+        )
+        engine.metrics.count("diagrams", len(diagrams))
+        engine.metrics.count(
+            "diagram_nodes", sum(diagram.Nodes for diagram in diagrams)
+        )
+        engine.removeStaleParts(pipeline_name)
+        export = PipelineExport(
+            pipeline_name,
+            engine.exportFingerprint(pipeline_name),
+            len(diagrams) + 1,
+            [file for part in diagrams[1:] for file in engine.diagramFiles(part.Name)],
+        )
+        self.scheduler.put("json", (export, pipeline_id))
+        for diagram in diagrams:
+            self.scheduler.put("render", (export, diagram))
+
+    def render(self, job: tuple[PipelineExport, Diagram]):
+        export, diagram = job
+        result = self.engine.renderDiagram(diagram)
+        with self.lock:
+            if result.Ok:
+                self.rendered += 1
+            else:
+                self.failed.append(result.Output)
+        self.finished(export, result.Ok)
+
+    def writeJSON(self, job: tuple[PipelineExport, int]):
+        export, pipeline_id = job
+        engine = self.engine
+        pipeline_json_file = os.path.join(
+            engine.image_dir, "json", f"{export.Name}.json"
+        )
+        saveJSON(
+            engine.graph,
+            PIPELINE,
+            pipeline_id,
+            pipeline_json_file,
+            engine.config.JsonFormat,
+            engine.definitionSnippets if engine.config.JsonSnippets else None,
+        )
+        self.finished(export, True)
+
+    def finished(self, export: PipelineExport, ok: bool):
+        with self.lock:
+            export.Pending -= 1
+            export.Ok = export.Ok and ok
+            done = export.Pending == 0 and export.Ok
+        if done:
+            self.engine.cache.markOutput(
+                f"pipeline:{export.Name}", export.Fingerprint, export.PartFiles
+            )
+
+    def report(self):
+        metrics = self.engine.metrics
+        metrics.count("pdfs_rendered", self.rendered)
+        metrics.count("pdfs_failed", len(self.failed))
+        total = self.rendered + len(self.failed)
+        print(f"{self.rendered} of {total} PDFs rendered")
+        for pipeline_pdf in self.failed:
+            print("Failed to render", pipeline_pdf)
+
+
+def runEngine(
+    config: Config,
+    name_indexes: NameIndexes | None = None,
+    renderer: MermaidRenderer | None = None,
+) -> str:
+    """
+    Run one whole analysis, returns its OutputDir. A module level function, so it can be
+    handed to a process pool as well as a thread pool.
+    """
+    engine = Engine(config, name_indexes, renderer)
+    try:
+        engine.run()
+    finally:
+        engine.close()
+    return config.OutputDir
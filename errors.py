@@ -0,0 +1,4 @@
+class EngineError(Exception):
+    """
+    A setting is missing or points at something that doesn't exist.
+    """
@@ -0,0 +1,141 @@
+import json
+from typing import Callable, TextIO
+
+from graph import GROUPS, PIPELINE, RELATIONS, DependencyGraph, expandItem
+
+JSON_FORMATS = ("tree", "normalized")
+WRITE_BUFFER = 1 << 20
+
+
+def writeTreeJSON(graph: DependencyGraph, kind: str, node_id: int, file: TextIO):
+    """
+    Same output as anytree's JsonExporter(indent=2) over the fully expanded tree, written
+    while the tree is walked. Only the children of the objects on the current path are held in memory.
+    """
+
+    def openNode(name: str, children: list, level: int):
+        padding = "  " * level
+        file.write("{\n" + padding + '  "name": ' + json.dumps(name))
+        if len(children) == 0:
+            file.write("\n" + padding + "}")
+            return None
+        file.write(",\n" + padding + '  "children": [\n')
+        return iter(children)
+
+    stack = []  # [children iterator, indent level, first child still to come]
+    children = openNode(*expandItem(graph, (kind, node_id)), 0)
+    if children is not None:
+        stack.append([children, 0, True])
+    while stack:
+        top = stack[-1]
+        children, level, first = top
+        child = next(children, None)
+        if child is None:
+            stack.pop()
+            padding = "  " * level
+            file.write("\n" + padding + "  ]\n" + padding + "}")
+            continue
+        top[2] = False
+        if not first:
+            file.write(",\n")
+        file.write("  " * (level + 2))
+        grandchildren = openNode(*expandItem(graph, child), level + 2)
+        if grandchildren is not None:
+            stack.append([grandchildren, level + 2, True])
+
+
+def objectID(graph: DependencyGraph, kind: str, node_id: int) -> str:
+    return f"{kind}:{graph.name(kind, node_id)}"
+
+
+# (kind, node ID, referenced name) -> where the definition of the object names it
+Snippets = Callable[[str, int, str], list[dict]]
+
+
+def writeNormalizedJSON(
+    graph: DependencyGraph,
+    kind: str,
+    node_id: int,
+    file: TextIO,
+    snippets: Snippets | None = None,
+):
+    """
+    Every object reachable from the root exactly once, keyed by "kind:name",
+    its groups list [ID, reference count] pairs instead of nesting the child objects.
+    {
+      "format": "normalized",
+      "root": "pipeline:Name",
+      "objects": {
+        "pipeline:Name": {"kind": ..., "name": ..., "children": {group: [[ID, count]]},
+                          "nonexistent": {group: [[name, count]]}, "circular": [[ID, count]]},
+        ...
+      }
+    }
+    With snippets, views and stored procedures also get "snippets": {ID: [snippet]}, the
+    lines of their definition around every reference.
+    """
+    root = objectID(graph, kind, node_id)
+    file.write('{\n  "format": "normalized",\n  "root": ' + json.dumps(root))
+    file.write(',\n  "objects": {')
+    seen = {(kind, node_id)}
+    queue = [(kind, node_id)]
+    first = True
+    while queue:
+        kind, node_id = queue.pop()
+        entry: dict = {"kind": kind, "name": graph.name(kind, node_id), "children": {}}
+        nonexistent: dict[str, list] = {}
+        circular: list = []
+        for group in GROUPS[kind]:
+            child_kind = RELATIONS[(kind, group)]
+            references = []
+            for child, count in graph.children(kind, node_id, group):
+                if graph.isMissing(child_kind, child):
+                    nonexistent.setdefault(group, []).append(
+                        [graph.name(child_kind, child), count]
+                    )
+                    continue
+                child_id = objectID(graph, child_kind, child)
+                if child_kind == kind and graph.isCircular(kind, node_id, child):
+                    circular.append([child_id, count])
+                    continue
+                references.append([child_id, count])
+                if (child_kind, child) not in seen:
+                    seen.add((child_kind, child))
+                    queue.append((child_kind, child))
+            entry["children"][group] = references
+        if kind == PIPELINE:
+            entry["nonexistent"] = nonexistent
+            if circular:
+                entry["circular"] = circular
+        elif snippets is not None:
+            entry["snippets"] = {
+                objectID(graph, RELATIONS[(kind, group)], child): snippets(
+                    kind, node_id, graph.name(RELATIONS[(kind, group)], child)
+                )
+                for group in GROUPS[kind]
+                for child, _ in graph.children(kind, node_id, group)
+            }
+
+        file.write("\n    " if first else ",\n    ")
+        first = False
+        file.write(
+            json.dumps(objectID(graph, kind, node_id)) + ": " + json.dumps(entry)
+        )
+    file.write("\n  }\n}")
+
+
+def saveJSON(
+    graph: DependencyGraph,
+    kind: str,
+    node_id: int,
+    filename: str,
+    json_format: str,
+    snippets: Snippets | None = None,
+):
+    # snippets are only written in the normalized format, see writeNormalizedJSON()
+    print("Saving JSON to", filename)
+    with open(filename, "w", buffering=WRITE_BUFFER) as file:
+        if json_format == "normalized":
+            writeNormalizedJSON(graph, kind, node_id, file, snippets)
+        else:
+            writeTreeJSON(graph, kind, node_id, file)
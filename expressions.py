@@ -0,0 +1,258 @@
+import functools
+import json
+import re
+
+# The part of the ADF expression language pipelines use to build stored procedure names and
+# queries: string literals, concat(), replace() and pipeline().parameters.X or
+# pipeline().globalParameters.X (also written with ['X']). Anything else, ex. variables() or
+# activity().output, isn't known before the pipeline runs and leaves the expression
+# unresolved.
+
+# a parameter binding: ("parameters" or "globalParameters", name) -> value
+Binding = dict[tuple[str, str], str]
+# the values of the parameters an expression references, None for the missing ones
+Values = tuple[tuple[tuple[str, str], str | None], ...]
+
+PARAMETER_SCOPES = ("parameters", "globalParameters")
+
+TOKEN_PATTERN = re.compile(
+    r"""
+    (?P<space>\s+)
+    |(?P<string>'(?:[^']|'')*')
+    |(?P<number>-?\d+(?:\.\d+)?)
+    |(?P<name>[A-Za-z_][\w]*)
+    |(?P<punctuation>[(),.\[\]])
+    |(?P<other>.)
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+INTERPOLATION_PATTERN = re.compile(r"@\{((?:[^{}']|'(?:[^']|'')*')*)\}")
+
+
+class Unresolved(Exception):
+    """
+    The expression uses something that isn't known before the pipeline runs, or isn't valid.
+    """
+
+
+def makeBinding(
+    parameters: dict[str, str], global_parameters: dict[str, str]
+) -> Binding:
+    binding = {("parameters", name): value for name, value in parameters.items()}
+    binding.update(
+        (("globalParameters", name), value) for name, value in global_parameters.items()
+    )
+    return binding
+
+
+def bindingKey(binding: Binding) -> tuple:
+    # a binding as a set member or dict key
+    return tuple(sorted(binding.items()))
+
+
+def parameterValue(value) -> str | None:
+    # how a parameter's value reads inside concat(), objects and arrays aren't supported
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (bool, int, float)):
+        return json.dumps(value)
+    return None
+
+
+def tokens(text: str) -> list[tuple[str, str]]:
+    found = []
+    for match in TOKEN_PATTERN.finditer(text):
+        kind = match.lastgroup
+        if kind == "other":
+            raise Unresolved(text)
+        if kind != "space":
+            found.append((kind, match.group()))
+    return found
+
+
+class Parser:
+    """
+    Recursive descent over the tokens of one expression. Nodes are tuples:
+    ("literal", value), ("call", name, [arguments]) and ("access", node, [keys]).
+    """
+
+    def __init__(self, text: str):
+        self.tokens = tokens(text)
+        self.position = 0
+
+    def peek(self) -> str | None:
+        if self.position < len(self.tokens):
+            return self.tokens[self.position][1]
+        return None
+
+    def take(self, expected: str | None = None) -> tuple[str, str]:
+        if self.position >= len(self.tokens):
+            raise Unresolved("unexpected end")
+        token = self.tokens[self.position]
+        if expected is not None and token[1] != expected:
+            raise Unresolved(f"expected {expected}, got {token[1]}")
+        self.position += 1
+        return token
+
+    def parse(self) -> tuple:
+        node = self.expression()
+        if self.position != len(self.tokens):
+            raise Unresolved("trailing tokens")
+        return node
+
+    def expression(self) -> tuple:
+        kind, value = self.take()
+        if kind == "string":
+            node: tuple = ("literal", value[1:-1].replace("''", "'"))
+        elif kind == "number":
+            node = ("literal", value)
+        elif kind == "name" and value in ("true", "false", "null"):
+            node = ("literal", value)
+        elif kind == "name":
+            self.take("(")
+            arguments = []
+            if self.peek() != ")":
+                arguments.append(self.expression())
+                while self.peek() == ",":
+                    self.take(",")
+                    arguments.append(self.expression())
+            self.take(")")
+            node = ("call", value, arguments)
+        else:
+            raise Unresolved(f"unexpected {value}")
+
+        keys = []
+        while self.peek() in (".", "["):
+            if self.take()[1] == ".":
+                kind, value = self.take()
+                if kind != "name":
+                    raise Unresolved(f"unexpected {value}")
+                keys.append(("literal", value))
+            else:
+                keys.append(self.expression())
+                self.take("]")
+        return ("access", node, keys) if keys else node
+
+
+@functools.lru_cache(maxsize=4096)
+def parseExpression(text: str) -> tuple | None:
+    # None when the text isn't a valid expression of the supported subset
+    try:
+        return Parser(text).parse()
+    except Unresolved:
+        return None
+
+
+def evaluateNode(node: tuple, binding: dict[tuple[str, str], str]) -> str:
+    if node[0] == "literal":
+        return node[1]
+    if node[0] == "call":
+        name, arguments = node[1], node[2]
+        values = [evaluateNode(argument, binding) for argument in arguments]
+        if name == "concat":
+            return "".join(values)
+        if name == "replace" and len(values) == 3:
+            return values[0].replace(values[1], values[2])
+        raise Unresolved(name)
+    # pipeline().parameters.X and pipeline().globalParameters.X
+    base, keys = node[1], node[2]
+    if base != ("call", "pipeline", []) or len(keys) != 2:
+        raise Unresolved("access")
+    scope = evaluateNode(keys[0], binding)
+    value = binding.get((scope, evaluateNode(keys[1], binding)))
+    if scope not in PARAMETER_SCOPES or value is None:
+        raise Unresolved(scope)
+    return value
+
+
+def nodeParameters(node: tuple, found: set[tuple[str, str]]) -> bool:
+    """
+    Add the (scope, name) of every parameter the node reads to found, False when a name
+    is itself computed, ex. pipeline().parameters[concat('a', 'b')].
+    """
+    if node[0] == "literal":
+        return True
+    if node[0] == "call":
+        return all(nodeParameters(argument, found) for argument in node[2])
+    base, keys = node[1], node[2]
+    if base == ("call", "pipeline", []) and len(keys) == 2:
+        if keys[0][0] != "literal" or keys[1][0] != "literal":
+            return False
+        found.add((keys[0][1], keys[1][1]))
+        return True
+    return nodeParameters(base, found) and all(
+        nodeParameters(key, found) for key in keys
+    )
+
+
+@functools.lru_cache(maxsize=4096)
+def referencedParameters(text: str) -> tuple[tuple[str, str], ...] | None:
+    # the parameters text reads, sorted, None when that can't be told without evaluating
+    if text.startswith("@") and not text.startswith(("@@", "@{")):
+        expressions = [text[1:]]
+    else:
+        expressions = INTERPOLATION_PATTERN.findall(text)
+    found: set[tuple[str, str]] = set()
+    for expression in expressions:
+        node = parseExpression(expression)
+        # an expression that doesn't parse is never resolved, whatever the parameters
+        if node is not None and not nodeParameters(node, found):
+            return None
+    return tuple(sorted(found))
+
+
+def evaluate(text: str, binding: Binding) -> str | None:
+    """
+    The value of a pipeline property with binding's parameters, None if it can't be known.
+    Memoized per text and the values of only the parameters it references, so a template
+    shared by many pipelines is evaluated once however their other parameters differ.
+    Text that doesn't start with @ is a plain string, @@ escapes a leading @, and @{...}
+    inside a string is replaced by the value of the expression between the braces.
+    """
+    if text.startswith("@@"):
+        return text[1:]
+    references = referencedParameters(text)
+    if references is None:
+        return evaluateWith(text, bindingKey(binding))
+    return evaluateWith(
+        text, tuple((reference, binding.get(reference)) for reference in references)
+    )
+
+
+@functools.lru_cache(maxsize=65536)
+def evaluateWith(text: str, values: Values) -> str | None:
+    # values are the parameters text references, the missing ones left out
+    binding = {reference: value for reference, value in values if value is not None}
+    try:
+        if text.startswith("@") and not text.startswith("@{"):
+            node = parseExpression(text[1:])
+            if node is None:
+                return None
+            return evaluateNode(node, binding)
+
+        def interpolate(match: re.Match) -> str:
+            node = parseExpression(match.group(1))
+            if node is None:
+                raise Unresolved(match.group(1))
+            return evaluateNode(node, binding)
+
+        return INTERPOLATION_PATTERN.sub(interpolate, text)
+    except Unresolved:
+        return None
+
+
+@functools.lru_cache(maxsize=4096)
+def usesParameters(text: str) -> bool:
+    # whether the value could change with the parameters a caller passes
+    return "pipeline()" in text.replace(" ", "")
+
+
+def expressionLiterals(value: str) -> str:
+    """
+    What's left of an expression that can't be evaluated: its literals and the text around
+    @{...}, ex. the SQL of @concat('SELECT ...', variables('x')).
+    """
+    if value.startswith("@") and not value.startswith(("@@", "@{")):
+        literals = re.findall(r"'((?:[^']|'')*)'", value)
+        return " ".join(literal.replace("''", "'") for literal in literals)
+    return INTERPOLATION_PATTERN.sub(" ", value)
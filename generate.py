@@ -0,0 +1,322 @@
+import argparse
+import csv
+import json
+import os
+import random
+from dataclasses import asdict, dataclass, fields
+
+SCHEMAS = ["dbo", "dbo", "dbo", "staging", "mart", "etl"]
+WORDS = [
+    "Customer",
+    "Order",
+    "Invoice",
+    "Product",
+    "Account",
+    "Ledger",
+    "Shipment",
+    "Vendor",
+    "Employee",
+    "Payment",
+    "Region",
+    "Calendar",
+    "Inventory",
+    "Contract",
+    "Claim",
+    "Policy",
+]
+COLUMNS = ["ID", "Name", "Amount", "CreatedAt", "UpdatedAt", "Status", "Code"]
+
+
+@dataclass
+class GeneratorConfig:
+    """
+    Everything is derived from Seed, so the same config always writes the same files.
+    """
+
+    Tables: int = 1000
+    Views: int = 200
+    StoredProcedures: int = 500
+    Pipelines: int = 200
+    ReferencesPerDefinition: int = 8  # tables/views/procedures named in each definition
+    DefinitionLength: int = 2000  # approximate characters per definition
+    ActivitiesPerPipeline: int = 6
+    FanOut: int = 2  # ExecutePipeline activities per pipeline
+    Depth: int = 4  # levels of pipelines running pipelines
+    Nesting: int = 2  # IfCondition/ForEach levels the activities are wrapped in
+    MissingRate: float = 0.02  # share of references to objects that don't exist
+    Seed: int = 0
+
+
+class Generator:
+    def __init__(self, config: GeneratorConfig):
+        self.config = config
+        self.random = random.Random(config.Seed)
+        self.tables = self.objectNames("", config.Tables)
+        self.views = self.objectNames("vw_", config.Views)
+        self.stored_procedures = self.objectNames("usp_", config.StoredProcedures)
+        self.pipelines = [f"PL_{index:05d}" for index in range(config.Pipelines)]
+
+    def objectNames(self, prefix: str, count: int) -> list[str]:
+        names = []
+        for index in range(count):
+            schema = self.random.choice(SCHEMAS)
+            words = "_".join(self.random.sample(WORDS, 2))
+            names.append(f"{schema}.{prefix}{words}_{index}")
+        return names
+
+    def reference(self, name: str) -> str:
+        # the same object is written the ways people actually write it
+        schema, object_name = name.split(".", 1)
+        style = self.random.randrange(4)
+        if style == 0:
+            return name
+        if style == 1:
+            return f"[{schema}].[{object_name}]"
+        if style == 2 and schema == "dbo":
+            return object_name
+        return f"{schema}.[{object_name}]"
+
+    def pickReferences(self, candidates: list[str]) -> list[str]:
+        picked = []
+        for _ in range(self.config.ReferencesPerDefinition):
+            if self.random.random() < self.config.MissingRate or not candidates:
+                picked.append(f"dbo.Missing_{self.random.randrange(10**6)}")
+            else:
+                picked.append(self.random.choice(candidates))
+        return picked
+
+    def filler(self, length: int) -> str:
+        lines = []
+        size = 0
+        while size < length:
+            column = self.random.choice(COLUMNS)
+            line = self.random.choice(
+                [
+                    f"    -- check {column} before the load, see dbo.NotATable_{size}",
+                    f"    SET @{column} = '{column} from dbo.InAString' + @{column};",
+                    f"    /* {column} /* nested */ FROM dbo.InAComment */",
+                    f"    IF @{column} IS NULL SET @{column} = {size};",
+                ]
+            )
+            lines.append(line)
+            size += len(line) + 1
+        return "\n".join(lines)
+
+    def selectStatement(self, references: list[str]) -> str:
+        first, *rest = references
+        sql = f"SELECT t0.{self.random.choice(COLUMNS)} FROM {self.reference(first)} t0"
+        for index, name in enumerate(rest, start=1):
+            column = self.random.choice(COLUMNS)
+            sql += f"\n    LEFT JOIN {self.reference(name)} t{index} ON t{index}.{column} = t0.{column}"
+        return sql
+
+    def viewDefinition(self, index: int, name: str) -> str:
+        # views can read earlier views, so there are view -> view chains
+        references = self.pickReferences(self.tables + self.views[:index])
+        header = f"CREATE VIEW {self.reference(name)} AS\n"
+        return header + self.selectStatement(references) + "\n" + self.comment()
+
+    def storedProcedureDefinition(self, index: int, name: str) -> str:
+        references = self.pickReferences(self.tables + self.views)
+        target = self.reference(self.random.choice(self.tables))
+        body = [
+            f"CREATE PROCEDURE {self.reference(name)} @Status INT AS",
+            "BEGIN",
+            self.filler(self.config.DefinitionLength // 2),
+            f"    INSERT INTO {target}",
+            "    " + self.selectStatement(references),
+            self.filler(self.config.DefinitionLength // 2),
+        ]
+        if index > 0 and self.random.random() < 0.3:
+            callee = self.random.choice(self.stored_procedures[:index])
+            body.append(f"    EXEC {self.reference(callee)} @Status")
+        body.append("END")
+        return "\n".join(body)
+
+    def comment(self) -> str:
+        return f"-- generated, seed {self.config.Seed}"
+
+    def writeCatalog(self, mssql_dir: str):
+        os.makedirs(mssql_dir, exist_ok=True)
+        with open(os.path.join(mssql_dir, "Tables.csv"), "w") as tables_file:
+            for table in self.tables:
+                tables_file.write(f"{table}\n")
+        for file_name, names, definition in (
+            ("Views.csv", self.views, self.viewDefinition),
+            (
+                "StoredProcedures.csv",
+                self.stored_procedures,
+                self.storedProcedureDefinition,
+            ),
+        ):
+            with open(os.path.join(mssql_dir, file_name), "w", newline="") as file:
+                # same layout as SSMS "Copy with Headers"
+                writer = csv.writer(file, delimiter="\t")
+                writer.writerow(["(No column name)", "definition"])
+                for index, name in enumerate(names):
+                    writer.writerow([name, definition(index, name)])
+
+    def activity(self, name: str, activity_type: str, type_properties: dict) -> dict:
+        return {
+            "name": name,
+            "type": activity_type,
+            "dependsOn": [],
+            "typeProperties": type_properties,
+        }
+
+    def leafActivity(self, name: str) -> dict:
+        kind = self.random.randrange(4)
+        if kind == 0:
+            stored_procedure = self.pickReferences(self.stored_procedures)[0]
+            return self.activity(
+                name,
+                "SqlServerStoredProcedure",
+                {"storedProcedureName": self.reference(stored_procedure)},
+            )
+        references = self.pickReferences(self.tables + self.views)[:3]
+        query = self.selectStatement(references)
+        if kind == 1:
+            return self.activity(
+                name,
+                "Lookup",
+                {
+                    "source": {
+                        "type": "AzureSqlSource",
+                        "sqlReaderQuery": {
+                            "type": "Expression",
+                            "value": "@concat('"
+                            + query.replace("'", "''")
+                            + " WHERE 1 = ', pipeline().parameters.Flag)",
+                        },
+                    }
+                },
+            )
+        if kind == 2:
+            return self.activity(
+                name,
+                "Copy",
+                {
+                    "source": {"type": "AzureSqlSource", "sqlReaderQuery": query},
+                    "sink": {"type": "ParquetSink"},
+                },
+            )
+        return self.activity(
+            name, "Script", {"scripts": [{"type": "Query", "text": query}]}
+        )
+
+    def nested(self, name: str, activities: list[dict], level: int) -> list[dict]:
+        for depth in range(level):
+            if self.random.random() < 0.5:
+                activities = [
+                    self.activity(
+                        f"{name} if {depth}",
+                        "IfCondition",
+                        {
+                            "expression": {"type": "Expression", "value": "@true"},
+                            "ifTrueActivities": activities,
+                            "ifFalseActivities": [],
+                        },
+                    )
+                ]
+            else:
+                activities = [
+                    self.activity(
+                        f"{name} each {depth}",
+                        "ForEach",
+                        {
+                            "items": {"type": "Expression", "value": "@range(0, 2)"},
+                            "activities": activities,
+                        },
+                    )
+                ]
+        return activities
+
+    def pipelineLevels(self) -> list[list[str]]:
+        # pipelines only run pipelines of the next level, so the call graph has Depth levels
+        depth = max(1, self.config.Depth)
+        levels: list[list[str]] = [[] for _ in range(depth)]
+        for index, pipeline_name in enumerate(self.pipelines):
+            levels[index * depth // max(1, len(self.pipelines))].append(pipeline_name)
+        return levels
+
+    def pipeline(self, pipeline_name: str, children: list[str]) -> dict:
+        activities = []
+        for index in range(self.config.ActivitiesPerPipeline):
+            activity = self.leafActivity(f"{pipeline_name} step {index}")
+            activities += self.nested(activity["name"], [activity], self.config.Nesting)
+        if children:
+            for index in range(self.config.FanOut):
+                child = self.random.choice(children)
+                activities.append(
+                    self.activity(
+                        f"{pipeline_name} run {index}",
+                        "ExecutePipeline",
+                        {
+                            "pipeline": {
+                                "referenceName": child,
+                                "type": "PipelineReference",
+                            },
+                            "waitOnCompletion": True,
+                        },
+                    )
+                )
+        return {
+            "name": pipeline_name,
+            "properties": {
+                "activities": activities,
+                "parameters": {"Flag": {"type": "string", "defaultValue": "1"}},
+            },
+        }
+
+    def writePipelines(self, pipeline_dir: str):
+        os.makedirs(pipeline_dir, exist_ok=True)
+        levels = self.pipelineLevels()
+        for level, pipeline_names in enumerate(levels):
+            children = levels[level + 1] if level + 1 < len(levels) else []
+            for pipeline_name in pipeline_names:
+                pipeline_json = self.pipeline(pipeline_name, children)
+                path = os.path.join(pipeline_dir, f"{pipeline_name}.json")
+                with open(path, "w") as pipeline_file:
+                    json.dump(pipeline_json, pipeline_file, indent=2)
+
+
+def generate(config: GeneratorConfig, output_dir: str) -> tuple[str, str]:
+    """
+    Write <output_dir>/MSSQL (Tables.csv, Views.csv, StoredProcedures.csv) and
+    <output_dir>/pipelines, ready to be used as MSSQL_SERVER_DATA_DIR and PIPELINE_DIR.
+    """
+    generator = Generator(config)
+    mssql_dir = os.path.join(output_dir, "MSSQL")
+    pipeline_dir = os.path.join(output_dir, "pipelines")
+    generator.writeCatalog(mssql_dir)
+    generator.writePipelines(pipeline_dir)
+    return mssql_dir, pipeline_dir
+
+
+def addConfigArguments(parser: argparse.ArgumentParser):
+    for config_field in fields(GeneratorConfig):
+        parser.add_argument(
+            f"--{config_field.name}",
+            type=type(config_field.default),
+            default=config_field.default,
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Generate a seeded SQL Server catalog and ADF pipelines"
+    )
+    parser.add_argument("output_dir")
+    addConfigArguments(parser)
+    arguments = vars(parser.parse_args())
+    output_dir = arguments.pop("output_dir")
+    config = GeneratorConfig(**arguments)
+
+    mssql_dir, pipeline_dir = generate(config, output_dir)
+    print(json.dumps(asdict(config)))
+    print("MSSQL_SERVER_DATA_DIR =", mssql_dir)
+    print("PIPELINE_DIR =", pipeline_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,445 @@
+from array import array
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Iterator
+
+TABLE = "table"
+VIEW = "view"
+STORED_PROCEDURE = "stored_procedure"
+PIPELINE = "pipeline"
+DATAFLOW = "dataflow"
+
+# groups each kind of object has under it, in the order they're exported
+GROUPS: dict[str, tuple[str, ...]] = {
+    TABLE: (),
+    VIEW: ("Tables",),
+    STORED_PROCEDURE: ("Tables", "Views"),
+    PIPELINE: ("Tables", "Stored Procedures", "Dependent Pipelines"),
+}
+MISSING_GROUP = "Nonexistent"
+CIRCULAR_GROUP = "Circular Pipelines"
+
+
+# every edge group, including the ones that aren't exported as part of a diagram
+# views on views and procedures that EXEC procedures only count towards the closure and reports
+RELATIONS: dict[tuple[str, str], str] = {
+    (VIEW, "Tables"): TABLE,
+    (VIEW, "Views"): VIEW,
+    (STORED_PROCEDURE, "Tables"): TABLE,
+    (STORED_PROCEDURE, "Views"): VIEW,
+    (STORED_PROCEDURE, "Stored Procedures"): STORED_PROCEDURE,
+    (PIPELINE, "Tables"): TABLE,
+    (PIPELINE, "Stored Procedures"): STORED_PROCEDURE,
+    (PIPELINE, "Dependent Pipelines"): PIPELINE,
+    (PIPELINE, "Data Flows"): DATAFLOW,
+}
+NO_CYCLE = -1
+
+
+class Adjacency:
+    """
+    CSR rows: the neighbours of node i are targets[offsets[i]:offsets[i + 1]],
+    with the matching reference counts in counts.
+    """
+
+    __slots__ = ("offsets", "targets", "counts")
+
+    def __init__(self, keys: array, values: array, counts: array, size: int):
+        # counting sort by key, stable, so every row keeps the order edges were added in
+        offsets = array("i", bytes(4 * (size + 1)))
+        for key in keys:
+            offsets[key + 1] += 1
+        for index in range(size):
+            offsets[index + 1] += offsets[index]
+        position = offsets[:-1]
+        self.targets = array("i", bytes(4 * len(keys)))
+        self.counts = array("i", bytes(4 * len(keys)))
+        for key, value, count in zip(keys, values, counts):
+            slot = position[key]
+            self.targets[slot] = value
+            self.counts[slot] = count
+            position[key] = slot + 1
+        self.offsets = offsets
+
+    def size(self) -> int:
+        return len(self.offsets) - 1
+
+    def row(self, node_id: int) -> Iterator[tuple[int, int]]:
+        start, end = self.offsets[node_id], self.offsets[node_id + 1]
+        return zip(self.targets[start:end], self.counts[start:end])
+
+
+class Relation:
+    """
+    Edges of one group, kept as three parallel int arrays in the order they were added.
+    The CSR forward (parent -> children) and reverse (child -> parents) indexes are built
+    on first read and dropped whenever another edge is added.
+    """
+
+    __slots__ = ("sources", "targets", "counts", "forward", "reverse")
+
+    def __init__(self):
+        self.sources = array("i")
+        self.targets = array("i")
+        self.counts = array("i")
+        self.forward: Adjacency | None = None
+        self.reverse: Adjacency | None = None
+
+    def add(self, source: int, target: int, count: int):
+        self.sources.append(source)
+        self.targets.append(target)
+        self.counts.append(count)
+        self.forward = self.reverse = None
+
+    def __len__(self) -> int:
+        return len(self.sources)
+
+
+class DependencyGraph:
+    """
+    Every table, view, stored procedure, pipeline and data flow name is interned once to an
+    integer ID per kind, everything else is int arrays indexed by that ID.
+    An edge carries how often the parent references the child, for pipelines that's how many
+    activities or queries made the reference.
+    Objects that are referenced but don't exist (a stored procedure that isn't in the catalog,
+    a pipeline that isn't in the repo) are nodes flagged as missing.
+    """
+
+    def __init__(self):
+        kinds = list(GROUPS) + [DATAFLOW]
+        self.ids: dict[str, dict[str, int]] = {kind: {} for kind in kinds}
+        self.names: dict[str, list[str]] = {kind: [] for kind in kinds}
+        self.hashes: dict[str, list[str]] = {kind: [] for kind in kinds}
+        self.missing: dict[str, bytearray] = {kind: bytearray() for kind in kinds}
+        # ID of the cycle a node is part of, NO_CYCLE for most nodes
+        self.cycles: dict[str, array] = {kind: array("i") for kind in kinds}
+        self.relations = {key: Relation() for key in RELATIONS}
+
+    def add(self, kind: str, name: str, missing: bool = False) -> int:
+        node_id = self.ids[kind].get(name)
+        if node_id is None:
+            node_id = len(self.names[kind])
+            self.ids[kind][name] = node_id
+            self.names[kind].append(name)
+            self.hashes[kind].append("")
+            self.missing[kind].append(missing)
+            self.cycles[kind].append(NO_CYCLE)
+        return node_id
+
+    def get(self, kind: str, name: str) -> int | None:
+        return self.ids[kind].get(name)
+
+    def name(self, kind: str, node_id: int) -> str:
+        return self.names[kind][node_id]
+
+    def size(self, kind: str) -> int:
+        return len(self.names[kind])
+
+    def existing(self, kind: str) -> list[int]:
+        missing = self.missing[kind]
+        return [node_id for node_id in range(len(missing)) if not missing[node_id]]
+
+    def isMissing(self, kind: str, node_id: int) -> bool:
+        return self.missing[kind][node_id] == 1
+
+    def link(self, kind: str, parent: int, group: str, child: int, count: int = 1):
+        self.relations[(kind, group)].add(parent, child, count)
+
+    def forwardIndex(self, kind: str, group: str) -> Adjacency:
+        relation = self.relations[(kind, group)]
+        size = self.size(kind)
+        if relation.forward is None or relation.forward.size() != size:
+            relation.forward = Adjacency(
+                relation.sources, relation.targets, relation.counts, size
+            )
+        return relation.forward
+
+    def reverseIndex(self, kind: str, group: str) -> Adjacency:
+        relation = self.relations[(kind, group)]
+        size = self.size(RELATIONS[(kind, group)])
+        if relation.reverse is None or relation.reverse.size() != size:
+            relation.reverse = Adjacency(
+                relation.targets, relation.sources, relation.counts, size
+            )
+        return relation.reverse
+
+    def buildIndexes(self):
+        # build every index up front, before several threads start reading the graph
+        for kind, group in self.relations:
+            self.forwardIndex(kind, group)
+            self.reverseIndex(kind, group)
+
+    def children(self, kind: str, parent: int, group: str) -> Iterator[tuple[int, int]]:
+        # (child ID, count) in the order the edges were added
+        return self.forwardIndex(kind, group).row(parent)
+
+    def parents(self, kind: str, group: str, child: int) -> Iterator[tuple[int, int]]:
+        # (parent ID, count) for the edges of kind/group that point at child
+        return self.reverseIndex(kind, group).row(child)
+
+    def incomingTotals(self, kind: str) -> array:
+        # total references to every node of kind, one pass over each relation's count array
+        totals = array("q", bytes(8 * self.size(kind)))
+        for key, child_kind in RELATIONS.items():
+            if child_kind == kind:
+                relation = self.relations[key]
+                for target, count in zip(relation.targets, relation.counts):
+                    totals[target] += count
+        return totals
+
+    def outgoingTotals(self, kind: str, group: str) -> array:
+        totals = array("q", bytes(8 * self.size(kind)))
+        relation = self.relations[(kind, group)]
+        for source, count in zip(relation.sources, relation.counts):
+            totals[source] += count
+        return totals
+
+    def edgeCount(self, kind: str) -> int:
+        return sum(
+            len(relation)
+            for (parent_kind, _), relation in self.relations.items()
+            if parent_kind == kind
+        )
+
+    def copy(self) -> "DependencyGraph":
+        # independent copy of the nodes and edges, the indexes are rebuilt on first read
+        copied = DependencyGraph()
+        for kind in self.names:
+            copied.ids[kind] = dict(self.ids[kind])
+            copied.names[kind] = list(self.names[kind])
+            copied.hashes[kind] = list(self.hashes[kind])
+            copied.missing[kind] = bytearray(self.missing[kind])
+            copied.cycles[kind] = array("i", self.cycles[kind])
+        for key, relation in self.relations.items():
+            copied_relation = copied.relations[key]
+            copied_relation.sources = array("i", relation.sources)
+            copied_relation.targets = array("i", relation.targets)
+            copied_relation.counts = array("i", relation.counts)
+        return copied
+
+    def closureCounts(self) -> tuple[dict[str, array], dict[str, array]]:
+        """
+        (downstream, upstream) per kind: how many existing objects a node reaches through any
+        chain of references, and how many reach it. See reachableCounts.
+        """
+        first_ids: dict[str, int] = {}
+        size = 0
+        for kind in self.names:
+            first_ids[kind] = size
+            size += self.size(kind)
+        children: list[list[int]] = [[] for _ in range(size)]
+        parents: list[list[int]] = [[] for _ in range(size)]
+        for (kind, group), relation in self.relations.items():
+            parent_first = first_ids[kind]
+            child_first = first_ids[RELATIONS[(kind, group)]]
+            for source, target in zip(relation.sources, relation.targets):
+                children[parent_first + source].append(child_first + target)
+                parents[child_first + target].append(parent_first + source)
+        counted = [not missing for kind in self.names for missing in self.missing[kind]]
+
+        def perKind(counts: list[int]) -> dict[str, array]:
+            return {
+                kind: array("i", counts[first : first + self.size(kind)])
+                for kind, first in first_ids.items()
+            }
+
+        return (
+            perKind(reachableCounts(children, counted)),
+            perKind(reachableCounts(parents, counted)),
+        )
+
+    def setCycle(self, kind: str, node_id: int, cycle: int):
+        self.cycles[kind][node_id] = cycle
+
+    def isCircular(self, kind: str, parent: int, child: int) -> bool:
+        cycle = self.cycles[kind][parent]
+        return cycle != NO_CYCLE and cycle == self.cycles[kind][child]
+
+
+@dataclass
+class PipelineResolution:
+    Order: list[str] = field(default_factory=list)  # dependent pipelines come first
+    Cycles: list[list[str]] = field(default_factory=list)
+    Missing: dict[str, list[str]] = field(default_factory=dict)  # key: pipeline_name
+    CycleOf: dict[str, int] = field(default_factory=dict)  # value: index in Cycles
+
+
+def resolvePipelineOrder(dependencies: dict[str, list[str]]) -> PipelineResolution:
+    """
+    Order the ExecutePipeline graph so every pipeline comes after the pipelines it runs.
+    Kahn's algorithm, then Tarjan's SCC over whatever is left to name the cycles.
+    Linear in pipelines + edges.
+    """
+    resolution = PipelineResolution()
+    remaining: dict[str, int] = {}  # key: pipeline_name, value: unresolved children
+    parents: dict[str, list[str]] = {name: [] for name in dependencies}
+    children_of: dict[str, list[str]] = {}
+    for pipeline_name, children in dependencies.items():
+        known_children = []
+        for child in dict.fromkeys(children):
+            if child in dependencies:
+                known_children.append(child)
+                parents[child].append(pipeline_name)
+            else:
+                resolution.Missing.setdefault(pipeline_name, []).append(child)
+        children_of[pipeline_name] = known_children
+        remaining[pipeline_name] = len(known_children)
+
+    queue = deque(name for name, count in remaining.items() if count == 0)
+    while queue:
+        pipeline_name = queue.popleft()
+        resolution.Order.append(pipeline_name)
+        for parent in parents[pipeline_name]:
+            remaining[parent] -= 1
+            if remaining[parent] == 0:
+                queue.append(parent)
+
+    unresolved = [name for name, count in remaining.items() if count > 0]
+    if unresolved:
+        for component in stronglyConnectedComponents(unresolved, children_of):
+            first = component[0]
+            if len(component) > 1 or first in children_of[first]:
+                for name in component:
+                    resolution.CycleOf[name] = len(resolution.Cycles)
+                resolution.Cycles.append(component)
+            # Tarjan emits components children first, so this is still a valid order
+            resolution.Order.extend(component)
+    return resolution
+
+
+def stronglyConnectedComponents(
+    names: list[str], children_of: dict[str, list[str]]
+) -> list[list[str]]:
+    # iterative Tarjan, restricted to the given names so it can't hit the recursion limit
+    allowed = set(names)
+    children_in = {
+        name: [child for child in children_of[name] if child in allowed]
+        for name in names
+    }
+    index: dict[str, int] = {}
+    lowlink: dict[str, int] = {}
+    on_stack: set[str] = set()
+    stack: list[str] = []
+    components: list[list[str]] = []
+
+    for root in names:
+        if root in index:
+            continue
+        work = [(root, 0)]
+        while work:
+            name, child_index = work.pop()
+            if child_index == 0:
+                index[name] = lowlink[name] = len(index)
+                stack.append(name)
+                on_stack.add(name)
+            children = children_in[name]
+            if child_index < len(children):
+                work.append((name, child_index + 1))
+                child = children[child_index]
+                if child not in index:
+                    work.append((child, 0))
+                elif child in on_stack:
+                    lowlink[name] = min(lowlink[name], index[child])
+                continue
+            for child in children:
+                if child in on_stack:
+                    lowlink[name] = min(lowlink[name], lowlink[child])
+            if lowlink[name] == index[name]:
+                component = []
+                while True:
+                    member = stack.pop()
+                    on_stack.discard(member)
+                    component.append(member)
+                    if member == name:
+                        break
+                components.append(component)
+    return components
+
+
+def reachableCounts(successors: list[list[int]], counted: list[bool]) -> list[int]:
+    """
+    For every node, how many other counted nodes can be reached from it.
+    Cycles are condensed with Tarjan's SCC first. Tarjan emits components successors first,
+    so each component's reach is its own members OR'd with the already finished reach of its
+    successors, as Python int bitsets. A bitset is dropped once every component that
+    needs it is done. Linear in nodes + edges, plus the bitset ORs.
+    """
+    components = stronglyConnectedComponents(list(range(len(successors))), successors)
+    component_of = [0] * len(successors)
+    for component_id, component in enumerate(components):
+        for node in component:
+            component_of[node] = component_id
+
+    # successor components of each component, and how many components still need its reach
+    next_components: list[set[int]] = []
+    waiting = [0] * len(components)
+    for component_id, component in enumerate(components):
+        targets = {
+            component_of[child] for node in component for child in successors[node]
+        }
+        targets.discard(component_id)
+        next_components.append(targets)
+        for target in targets:
+            waiting[target] += 1
+
+    reach: list[int | None] = [None] * len(components)
+    counts = [0] * len(successors)
+    for component_id, component in enumerate(components):
+        bits = 0
+        for node in component:
+            if counted[node]:
+                bits |= 1 << node
+        for target in next_components[component_id]:
+            bits |= reach[target]
+            waiting[target] -= 1
+            if waiting[target] == 0:
+                reach[target] = None
+        total = bits.bit_count()
+        for node in component:
+            counts[node] = total - 1 if counted[node] else total
+        if waiting[component_id] > 0:
+            reach[component_id] = bits
+    return counts
+
+
+# an item of an exported tree: (kind, node ID) for an object, (None, label, items) otherwise
+TreeItem = tuple
+
+
+def treeChildren(graph: DependencyGraph, kind: str, node_id: int) -> list[TreeItem]:
+    """
+    What goes under an object in an exported tree, objects are expanded lazily by the caller.
+    A pipeline's children appear once per reference, missing ones under Nonexistent and
+    pipelines in the same cycle under Circular Pipelines.
+    """
+    items: list[TreeItem] = []
+    repeat = kind == PIPELINE
+    missing: dict[str, list[TreeItem]] = {group: [] for group in GROUPS[kind]}
+    circular: list[TreeItem] = []
+    for group in GROUPS[kind]:
+        child_kind = RELATIONS[(kind, group)]
+        group_items: list[TreeItem] = []
+        for child, count in graph.children(kind, node_id, group):
+            for _ in range(count if repeat else 1):
+                if graph.isMissing(child_kind, child):
+                    missing[group].append((None, graph.name(child_kind, child), []))
+                elif child_kind == kind and graph.isCircular(kind, node_id, child):
+                    circular.append((None, graph.name(child_kind, child), []))
+                else:
+                    group_items.append((child_kind, child))
+        items.append((None, group, group_items))
+
+    if kind == PIPELINE:
+        missing_items = [(None, group, names) for group, names in missing.items()]
+        items.append((None, MISSING_GROUP, missing_items))
+        if len(circular) > 0:
+            items.append((None, CIRCULAR_GROUP, circular))
+    return items
+
+
+def expandItem(graph: DependencyGraph, item: TreeItem) -> tuple[str, list[TreeItem]]:
+    # (name, children) of any tree item
+    if item[0] is None:
+        return item[1], item[2]
+    kind, node_id = item
+    return graph.name(kind, node_id), treeChildren(graph, kind, node_id)
@@ -0,0 +1,219 @@
+import argparse
+import json
+import os
+import sqlite3
+
+from dotenv import load_dotenv
+
+from graph import RELATIONS, DependencyGraph
+from tsql import DOT, qualifiedCandidates, tokenize
+
+INDEX_NAME = "dependencies.sqlite"
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE info (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE objects (
+    object_id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    missing INTEGER NOT NULL,
+    hash TEXT NOT NULL
+);
+CREATE TABLE edges (
+    parent_id INTEGER NOT NULL,
+    child_id INTEGER NOT NULL,
+    grp TEXT NOT NULL,
+    count INTEGER NOT NULL
+);
+"""
+
+# built after the rows are in, which is much faster than maintaining them on every insert
+INDEXES = """
+CREATE INDEX objects_name ON objects (name COLLATE NOCASE);
+CREATE INDEX edges_forward ON edges (parent_id, child_id);
+CREATE INDEX edges_reverse ON edges (child_id, parent_id);
+"""
+
+# SQLite's default limit on ? parameters is 999 on older builds
+QUERY_BATCH = 500
+
+
+def writeIndex(graph: DependencyGraph, path: str):
+    """
+    Write the whole graph to a new SQLite file and swap it in, so readers never see a
+    half written index. A node's object_id is its graph ID plus the size of the kinds before it.
+    """
+    first_ids: dict[str, int] = {}
+    next_id = 0
+    for kind in graph.names:
+        first_ids[kind] = next_id
+        next_id += graph.size(kind)
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temporary_path = path + ".tmp"
+    if os.path.exists(temporary_path):
+        os.remove(temporary_path)
+    connection = sqlite3.connect(temporary_path)
+    try:
+        connection.executescript(SCHEMA)
+        connection.execute(
+            "INSERT INTO info VALUES ('version', ?)", (str(SCHEMA_VERSION),)
+        )
+        for kind, first_id in first_ids.items():
+            connection.executemany(
+                "INSERT INTO objects VALUES (?, ?, ?, ?, ?)",
+                (
+                    (first_id + node_id, kind, name, missing, node_hash)
+                    for node_id, (name, missing, node_hash) in enumerate(
+                        zip(graph.names[kind], graph.missing[kind], graph.hashes[kind])
+                    )
+                ),
+            )
+        for (kind, group), relation in graph.relations.items():
+            parent_first = first_ids[kind]
+            child_first = first_ids[RELATIONS[(kind, group)]]
+            connection.executemany(
+                "INSERT INTO edges VALUES (?, ?, ?, ?)",
+                (
+                    (parent_first + source, child_first + target, group, count)
+                    for source, target, count in zip(
+                        relation.sources, relation.targets, relation.counts
+                    )
+                ),
+            )
+        connection.executescript(INDEXES)
+        connection.commit()
+    finally:
+        connection.close()
+    os.replace(temporary_path, path)
+
+
+def nameCandidates(text: str) -> list[str]:
+    # "X", "dbo.X" and "[dbo].[X]" all find dbo.X, pipelines are matched by their plain name
+    parts = tuple(value for kind, value, _ in tokenize(text) if kind != DOT)
+    return list(dict.fromkeys(qualifiedCandidates(parts) + (text.strip(),)))
+
+
+def findObjects(connection, text: str, kind: str | None) -> list[tuple]:
+    for candidate in nameCandidates(text):
+        query = "SELECT object_id, kind, name, missing FROM objects WHERE name = ? COLLATE NOCASE"
+        parameters: tuple = (candidate,)
+        if kind is not None:
+            query += " AND kind = ?"
+            parameters += (kind,)
+        rows = connection.execute(query, parameters).fetchall()
+        if rows:
+            return rows
+    return []
+
+
+def walk(
+    connection, start_ids: list[int], upstream: bool, transitive: bool
+) -> list[dict]:
+    """
+    Breadth first over the edge index, one query per level and batch.
+    upstream=True follows edges to the objects that reference the start objects (dependents),
+    otherwise to the objects the start objects reference (dependencies).
+    Every object is reported once, at the depth it was first reached.
+    """
+    near, far = ("child_id", "parent_id") if upstream else ("parent_id", "child_id")
+    seen = set(start_ids)
+    frontier = list(start_ids)
+    found = []
+    depth = 0
+    while frontier:
+        depth += 1
+        next_frontier = []
+        for batch_start in range(0, len(frontier), QUERY_BATCH):
+            batch = frontier[batch_start : batch_start + QUERY_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            rows = connection.execute(
+                f"SELECT v.name, e.{far}, e.grp, e.count, o.kind, o.name, o.missing"
+                f" FROM edges e"
+                f" JOIN objects o ON o.object_id = e.{far}"
+                f" JOIN objects v ON v.object_id = e.{near}"
+                f" WHERE e.{near} IN ({placeholders})"
+                f" ORDER BY e.{near}, e.rowid",
+                batch,
+            ).fetchall()
+            for via, object_id, group, count, kind, name, missing in rows:
+                if object_id in seen:
+                    continue
+                seen.add(object_id)
+                next_frontier.append(object_id)
+                found.append(
+                    {
+                        "depth": depth,
+                        "kind": kind,
+                        "name": name,
+                        "missing": missing == 1,
+                        "group": group,
+                        "references": count,
+                        "via": via,
+                    }
+                )
+        frontier = next_frontier if transitive else []
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Query the dependency index written by report.py"
+    )
+    parser.add_argument(
+        "direction",
+        choices=("dependents", "dependencies"),
+        help="dependents: what references the object, dependencies: what it references",
+    )
+    parser.add_argument("name", help="ex. dbo.Customer, [dbo].[Customer] or a pipeline")
+    parser.add_argument("--index", help=f"defaults to reports/$OUTPUT_DIR/{INDEX_NAME}")
+    parser.add_argument("--kind", help="table, view, stored_procedure or pipeline")
+    parser.add_argument(
+        "--transitive", action="store_true", help="follow references all the way"
+    )
+    parser.add_argument("--json", action="store_true")
+    arguments = parser.parse_args()
+
+    index_path = arguments.index
+    if index_path is None:
+        load_dotenv()
+        index_path = os.path.join("reports", os.getenv("OUTPUT_DIR") or "", INDEX_NAME)
+    if not os.path.exists(index_path):
+        print(f"{index_path} does not exist, run report.py first")
+        exit(1)
+
+    connection = sqlite3.connect(f"file:{index_path}?mode=ro", uri=True)
+    try:
+        objects = findObjects(connection, arguments.name, arguments.kind)
+        if not objects:
+            print(f"{arguments.name} is not in the index")
+            exit(1)
+        results = []
+        for object_id, kind, name, _ in objects:
+            found = walk(
+                connection,
+                [object_id],
+                upstream=arguments.direction == "dependents",
+                transitive=arguments.transitive,
+            )
+            results.append({"kind": kind, "name": name, arguments.direction: found})
+    finally:
+        connection.close()
+
+    if arguments.json:
+        print(json.dumps(results, indent=2))
+        return
+    for result in results:
+        found = result[arguments.direction]
+        print(f"{result['kind']} {result['name']}: {len(found)} {arguments.direction}")
+        for item in found:
+            missing = " (nonexistent)" if item["missing"] else ""
+            print(
+                f"{'  ' * item['depth']}{item['kind']} {item['name']}{missing}"
+                f" [{item['group']} x{item['references']}, via {item['via']}]"
+            )
+
+
+if __name__ == "__main__":
+    main()
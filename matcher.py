@@ -0,0 +1,71 @@
+import threading
+
+from tsql import extractNames, qualifiedCandidates
+
+
+class NameMatcher:
+    """
+    Index over lowercased schema.object names.
+    It is built once from the whole catalog, then every definition is tokenized a single time
+    and its multi-part names are resolved with dictionary lookups.
+    """
+
+    def __init__(self, names):
+        self.names: set[str] = {name.lower() for name in names}
+
+    def resolve(self, parts: tuple[str, ...]) -> str | None:
+        for candidate in qualifiedCandidates(parts):
+            if candidate in self.names:
+                return candidate
+        return None
+
+    def resolveNames(self, names: dict[tuple[str, ...], int]) -> dict[str, int]:
+        hits: dict[str, int] = {}
+        for parts, occurrences in names.items():
+            name = self.resolve(parts)
+            if name is not None:
+                hits[name] = hits.get(name, 0) + occurrences
+        return hits
+
+    def count(self, sql: str) -> dict[str, int]:
+        """
+        Return {lowercased schema.object: references} for every known object in the SQL.
+        """
+        return self.resolveNames(extractNames(sql))
+
+
+class NameIndex:
+    """
+    The table and view names of one catalog and the matcher over them. Never changed once
+    built, so analyses of databases that share a catalog can share one, see NameIndexes.
+    """
+
+    def __init__(self, table_names: list[str], view_names: list[str]):
+        # key: lowercase name, value: name as the catalog has it
+        self.tables: dict[str, str] = {name.lower(): name for name in table_names}
+        self.views: dict[str, str] = {name.lower(): name for name in view_names}
+        self.matcher = NameMatcher(list(self.tables) + list(self.views))
+
+
+class NameIndexes:
+    """
+    NameIndex per distinct catalog, safe to use from several threads.
+    """
+
+    def __init__(self):
+        self.indexes: dict[str, NameIndex] = {}
+        self.lock = threading.Lock()
+        self.built = 0
+        self.reused = 0
+
+    def get(self, key: str, table_names: list[str], view_names: list[str]) -> NameIndex:
+        # key identifies the catalog, ex. a hash of the names in order
+        with self.lock:
+            index = self.indexes.get(key)
+            if index is None:
+                index = NameIndex(table_names, view_names)
+                self.indexes[key] = index
+                self.built += 1
+            else:
+                self.reused += 1
+            return index
@@ -0,0 +1,122 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource  # not available on Windows
+except ImportError:
+    resource = None
+
+PROFILE_MODES = ("cprofile", "tracemalloc")
+
+
+def peakRSS() -> dict[str, int] | None:
+    # ru_maxrss is the high-water mark of the process so far, in KB on Linux and bytes on macOS
+    if resource is None:
+        return None
+    unit = 1 if sys.platform == "darwin" else 1024
+    return {
+        "self_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit,
+        "children_bytes": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * unit,
+    }
+
+
+class RunMetrics:
+    """
+    Wall and CPU time per stage, the peak RSS once each stage finished, and named counters.
+    Stages nest, a stage opened inside "analyzePipelines" is recorded as "analyzePipelines.parse".
+    Stages are opened from the main thread only, counters can be bumped from any thread.
+    With profile="tracemalloc" each stage also gets its peak of traced Python allocations,
+    with profile="cprofile" the main thread is profiled for the whole run.
+    """
+
+    def __init__(self, profile: str | None = None):
+        if profile is not None and profile not in PROFILE_MODES:
+            print(f"Unknown PROFILE {profile}, expected one of {PROFILE_MODES}")
+            profile = None
+        self.profile = profile
+        self.stages: list[dict] = []
+        self.counters: dict[str, int] = {}
+        self.lock = threading.Lock()
+        self.open_stages: list[str] = []
+        self.profiler: cProfile.Profile | None = None
+        self.start_wall = time.perf_counter()
+        self.start_cpu = time.process_time()
+
+        if profile == "cprofile":
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        elif profile == "tracemalloc":
+            tracemalloc.start()
+
+    @contextmanager
+    def stage(self, name: str):
+        self.open_stages.append(name)
+        full_name = ".".join(self.open_stages)
+        if self.profile == "tracemalloc":
+            tracemalloc.reset_peak()
+        start_wall = time.perf_counter()
+        start_cpu = time.process_time()
+        try:
+            yield
+        finally:
+            stage = {
+                "name": full_name,
+                "wall_seconds": round(time.perf_counter() - start_wall, 4),
+                "cpu_seconds": round(time.process_time() - start_cpu, 4),
+                "peak_rss": peakRSS(),
+            }
+            if self.profile == "tracemalloc":
+                stage["traced_peak_bytes"] = tracemalloc.get_traced_memory()[1]
+            self.stages.append(stage)
+            self.open_stages.pop()
+
+    def count(self, name: str, amount: int = 1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def summary(self) -> list[str]:
+        return [
+            f"{stage['name']}: {stage['wall_seconds']}s wall, {stage['cpu_seconds']}s CPU"
+            for stage in self.stages
+        ]
+
+    def save(self, output_dir: str):
+        """
+        Writes run-metrics.json, plus profile.pstats/profile.txt or tracemalloc.txt
+        when a profile mode is on.
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        run = {
+            "wall_seconds": round(time.perf_counter() - self.start_wall, 4),
+            "cpu_seconds": round(time.process_time() - self.start_cpu, 4),
+            "peak_rss": peakRSS(),
+            "profile": self.profile,
+            "stages": self.stages,
+            "counters": dict(sorted(self.counters.items())),
+        }
+
+        if self.profiler is not None:
+            self.profiler.disable()
+            self.profiler.dump_stats(os.path.join(output_dir, "profile.pstats"))
+            text = io.StringIO()
+            stats = pstats.Stats(self.profiler, stream=text)
+            stats.sort_stats("cumulative").print_stats(50)
+            with open(os.path.join(output_dir, "profile.txt"), "w") as profile_file:
+                profile_file.write(text.getvalue())
+        elif self.profile == "tracemalloc":
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+            with open(os.path.join(output_dir, "tracemalloc.txt"), "w") as trace_file:
+                for statistic in snapshot.statistics("lineno")[:50]:
+                    trace_file.write(f"{statistic}\n")
+
+        with open(os.path.join(output_dir, "run-metrics.json"), "w") as metrics_file:
+            json.dump(run, metrics_file, indent=2)
@@ -0,0 +1,405 @@
+import json
+from dataclasses import dataclass, field, replace
+from typing import Iterator
+
+from expressions import (
+    Binding,
+    bindingKey,
+    evaluate,
+    expressionLiterals,
+    makeBinding,
+    parameterValue,
+    usesParameters,
+)
+from matcher import NameMatcher
+
+
+@dataclass
+class PipelineCatalog:
+    """
+    What a worker needs to know about the database to resolve a pipeline's references.
+    """
+
+    NameMatcher: NameMatcher
+    LowercaseTables: dict[str, str]  # key: lowercase table_name, value: table_name
+    StoredProcedures: set[str]
+    # key: global parameter name, value: its value in the factory
+    GlobalParameters: dict[str, str] = field(default_factory=dict)
+
+
+@dataclass
+class PipelineResult:
+    Name: str
+    FileName: str
+    Tables: list[str] = field(default_factory=list)  # one entry per query hit
+    StoredProcedures: list[str] = field(default_factory=list)
+    DependentPipelines: list[str] = field(default_factory=list)
+    BadStoredProcedures: list[str] = field(default_factory=list)
+    DataFlows: list[str] = field(default_factory=list)
+    # keep a list of tables/stored procedures/pipelines that are referenced in the pipeline
+    # we need to do this since a pipeline could reference the same activity multiple times
+    # ex. {sp: {sp_name: 2, sp_name2: 1}, table: {table_name: 1}, dp: {dp_name: 1}, df: {}}
+    TotalReferences: dict[str, dict[str, int]] = field(
+        default_factory=lambda: {"table": {}, "sp": {}, "dp": {}, "df": {}}
+    )
+    # key: parameter name, value: its default value
+    Parameters: dict[str, str] = field(default_factory=dict)
+    # [kind, text] of every stored procedure name or query using pipeline(), what they
+    # resolve to can change with the parameters a calling pipeline passes
+    ParameterizedReferences: list[list[str]] = field(default_factory=list)
+    # [pipeline name, {parameter name: value or expression}] of every Execute Pipeline
+    Calls: list[list] = field(default_factory=list)
+
+
+worker_catalog: PipelineCatalog | None = None  # set once per worker process
+
+
+def initWorker(catalog: PipelineCatalog):
+    global worker_catalog
+    worker_catalog = catalog
+
+
+def countReference(result: PipelineResult, ref_type: str, name: str):
+    ref_count = result.TotalReferences[ref_type].get(name)
+    ref_count = 1 if ref_count is None else ref_count + 1
+    result.TotalReferences[ref_type][name] = ref_count
+
+
+# kinds of ActivityReference
+STORED_PROCEDURE_REFERENCE = "stored_procedure"
+QUERY_REFERENCE = "query"
+PIPELINE_REFERENCE = "pipeline"
+DATAFLOW_REFERENCE = "dataflow"
+
+
+@dataclass
+class ActivityReference:
+    Kind: str
+    # a stored procedure, pipeline or data flow name, or the text of a query. Stored
+    # procedure names and queries can be expressions
+    Value: str
+    Activity: str  # name of the activity that made the reference
+    # parameters an Execute Pipeline passes, key: name, value: value or expression
+    Parameters: dict | None = None
+
+
+def activityDetails(activity: dict) -> dict:
+    # ADF has typeProperties, the Azure CLI schema has the properties on the activity itself
+    details = activity.get("typeProperties")
+    return activity if details is None else details
+
+
+def textValue(prop) -> str | None:
+    # properties can be a plain string or {"type": "Expression", "value": "..."}
+    if isinstance(prop, dict):
+        prop = prop.get("value")
+    return prop if isinstance(prop, str) else None
+
+
+def storedProcedureReference(prop, activity: dict) -> list[ActivityReference]:
+    name = textValue(prop)
+    if name is None:
+        return []
+    return [ActivityReference(STORED_PROCEDURE_REFERENCE, name, activity["name"])]
+
+
+def queryReference(prop, activity: dict) -> list[ActivityReference]:
+    query = textValue(prop)
+    if query is None:
+        return []
+    return [ActivityReference(QUERY_REFERENCE, query, activity["name"])]
+
+
+def sqlSourceReferences(source: dict | None, activity: dict) -> list[ActivityReference]:
+    if not source or "Sql" not in (source.get("type") or ""):
+        return []
+    return queryReference(
+        source.get("sqlReaderQuery"), activity
+    ) + storedProcedureReference(source.get("sqlReaderStoredProcedureName"), activity)
+
+
+def storedProcedureActivity(activity: dict, details: dict) -> list[ActivityReference]:
+    return storedProcedureReference(details.get("storedProcedureName"), activity)
+
+
+def lookupActivity(activity: dict, details: dict) -> list[ActivityReference]:
+    return sqlSourceReferences(details.get("source"), activity)
+
+
+def copyActivity(activity: dict, details: dict) -> list[ActivityReference]:
+    references = sqlSourceReferences(details.get("source"), activity)
+    sink = details.get("sink") or {}
+    references += storedProcedureReference(
+        sink.get("sqlWriterStoredProcedureName"), activity
+    )
+    references += queryReference(sink.get("preCopyScript"), activity)
+    return references
+
+
+def scriptActivity(activity: dict, details: dict) -> list[ActivityReference]:
+    references = []
+    for script in details.get("scripts") or []:
+        references += queryReference(script.get("text"), activity)
+    return references
+
+
+def executePipelineActivity(activity: dict, details: dict) -> list[ActivityReference]:
+    pipeline_name = details["pipeline"]["referenceName"]
+    return [
+        ActivityReference(
+            PIPELINE_REFERENCE,
+            pipeline_name,
+            activity["name"],
+            details.get("parameters") or {},
+        )
+    ]
+
+
+def executeDataFlowActivity(activity: dict, details: dict) -> list[ActivityReference]:
+    dataflow_name = (details.get("dataflow") or {}).get("referenceName")
+    if dataflow_name is None:
+        return []
+    return [ActivityReference(DATAFLOW_REFERENCE, dataflow_name, activity["name"])]
+
+
+def ifConditionChildren(details: dict) -> list[dict]:
+    return (details.get("ifTrueActivities") or []) + (
+        details.get("ifFalseActivities") or []
+    )
+
+
+def loopChildren(details: dict) -> list[dict]:
+    return details.get("activities") or []
+
+
+def switchChildren(details: dict) -> list[dict]:
+    children = []
+    for case in details.get("cases") or []:
+        children += case.get("activities") or []
+    return children + (details.get("defaultActivities") or [])
+
+
+# key: activity type, value: function returning the references the activity makes
+ACTIVITY_HANDLERS = {
+    "SqlServerStoredProcedure": storedProcedureActivity,
+    "Lookup": lookupActivity,
+    "Copy": copyActivity,
+    "Script": scriptActivity,
+    "ExecutePipeline": executePipelineActivity,
+    "ExecuteDataFlow": executeDataFlowActivity,
+}
+
+# key: container activity type, value: function returning the nested activities
+CONTAINER_HANDLERS = {
+    "IfCondition": ifConditionChildren,
+    "ForEach": loopChildren,
+    "Until": loopChildren,
+    "Switch": switchChildren,
+}
+
+
+def walkActivities(activities: list) -> Iterator[ActivityReference]:
+    """
+    Visit every activity once, nested ones right after their container.
+    An explicit stack instead of recursion, so nesting depth is never a problem.
+    """
+    stack = list(reversed(activities))
+    while stack:
+        activity = stack.pop()
+        activity_type = activity.get("type")
+        details = activityDetails(activity)
+
+        handler = ACTIVITY_HANDLERS.get(activity_type)
+        if handler is not None:
+            yield from handler(activity, details)
+
+        children = CONTAINER_HANDLERS.get(activity_type)
+        if children is not None:
+            stack.extend(reversed(children(details)))
+
+
+def storedProcedureName(text: str, binding: Binding) -> str | None:
+    # None when the name depends on something only known at run time
+    name = evaluate(text, binding)
+    if name is None:
+        return None
+    return name.replace("[", "").replace("]", "")
+
+
+def queryTables(text: str, binding: Binding, catalog: PipelineCatalog) -> list[str]:
+    # a table counts once per query, no matter how often the query names it
+    query = evaluate(text, binding)
+    if query is None:
+        # the SQL around what can't be resolved, ex. @concat('SELECT ...', variables('x'))
+        query = expressionLiterals(text)
+    tables = []
+    for lowercase_name in catalog.NameMatcher.count(query):
+        table = catalog.LowercaseTables.get(lowercase_name)
+        if table is not None:
+            tables.append(table)
+    return tables
+
+
+def addStoredProcedure(result: PipelineResult, name: str, catalog: PipelineCatalog):
+    if name not in catalog.StoredProcedures:
+        result.BadStoredProcedures.append(name)
+    else:
+        result.StoredProcedures.append(name)
+        countReference(result, "sp", name)
+
+
+def addTable(result: PipelineResult, table: str):
+    result.Tables.append(table)
+    countReference(result, "table", table)
+
+
+def process_activities(
+    activities: list,
+    result: PipelineResult,
+    catalog: PipelineCatalog,
+    binding: Binding | None = None,
+):
+    # binding: the pipeline's default parameters and the factory's global parameters
+    binding = binding or {}
+    for reference in walkActivities(activities):
+        if reference.Kind in (STORED_PROCEDURE_REFERENCE, QUERY_REFERENCE):
+            if usesParameters(reference.Value):
+                result.ParameterizedReferences.append([reference.Kind, reference.Value])
+
+        if reference.Kind == STORED_PROCEDURE_REFERENCE:
+            # a stored procedure chosen at run time can't be resolved statically
+            stored_procedure_name = storedProcedureName(reference.Value, binding)
+            if stored_procedure_name is not None:
+                addStoredProcedure(result, stored_procedure_name, catalog)
+
+        elif reference.Kind == QUERY_REFERENCE:
+            for table in queryTables(reference.Value, binding, catalog):
+                addTable(result, table)
+
+        elif reference.Kind == PIPELINE_REFERENCE:  # the pipeline runs another pipeline
+            result.DependentPipelines.append(reference.Value)
+            countReference(result, "dp", reference.Value)
+            result.Calls.append([reference.Value, reference.Parameters or {}])
+
+        elif reference.Kind == DATAFLOW_REFERENCE:
+            result.DataFlows.append(reference.Value)
+            countReference(result, "df", reference.Value)
+
+
+def parsePipelineFile(
+    path: str, catalog: PipelineCatalog | None = None
+) -> PipelineResult:
+    """
+    Runs in a worker process, only the compact result goes back to the main process.
+    Without a catalog the one initWorker() set for the process is used.
+    """
+    with open(path, "r") as pipeline_file:
+        pipeline_json: dict = json.load(pipeline_file)
+    return parsePipeline(pipeline_json, path, catalog or worker_catalog)
+
+
+def parsePipeline(
+    pipeline_json: dict, file_name: str, catalog: PipelineCatalog
+) -> PipelineResult:
+    result = PipelineResult(pipeline_json["name"], file_name)
+
+    # The schema is different from pipeline JSON from ADF and Azure CLI
+    if pipeline_json.get("properties") is None:
+        properties = pipeline_json  # Azure CLI schema
+    else:
+        properties = pipeline_json["properties"]  # ADF Schema
+    activities = properties["activities"]
+
+    for name, parameter in (properties.get("parameters") or {}).items():
+        default = parameterValue((parameter or {}).get("defaultValue"))
+        if default is not None:
+            result.Parameters[name] = default
+    binding = makeBinding(result.Parameters, catalog.GlobalParameters)
+
+    # loop through Activities
+    process_activities(activities or [], result, catalog, binding)
+    return result
+
+
+# how many different sets of parameters a pipeline is resolved with, past that the calls of
+# yet more callers are ignored
+MAX_BINDINGS = 32
+
+
+def passParameters(
+    results: list[PipelineResult], catalog: PipelineCatalog
+) -> list[PipelineResult]:
+    """
+    Resolve parameterized stored procedures and queries again with the parameters every
+    Execute Pipeline passes, down the whole chain of called pipelines. What a caller's
+    values resolve to and the pipeline's defaults don't is added to a copy of its result,
+    once per name. Results are the cached ones, so they're never changed in place.
+    Every (pipeline, binding) is visited once, so circular calls end.
+    """
+    by_name = {result.Name: result for result in results}
+    # key: pipeline name, value: bindings it has been resolved with
+    seen: dict[str, set[tuple]] = {}
+    # key: pipeline name, value: the copy of its result that gets the extra references
+    extended: dict[str, PipelineResult] = {}
+
+    def binding(result: PipelineResult, values: dict[str, str]) -> Binding:
+        return makeBinding({**result.Parameters, **values}, catalog.GlobalParameters)
+
+    pending = [(result, binding(result, {})) for result in results if result.Calls]
+    while pending:
+        result, caller_binding = pending.pop()
+        for pipeline_name, parameters in result.Calls:
+            called = by_name.get(pipeline_name)
+            if called is None or not parameters:
+                continue
+            values = {}
+            for name, value in parameters.items():
+                text = textValue(value)
+                passed = (
+                    evaluate(text, caller_binding)
+                    if text is not None
+                    else parameterValue(value)
+                )
+                if passed is not None:
+                    values[name] = passed
+            called_binding = binding(called, values)
+            called_key = bindingKey(called_binding)
+            bindings = seen.setdefault(called.Name, {bindingKey(binding(called, {}))})
+            if called_key in bindings or len(bindings) > MAX_BINDINGS:
+                continue
+            bindings.add(called_key)
+            pending.append((called, called_binding))
+
+            for kind, text in called.ParameterizedReferences:
+                current = extended.get(called.Name, called)
+                if kind == STORED_PROCEDURE_REFERENCE:
+                    name = storedProcedureName(text, called_binding)
+                    if name is None or name in current.TotalReferences["sp"]:
+                        continue
+                    if name in current.BadStoredProcedures:
+                        continue
+                    if current is called:
+                        current = extended[called.Name] = extendedResult(called)
+                    addStoredProcedure(current, name, catalog)
+                    continue
+                for table in queryTables(text, called_binding, catalog):
+                    if table in current.TotalReferences["table"]:
+                        continue
+                    if current is called:
+                        current = extended[called.Name] = extendedResult(called)
+                    addTable(current, table)
+    return [extended.get(result.Name, result) for result in results]
+
+
+def extendedResult(result: PipelineResult) -> PipelineResult:
+    # a copy whose reference lists can grow without touching the original
+    return replace(
+        result,
+        Tables=list(result.Tables),
+        StoredProcedures=list(result.StoredProcedures),
+        BadStoredProcedures=list(result.BadStoredProcedures),
+        TotalReferences={
+            kind: dict(references)
+            for kind, references in result.TotalReferences.items()
+        },
+    )
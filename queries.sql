@@ -15,4 +15,12 @@ SELECT SCHEMA_NAME(schema_id) + '.' + name, definition FROM sys.procedures p
 INNER JOIN sys.sql_modules m
 ON p.object_id = m.object_id
 WHERE p.schema_id != 4 -- Exclude sys schema
-ORDER BY schema_id, name
\ No newline at end of file
+ORDER BY schema_id, name
+
+-- Dependencies tracked by the server (used by MSSQL_USE_DEPENDENCIES)
+SELECT OBJECT_SCHEMA_NAME(d.referencing_id) + '.' + OBJECT_NAME(d.referencing_id),
+    COALESCE(d.referenced_schema_name, ''), d.referenced_entity_name
+FROM sys.sql_expression_dependencies d
+INNER JOIN sys.objects o
+ON o.object_id = d.referencing_id
+WHERE d.referencing_class = 1 AND o.type IN ('V', 'P')
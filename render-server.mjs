@@ -0,0 +1,76 @@
+// Long-lived Mermaid renderer, started by renderer.py.
+// One headless Chromium renders every diagram instead of one mmdc (Node + Chromium) per PDF.
+//
+// usage: node render-server.mjs <npm global root> <mermaid config file>
+// stdin:  one JSON request per line  {"id": 1, "output": "out.pdf", "definition": "graph TD ..."}
+// stdout: one JSON response per line {"id": 1, "ok": true} or {"id": 1, "ok": false, "error": "..."}
+// The first line written is {"ready": true} once the browser is up.
+import { existsSync, readFileSync, writeFileSync } from "node:fs";
+import { extname, join } from "node:path";
+import { createInterface } from "node:readline";
+import { pathToFileURL } from "node:url";
+
+const [globalRoot, configFile] = process.argv.slice(2);
+
+function respond(message) {
+  process.stdout.write(JSON.stringify(message) + "\n");
+}
+
+function exportEntry(exports) {
+  // pick the ESM entry out of a package.json "exports" value
+  if (typeof exports === "string") return exports;
+  if (exports === null || typeof exports !== "object") return undefined;
+  if ("." in exports) return exportEntry(exports["."]);
+  for (const condition of ["import", "node", "default"]) {
+    const entry = exportEntry(exports[condition]);
+    if (entry !== undefined) return entry;
+  }
+  return undefined;
+}
+
+async function importPackage(candidates) {
+  // globally installed packages aren't on the ESM resolution path, so import them by file URL
+  for (const packageDir of candidates) {
+    const packageFile = join(packageDir, "package.json");
+    if (!existsSync(packageFile)) continue;
+    const manifest = JSON.parse(readFileSync(packageFile, "utf8"));
+    const entry = exportEntry(manifest.exports) ?? manifest.module ?? manifest.main ?? "index.js";
+    return import(pathToFileURL(join(packageDir, entry)).href);
+  }
+  throw new Error(`Cannot find any of ${candidates.join(", ")}`);
+}
+
+try {
+  const cliDir = join(globalRoot, "@mermaid-js", "mermaid-cli");
+  const { renderMermaid } = await importPackage([cliDir]);
+  const puppeteerModule = await importPackage([
+    join(cliDir, "node_modules", "puppeteer"),
+    join(globalRoot, "puppeteer"),
+  ]);
+  const puppeteer = puppeteerModule.default ?? puppeteerModule;
+  const mermaidConfig = configFile ? JSON.parse(readFileSync(configFile, "utf8")) : {};
+
+  const browser = await puppeteer.launch({ headless: true });
+  respond({ ready: true });
+
+  const lines = createInterface({ input: process.stdin });
+  for await (const line of lines) {
+    if (line.trim() === "") continue;
+    const request = JSON.parse(line);
+    try {
+      const outputFormat = extname(request.output).slice(1) || "pdf";
+      const { data } = await renderMermaid(browser, request.definition, outputFormat, {
+        mermaidConfig,
+        pdfFit: true,
+      });
+      writeFileSync(request.output, data);
+      respond({ id: request.id, ok: true });
+    } catch (error) {
+      respond({ id: request.id, ok: false, error: String(error?.message ?? error) });
+    }
+  }
+  await browser.close();
+} catch (error) {
+  respond({ ready: false, error: String(error?.message ?? error) });
+  process.exit(1);
+}
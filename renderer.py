@@ -0,0 +1,168 @@
+import itertools
+import json
+import os
+import queue
+import shutil
+import signal
+import subprocess
+import threading
+from dataclasses import dataclass
+
+RENDER_SERVER = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "render-server.mjs"
+)
+
+
+@dataclass
+class RenderResult:
+    Output: str
+    Ok: bool
+    Error: str = ""
+    RendererFailed: bool = False  # the renderer died or hung, not the diagram
+
+
+def readLines(stream, lines: queue.Queue):
+    # owns the process's stdout, "" once it's closed
+    for line in stream:
+        lines.put(line)
+    lines.put("")
+
+
+class RendererProcess:
+    """
+    One render-server.mjs process, which keeps a single headless Chromium open.
+    It's started on first use and started again if it dies. A process that doesn't answer
+    within timeout seconds is killed, so a hung Chromium fails one diagram, not the run.
+    """
+
+    def __init__(self, command: list[str], timeout: float):
+        self.command = command
+        self.timeout = timeout
+        self.process: subprocess.Popen | None = None
+        self.lines: queue.Queue[str] = queue.Queue()
+        self.starts = 0
+
+    def start(self):
+        self.starts += 1
+        self.process = subprocess.Popen(
+            self.command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+            encoding="utf-8",
+            # its own process group, so kill() takes Chromium down with it
+            start_new_session=os.name == "posix",
+        )
+        self.lines = queue.Queue()
+        threading.Thread(
+            target=readLines, args=(self.process.stdout, self.lines), daemon=True
+        ).start()
+        try:
+            ready = self.readMessage()
+        except (RuntimeError, ValueError):
+            self.kill()
+            raise
+        if not ready.get("ready"):
+            self.close()
+            raise RuntimeError(ready.get("error", "renderer did not start"))
+
+    def readMessage(self) -> dict:
+        try:
+            line = self.lines.get(timeout=self.timeout)
+        except queue.Empty:
+            raise RuntimeError(f"renderer didn't answer within {self.timeout:g}s")
+        if line == "":
+            raise RuntimeError("renderer exited")
+        return json.loads(line)
+
+    def render(self, request_id: int, mermaid_text: str, output: str) -> RenderResult:
+        if self.process is None or self.process.poll() is not None:
+            self.start()
+        request = {"id": request_id, "output": output, "definition": mermaid_text}
+        try:
+            self.process.stdin.write(json.dumps(request) + "\n")
+            self.process.stdin.flush()
+            response = self.readMessage()
+        except (OSError, RuntimeError, ValueError) as error:
+            self.kill()
+            return RenderResult(output, False, str(error), RendererFailed=True)
+        return RenderResult(
+            output, response.get("ok", False), response.get("error", "")
+        )
+
+    def close(self):
+        if self.process is None:
+            return
+        try:
+            self.process.stdin.close()
+            self.process.wait(timeout=30)
+        except (OSError, subprocess.TimeoutExpired):
+            self.process.kill()
+        self.process = None
+
+    def kill(self):
+        if self.process is None:
+            return
+        if os.name == "posix":
+            try:
+                os.killpg(self.process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        else:
+            self.process.kill()
+        self.process.wait()
+        self.process.stdin.close()
+        self.process = None
+
+
+class MermaidRenderer:
+    """
+    Bounded pool of RendererProcess.
+    Callers block until a process is idle, so no matter how many export threads there are
+    only `processes` Chromium instances ever run.
+    """
+
+    def __init__(self, command: list[str], processes: int, timeout: float):
+        self.idle: queue.Queue[RendererProcess] = queue.Queue()
+        self.processes = [
+            RendererProcess(command, timeout) for _ in range(max(1, processes))
+        ]
+        self.request_ids = itertools.count(1)
+        self.processes[0].start()  # fail fast if node or mermaid-cli can't be loaded
+        for process in self.processes:
+            self.idle.put(process)
+
+    def render(self, mermaid_text: str, output: str) -> RenderResult:
+        process = self.idle.get()
+        try:
+            return process.render(next(self.request_ids), mermaid_text, output)
+        except (OSError, RuntimeError, ValueError) as error:  # restarting it failed
+            return RenderResult(output, False, str(error), RendererFailed=True)
+        finally:
+            self.idle.put(process)
+
+    def started(self) -> int:
+        return sum(process.starts for process in self.processes)
+
+    def close(self):
+        for process in self.processes:
+            process.close()
+
+
+def startRenderer(
+    processes: int, config_file: str, timeout: float
+) -> MermaidRenderer | None:
+    node = shutil.which("node")
+    npm = shutil.which("npm")
+    if node is None or npm is None:
+        print("node or npm not callable, falling back to one mmdc per diagram")
+        return None
+    global_root = subprocess.run(
+        [npm, "root", "-g"], capture_output=True, text=True
+    ).stdout.strip()
+    command = [node, RENDER_SERVER, global_root, os.path.abspath(config_file)]
+    try:
+        return MermaidRenderer(command, processes, timeout)
+    except (OSError, RuntimeError, ValueError) as error:
+        print(f"Mermaid renderer failed to start ({error}), falling back to mmdc")
+        return None
@@ -0,0 +1,274 @@
+import abc
+import csv
+import io
+import json
+import os
+from array import array
+from dataclasses import dataclass
+from typing import Iterator, TextIO
+
+from exporters import WRITE_BUFFER
+from graph import PIPELINE, RELATIONS, STORED_PROCEDURE, TABLE, VIEW, DependencyGraph
+
+REPORT_FORMATS = ("txt", "csv", "jsonl")
+
+# file name without the extension
+REPORT_FILES: dict[str, str] = {
+    TABLE: "table-report",
+    VIEW: "view-report",
+    STORED_PROCEDURE: "stored-procedures-report",
+    PIPELINE: "pipeline-report",
+}
+# what the progress messages call a report and what the text layout calls its objects
+REPORT_TITLES: dict[str, str] = {
+    TABLE: "table",
+    VIEW: "view",
+    STORED_PROCEDURE: "stored procedures",
+    PIPELINE: "pipelines",
+}
+OBJECT_LABELS: dict[str, str] = {
+    TABLE: "Table",
+    VIEW: "View",
+    STORED_PROCEDURE: "Stored Procedure",
+    PIPELINE: "Pipeline",
+}
+
+# (section, relation kind, group, parents) in the order they're written. parents=True lists
+# the objects of kind/group that reference the reported object, otherwise what it references
+SECTIONS: dict[str, tuple[tuple[str, str, str, bool], ...]] = {
+    TABLE: (
+        ("Views", VIEW, "Tables", True),
+        ("Stored Procedures", STORED_PROCEDURE, "Tables", True),
+        ("Pipelines", PIPELINE, "Tables", True),
+    ),
+    VIEW: (
+        ("Views", VIEW, "Views", True),
+        ("Stored Procedures", STORED_PROCEDURE, "Views", True),
+    ),
+    STORED_PROCEDURE: (
+        ("Stored Procedures", STORED_PROCEDURE, "Stored Procedures", True),
+        ("Pipelines", PIPELINE, "Stored Procedures", True),
+    ),
+    PIPELINE: (
+        ("Dependent Pipelines", PIPELINE, "Dependent Pipelines", False),
+        ("Data Flows", PIPELINE, "Data Flows", False),
+    ),
+}
+OPTIONAL_SECTIONS = {"Data Flows"}  # left out of an entry when it's empty
+
+
+@dataclass
+class ReportEntry:
+    Kind: str
+    Name: str
+    TotalReferences: int
+    UpstreamObjects: int
+    DownstreamObjects: int | None  # tables don't reference anything
+    Sections: list[tuple[str, list[tuple[str, int]]]]  # (section, [(name, count)])
+
+
+def reportFiles(output_dir: str, formats: list[str]) -> list[str]:
+    return [
+        os.path.join(output_dir, f"{file_name}.{report_format}")
+        for file_name in REPORT_FILES.values()
+        for report_format in formats
+    ]
+
+
+def byTotalReferences(node_ids: list[int], totals) -> list[int]:
+    # stable, so objects with the same total keep catalog order
+    return sorted(node_ids, key=totals.__getitem__, reverse=True)
+
+
+def reportEntries(
+    graph: DependencyGraph,
+    kind: str,
+    upstream_counts: dict[str, array],
+    downstream_counts: dict[str, array],
+) -> Iterator[ReportEntry]:
+    """
+    One entry per existing object of kind, the most referenced first. Entries are made one
+    at a time, so every format is written from a single pass over the graph.
+    """
+    if kind == PIPELINE:
+        totals = graph.outgoingTotals(PIPELINE, "Dependent Pipelines")
+    else:
+        totals = graph.incomingTotals(kind)
+    # the CSR rows and names of every section are looked up once, not once per object
+    sections = []
+    for section, relation_kind, group, parents in SECTIONS[kind]:
+        if parents:
+            adjacency = graph.reverseIndex(relation_kind, group)
+            names = graph.names[relation_kind]
+        else:
+            adjacency = graph.forwardIndex(relation_kind, group)
+            names = graph.names[RELATIONS[(relation_kind, group)]]
+        sections.append(
+            (section, adjacency.offsets, adjacency.targets, adjacency.counts, names)
+        )
+    for node_id in byTotalReferences(graph.existing(kind), totals):
+        entry_sections = []
+        for section, offsets, targets, counts, names in sections:
+            start, end = offsets[node_id], offsets[node_id + 1]
+            if start == end and section in OPTIONAL_SECTIONS:
+                continue
+            entry_sections.append(
+                (
+                    section,
+                    [
+                        (names[target], count)
+                        for target, count in zip(targets[start:end], counts[start:end])
+                    ],
+                )
+            )
+        yield ReportEntry(
+            kind,
+            graph.name(kind, node_id),
+            totals[node_id],
+            upstream_counts[kind][node_id],
+            None if kind == TABLE else downstream_counts[kind][node_id],
+            entry_sections,
+        )
+
+
+class ReportWriter(abc.ABC):
+    """
+    Collects what a report writes in memory and hands it to the file in WRITE_BUFFER sized
+    pieces, so a report is a few large writes however many lines it has.
+    """
+
+    def __init__(self, file: TextIO):
+        self.file = file
+        self.buffer = io.StringIO()
+
+    def write(self, text: str):
+        self.buffer.write(text)
+        self.flushIfFull()
+
+    def flushIfFull(self):
+        if self.buffer.tell() >= WRITE_BUFFER:
+            self.flush()
+
+    def flush(self):
+        self.file.write(self.buffer.getvalue())
+        self.buffer.seek(0)
+        self.buffer.truncate()
+
+    @abc.abstractmethod
+    def add(self, entry: ReportEntry):
+        """
+        Write one object of the report.
+        """
+
+    def close(self):
+        self.flush()
+
+
+class TextReportWriter(ReportWriter):
+    # the original layout, a block per object
+    def add(self, entry: ReportEntry):
+        lines = [
+            f"{OBJECT_LABELS[entry.Kind]}: {entry.Name}\n",
+            f"Total references: {entry.TotalReferences}\n",
+            f"Upstream objects: {entry.UpstreamObjects}\n",
+        ]
+        if entry.DownstreamObjects is not None:
+            lines.append(f"Downstream objects: {entry.DownstreamObjects}\n")
+        for section, references in entry.Sections:
+            lines.append(f"{section}:\n")
+            lines.extend(f"\t{name}: {count}\n" for name, count in references)
+        lines.append("\n\n")
+        self.write("".join(lines))
+
+
+class CsvReportWriter(ReportWriter):
+    """
+    One row per reference, an object without any gets one row with the reference columns
+    empty, so every object is in the file.
+    """
+
+    HEADER = (
+        "kind",
+        "name",
+        "total_references",
+        "upstream_objects",
+        "downstream_objects",
+        "section",
+        "reference",
+        "reference_count",
+    )
+
+    def __init__(self, file: TextIO):
+        super().__init__(file)
+        # rows go straight into the buffer, a Python level write() per row is slow
+        self.rows = csv.writer(self.buffer, lineterminator="\n")
+        self.rows.writerow(self.HEADER)
+
+    def add(self, entry: ReportEntry):
+        columns = (
+            entry.Kind,
+            entry.Name,
+            entry.TotalReferences,
+            entry.UpstreamObjects,
+            "" if entry.DownstreamObjects is None else entry.DownstreamObjects,
+        )
+        rows = [
+            (*columns, section, name, count)
+            for section, references in entry.Sections
+            for name, count in references
+        ]
+        self.rows.writerows(rows or [(*columns, "", "", "")])
+        self.flushIfFull()
+
+
+class JsonlReportWriter(ReportWriter):
+    # one JSON object per line, sections keyed by name with [name, count] pairs
+    def add(self, entry: ReportEntry):
+        line = {
+            "kind": entry.Kind,
+            "name": entry.Name,
+            "total_references": entry.TotalReferences,
+            "upstream_objects": entry.UpstreamObjects,
+        }
+        if entry.DownstreamObjects is not None:
+            line["downstream_objects"] = entry.DownstreamObjects
+        line["references"] = dict(entry.Sections)
+        self.write(json.dumps(line, separators=(",", ":")) + "\n")
+
+
+REPORT_WRITERS: dict[str, type[ReportWriter]] = {
+    "txt": TextReportWriter,
+    "csv": CsvReportWriter,
+    "jsonl": JsonlReportWriter,
+}
+
+
+def writeReport(
+    graph: DependencyGraph,
+    kind: str,
+    output_dir: str,
+    formats: list[str],
+    upstream_counts: dict[str, array],
+    downstream_counts: dict[str, array],
+):
+    # every format from the same pass, the files are open side by side
+    files = [
+        open(
+            os.path.join(output_dir, f"{REPORT_FILES[kind]}.{report_format}"),
+            "w",
+        )
+        for report_format in formats
+    ]
+    try:
+        writers = [
+            REPORT_WRITERS[report_format](file)
+            for report_format, file in zip(formats, files)
+        ]
+        for entry in reportEntries(graph, kind, upstream_counts, downstream_counts):
+            for writer in writers:
+                writer.add(entry)
+        for writer in writers:
+            writer.close()
+    finally:
+        for file in files:
+            file.close()
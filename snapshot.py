@@ -0,0 +1,312 @@
+import argparse
+import gzip
+import json
+import os
+from dataclasses import dataclass, field
+
+from dotenv import load_dotenv
+
+from graph import RELATIONS, DependencyGraph
+
+SNAPSHOT_NAME = "graph-snapshot.json.gz"
+SNAPSHOT_VERSION = 1
+
+
+@dataclass
+class Snapshot:
+    """
+    The graph of one run as the file has it: per kind the names, definition hashes and IDs
+    of the missing objects, per relation ("kind.group") the parallel edge arrays.
+    """
+
+    Names: dict[str, list[str]]
+    Hashes: dict[str, list[str]]
+    Missing: dict[str, set[int]]
+    Edges: dict[str, tuple[list[int], list[int], list[int]]]
+
+
+@dataclass
+class GraphDiff:
+    # objects are (kind, name), edges (relation, parent, child, count)
+    AddedObjects: list[tuple[str, str]] = field(default_factory=list)
+    RemovedObjects: list[tuple[str, str]] = field(default_factory=list)
+    # definition changed, or the object started or stopped existing
+    ChangedObjects: list[tuple[str, str, str]] = field(default_factory=list)
+    AddedEdges: list[tuple[str, str, str, int]] = field(default_factory=list)
+    RemovedEdges: list[tuple[str, str, str, int]] = field(default_factory=list)
+    # (relation, parent, child, old count, new count)
+    CountChanges: list[tuple[str, str, str, int, int]] = field(default_factory=list)
+    # key: kind or relation, value: (old total, new total)
+    Totals: dict[str, tuple[int, int]] = field(default_factory=dict)
+
+
+def relationKey(kind: str, group: str) -> str:
+    return f"{kind}.{group}"
+
+
+def writeSnapshot(graph: DependencyGraph, path: str):
+    """
+    Write the graph as gzipped JSON and swap it in, like writeIndex(). Node IDs are the
+    graph's own, so the edge arrays are written as they are without a name per edge.
+    """
+    snapshot = {
+        "version": SNAPSHOT_VERSION,
+        "objects": {
+            kind: {
+                "names": graph.names[kind],
+                "hashes": graph.hashes[kind],
+                "missing": [
+                    node_id
+                    for node_id, missing in enumerate(graph.missing[kind])
+                    if missing
+                ],
+            }
+            for kind in graph.names
+        },
+        "edges": {
+            relationKey(kind, group): {
+                "sources": relation.sources.tolist(),
+                "targets": relation.targets.tolist(),
+                "counts": relation.counts.tolist(),
+            }
+            for (kind, group), relation in graph.relations.items()
+        },
+    }
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temporary_path = path + ".tmp"
+    # one string compressed in one go, json.dump() into a gzip file writes it in tiny pieces
+    # level 1: most of the size win of gzip, at a fraction of the time of the default 9
+    with gzip.open(temporary_path, "wb", compresslevel=1) as file:
+        file.write(json.dumps(snapshot, separators=(",", ":")).encode())
+    os.replace(temporary_path, path)
+
+
+def loadSnapshot(path: str) -> Snapshot:
+    if os.path.isdir(path):
+        path = os.path.join(path, SNAPSHOT_NAME)
+    with gzip.open(path, "rt", encoding="utf-8") as file:
+        data = json.load(file)
+    if data.get("version") != SNAPSHOT_VERSION:
+        raise ValueError(
+            f"{path} is snapshot version {data.get('version')}, "
+            f"expected {SNAPSHOT_VERSION}"
+        )
+    objects = data["objects"]
+    return Snapshot(
+        {kind: values["names"] for kind, values in objects.items()},
+        {kind: values["hashes"] for kind, values in objects.items()},
+        {kind: set(values["missing"]) for kind, values in objects.items()},
+        {
+            key: (values["sources"], values["targets"], values["counts"])
+            for key, values in data["edges"].items()
+        },
+    )
+
+
+def edgeCounts(
+    edges: tuple[list[int], list[int], list[int]],
+    parents: list[int],
+    children: list[int],
+    width: int,
+) -> dict[int, int]:
+    # key: shared parent ID * width + shared child ID, value: reference count
+    sources, targets, counts = edges
+    keys = [
+        parents[source] * width + children[target]
+        for source, target in zip(sources, targets)
+    ]
+    counted = dict(zip(keys, counts))
+    if len(counted) == len(keys):
+        return counted
+    # the same edge added more than once, its counts are summed
+    counted = {}
+    for edge, count in zip(keys, counts):
+        counted[edge] = counted.get(edge, 0) + count
+    return counted
+
+
+def diffSnapshots(old: Snapshot, new: Snapshot) -> GraphDiff:
+    """
+    Objects are matched by kind and name. Every name gets one ID per kind across both
+    snapshots, so an edge is a single int (parent ID * names of the child kind + child ID)
+    and each relation is compared as two dicts of those ints, linear in the number of edges.
+    """
+    diff = GraphDiff()
+    kinds = list(dict.fromkeys([*old.Names, *new.Names]))
+    # key: kind, value: name -> ID shared by both snapshots
+    shared_ids: dict[str, dict[str, int]] = {}
+    for kind in kinds:
+        old_names = old.Names.get(kind, [])
+        new_names = new.Names.get(kind, [])
+        old_ids = {name: node_id for node_id, name in enumerate(old_names)}
+        shared = dict(old_ids)
+        for new_id, name in enumerate(new_names):
+            old_id = old_ids.get(name)
+            if old_id is None:
+                shared[name] = len(shared)
+                diff.AddedObjects.append((kind, name))
+                continue
+            old_missing = old_id in old.Missing[kind]
+            new_missing = new_id in new.Missing[kind]
+            if old_missing != new_missing:
+                change = "nonexistent" if new_missing else "exists"
+                diff.ChangedObjects.append((kind, name, change))
+            elif old.Hashes[kind][old_id] != new.Hashes[kind][new_id]:
+                diff.ChangedObjects.append((kind, name, "definition changed"))
+        new_ids = set(new_names)
+        diff.RemovedObjects.extend(
+            (kind, name) for name in old_names if name not in new_ids
+        )
+        shared_ids[kind] = shared
+        diff.Totals[kind] = (len(old_names), len(new_names))
+
+    # key: kind, value: shared ID of every node ID of the snapshot
+    old_shared = {
+        kind: [shared_ids[kind][name] for name in names]
+        for kind, names in old.Names.items()
+    }
+    new_shared = {
+        kind: [shared_ids[kind][name] for name in names]
+        for kind, names in new.Names.items()
+    }
+
+    for (kind, group), child_kind in RELATIONS.items():
+        key = relationKey(kind, group)
+        parent_names = list(shared_ids.get(kind, {}))
+        child_names = list(shared_ids.get(child_kind, {}))
+        width = max(1, len(child_names))
+
+        empty = ([], [], [])
+        if (
+            old.Names.get(kind) == new.Names.get(kind)
+            and old.Names.get(child_kind) == new.Names.get(child_kind)
+            and old.Edges.get(key, empty) == new.Edges.get(key, empty)
+        ):
+            # same IDs and the same arrays, the usual case for most relations of a release
+            edge_count = len(new.Edges.get(key, empty)[0])
+            diff.Totals[key] = (edge_count, edge_count)
+            continue
+        old_edges = edgeCounts(
+            old.Edges.get(key, empty),
+            old_shared.get(kind, []),
+            old_shared.get(child_kind, []),
+            width,
+        )
+        new_edges = edgeCounts(
+            new.Edges.get(key, empty),
+            new_shared.get(kind, []),
+            new_shared.get(child_kind, []),
+            width,
+        )
+
+        def names(edge: int) -> tuple[str, str]:
+            parent, child = divmod(edge, width)
+            return parent_names[parent], child_names[child]
+
+        # set operations on the item views, only the differences are looked at one by one
+        for edge, count in new_edges.items() - old_edges.items():
+            old_count = old_edges.get(edge)
+            if old_count is None:
+                diff.AddedEdges.append((key, *names(edge), count))
+            else:
+                diff.CountChanges.append((key, *names(edge), old_count, count))
+        for edge, count in old_edges.items() - new_edges.items():
+            if edge not in new_edges:
+                diff.RemovedEdges.append((key, *names(edge), count))
+        diff.Totals[key] = (
+            len(old.Edges.get(key, empty)[0]),
+            len(new.Edges.get(key, empty)[0]),
+        )
+
+    # only the differences are sorted, so the output is stable whatever order objects
+    # were read in
+    for changes in (
+        diff.AddedObjects,
+        diff.RemovedObjects,
+        diff.ChangedObjects,
+        diff.AddedEdges,
+        diff.RemovedEdges,
+        diff.CountChanges,
+    ):
+        changes.sort()
+    return diff
+
+
+def printDiff(diff: GraphDiff):
+    print(
+        f"Objects: {len(diff.AddedObjects)} added, {len(diff.RemovedObjects)} removed,"
+        f" {len(diff.ChangedObjects)} changed"
+    )
+    for kind, name in diff.AddedObjects:
+        print(f"+ {kind} {name}")
+    for kind, name in diff.RemovedObjects:
+        print(f"- {kind} {name}")
+    for kind, name, change in diff.ChangedObjects:
+        print(f"~ {kind} {name} ({change})")
+    print(
+        f"Edges: {len(diff.AddedEdges)} added, {len(diff.RemovedEdges)} removed,"
+        f" {len(diff.CountChanges)} with a different count"
+    )
+    for key, parent, child, count in diff.AddedEdges:
+        print(f"+ {key}: {parent} -> {child} x{count}")
+    for key, parent, child, count in diff.RemovedEdges:
+        print(f"- {key}: {parent} -> {child} x{count}")
+    for key, parent, child, old_count, new_count in diff.CountChanges:
+        print(f"~ {key}: {parent} -> {child} x{old_count} -> x{new_count}")
+    changed_totals = [
+        (key, old_total, new_total)
+        for key, (old_total, new_total) in diff.Totals.items()
+        if old_total != new_total
+    ]
+    if changed_totals:
+        print("Totals:")
+    for key, old_total, new_total in changed_totals:
+        print(f"\t{key}: {old_total} -> {new_total} ({new_total - old_total:+})")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare the dependency graphs of two report.py runs"
+    )
+    parser.add_argument(
+        "old", help=f"a {SNAPSHOT_NAME} or the reports directory of a run"
+    )
+    parser.add_argument(
+        "new", nargs="?", help=f"defaults to reports/$OUTPUT_DIR/{SNAPSHOT_NAME}"
+    )
+    parser.add_argument("--json", action="store_true")
+    arguments = parser.parse_args()
+
+    new_path = arguments.new
+    if new_path is None:
+        load_dotenv()
+        new_path = os.path.join("reports", os.getenv("OUTPUT_DIR") or "", SNAPSHOT_NAME)
+    try:
+        old = loadSnapshot(arguments.old)
+        new = loadSnapshot(new_path)
+    except (OSError, ValueError) as error:
+        print(error)
+        exit(1)
+
+    diff = diffSnapshots(old, new)
+    if arguments.json:
+        print(
+            json.dumps(
+                {
+                    "added_objects": diff.AddedObjects,
+                    "removed_objects": diff.RemovedObjects,
+                    "changed_objects": diff.ChangedObjects,
+                    "added_edges": diff.AddedEdges,
+                    "removed_edges": diff.RemovedEdges,
+                    "count_changes": diff.CountChanges,
+                    "totals": diff.Totals,
+                },
+                indent=2,
+            )
+        )
+        return
+    printDiff(diff)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable
+
+STOP = object()  # one per worker, put after everything else when the stage is closed
+
+
+@dataclass
+class StageStats:
+    Items: int = 0
+    BusySeconds: float = 0.0  # summed over the stage's workers
+    BlockedSeconds: float = 0.0  # producers waiting for room in the stage's queue
+
+
+class Stage:
+    """
+    Worker threads taking items off one bounded queue. A handler that raises doesn't stop
+    the stage, the error is kept and raised by StageScheduler.close().
+    """
+
+    def __init__(
+        self, name: str, handler: Callable[[Any], None], workers: int, capacity: int
+    ):
+        self.name = name
+        self.handler = handler
+        self.queue: queue.Queue = queue.Queue(maxsize=capacity)
+        self.stats = StageStats()
+        self.errors: list[Exception] = []
+        self.lock = threading.Lock()
+        self.threads = [
+            threading.Thread(target=self.work, name=f"{name}-{index}", daemon=True)
+            for index in range(max(1, workers))
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def work(self):
+        while True:
+            item = self.queue.get()
+            if item is STOP:
+                return
+            start = time.perf_counter()
+            try:
+                self.handler(item)
+            except Exception as error:
+                print(f"{self.name} failed: {error!r}")
+                with self.lock:
+                    self.errors.append(error)
+            busy = time.perf_counter() - start
+            with self.lock:
+                self.stats.Items += 1
+                self.stats.BusySeconds += busy
+
+    def put(self, item: Any):
+        start = time.perf_counter()
+        self.queue.put(item)  # blocks while the queue is full
+        blocked = time.perf_counter() - start
+        with self.lock:
+            self.stats.BlockedSeconds += blocked
+
+    def close(self):
+        for _ in self.threads:
+            self.queue.put(STOP)
+        for thread in self.threads:
+            thread.join()
+
+
+class StageScheduler:
+    """
+    A chain of stages connected by bounded queues. put() blocks once the queue of a stage is
+    full, so a producer can't run further ahead of a slow stage than `capacity` items, which
+    bounds how many built diagrams or rendered results are waiting in memory.
+    Handlers put their results into later stages. close() closes the stages in the order
+    they were added, so a stage only sees STOP once every stage feeding it has finished.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = max(1, capacity)
+        self.stages: dict[str, Stage] = {}
+
+    def addStage(self, name: str, handler: Callable[[Any], None], workers: int):
+        self.stages[name] = Stage(name, handler, workers, self.capacity)
+
+    def put(self, name: str, item: Any):
+        self.stages[name].put(item)
+
+    def close(self) -> dict[str, StageStats]:
+        for stage in self.stages.values():
+            stage.close()
+        for stage in self.stages.values():
+            if stage.errors:
+                raise stage.errors[0]
+        return {name: stage.stats for name, stage in self.stages.items()}
@@ -0,0 +1,131 @@
+import json
+import os
+import threading
+
+import pytest
+
+from adf import (
+    MANIFEST_NAME,
+    DirectoryFetcher,
+    Factory,
+    refreshFactory,
+    refreshPipelines,
+)
+from engine import Config, Engine, EngineError
+
+FACTORY = Factory("factory", "resource_group", "subscription")
+
+
+def pipeline(name: str, etag: str, activities: list | None = None) -> dict:
+    return {"name": name, "etag": etag, "properties": {"activities": activities or []}}
+
+
+class FakeFetcher:
+    # listPipelines() like AzureCLIFetcher, from pipelines set by the test
+    def __init__(self, pipelines: dict[str, list[dict]]):
+        self.pipelines = pipelines
+
+    def listPipelines(self, factory: Factory) -> list[dict]:
+        return self.pipelines[factory.Name]
+
+
+def readPipeline(target_dir, name: str) -> dict:
+    with open(os.path.join(target_dir, f"{name}.json")) as pipeline_file:
+        return json.load(pipeline_file)
+
+
+def test_first_refresh_writes_every_pipeline(tmp_path):
+    fetcher = FakeFetcher({"factory": [pipeline("A", "1"), pipeline("B", "1")]})
+    result = refreshFactory(fetcher, FACTORY, str(tmp_path))
+    assert result.Written == ["A", "B"]
+    assert readPipeline(tmp_path, "A")["etag"] == "1"
+    assert os.path.exists(tmp_path / MANIFEST_NAME)
+
+
+def test_unchanged_etag_skips_the_rewrite(tmp_path):
+    fetcher = FakeFetcher({"factory": [pipeline("A", "1")]})
+    refreshFactory(fetcher, FACTORY, str(tmp_path))
+    modified = os.stat(tmp_path / "A.json").st_mtime_ns
+
+    # same etag, so the content isn't even compared
+    fetcher.pipelines["factory"] = [pipeline("A", "1", [{"name": "new"}])]
+    result = refreshFactory(fetcher, FACTORY, str(tmp_path))
+    assert result.Unchanged == ["A"]
+    assert result.Written == []
+    assert os.stat(tmp_path / "A.json").st_mtime_ns == modified
+    assert readPipeline(tmp_path, "A")["properties"]["activities"] == []
+
+
+def test_changed_etag_rewrites_only_that_pipeline(tmp_path):
+    fetcher = FakeFetcher({"factory": [pipeline("A", "1"), pipeline("B", "1")]})
+    refreshFactory(fetcher, FACTORY, str(tmp_path))
+    modified = os.stat(tmp_path / "A.json").st_mtime_ns
+
+    fetcher.pipelines["factory"] = [
+        pipeline("A", "1"),
+        pipeline("B", "2", [{"name": "new"}]),
+    ]
+    result = refreshFactory(fetcher, FACTORY, str(tmp_path))
+    assert result.Written == ["B"]
+    assert result.Unchanged == ["A"]
+    assert os.stat(tmp_path / "A.json").st_mtime_ns == modified
+    assert readPipeline(tmp_path, "B")["properties"]["activities"] == [{"name": "new"}]
+
+
+def test_removed_pipeline_is_deleted(tmp_path):
+    fetcher = FakeFetcher({"factory": [pipeline("A", "1"), pipeline("B", "1")]})
+    refreshFactory(fetcher, FACTORY, str(tmp_path))
+
+    fetcher.pipelines["factory"] = [pipeline("A", "1")]
+    result = refreshFactory(fetcher, FACTORY, str(tmp_path))
+    assert result.Deleted == ["B"]
+    assert not os.path.exists(tmp_path / "B.json")
+    assert os.path.exists(tmp_path / "A.json")
+
+
+def test_factories_are_refreshed_concurrently(tmp_path):
+    factories = [Factory(name, "resource_group", "subscription") for name in "XYZ"]
+    # every listPipelines() waits for the others, which only returns if they run at once
+    barrier = threading.Barrier(len(factories), timeout=5)
+
+    class WaitingFetcher(FakeFetcher):
+        def listPipelines(self, factory: Factory) -> list[dict]:
+            barrier.wait()
+            return super().listPipelines(factory)
+
+    fetcher = WaitingFetcher(
+        {factory.Name: [pipeline(f"{factory.Name}_1", "1")] for factory in factories}
+    )
+    results = refreshPipelines(fetcher, factories, str(tmp_path))
+    assert [result.Factory for result in results] == ["X", "Y", "Z"]
+    for factory in factories:
+        assert readPipeline(tmp_path / factory.Name, f"{factory.Name}_1")["etag"] == "1"
+
+
+def test_directory_fetcher(tmp_path):
+    with open(tmp_path / "factory.json", "w") as factory_file:
+        json.dump([pipeline("A", "1")], factory_file)
+    fetcher = DirectoryFetcher(str(tmp_path))
+    result = refreshFactory(fetcher, FACTORY, str(tmp_path / "pipelines"))
+    assert result.Written == ["A"]
+
+
+def test_same_pipeline_name_in_two_factories_stops_the_run(tmp_path, monkeypatch):
+    for factory_name in ("X", "Y"):
+        os.makedirs(tmp_path / "pipelines" / factory_name)
+        with open(tmp_path / "pipelines" / factory_name / "A.json", "w") as file:
+            json.dump(pipeline("A", factory_name), file)
+    data_dir = os.path.join(os.path.dirname(__file__), "..", "data", "MSSQL_example")
+    monkeypatch.chdir(tmp_path)
+    analysis = Engine(
+        Config(
+            OutputDir="duplicates",
+            PipelineDir="pipelines",
+            MssqlDataDir=os.path.abspath(data_dir),
+            PipelineWorkers=1,
+            Cache=False,
+        )
+    )
+    analysis.countReferences()
+    with pytest.raises(EngineError, match="pipeline A is in both"):
+        analysis.analyzePipelines(fetch=False)
@@ -0,0 +1,50 @@
+import os
+
+from cache import RunCache
+from pipelines import PipelineResult
+
+
+def test_missing_recorded_file_is_not_current(tmp_path):
+    pdf, part = tmp_path / "A.pdf", tmp_path / "A.part2.pdf"
+    pdf.write_text("")
+    part.write_text("")
+    cache = RunCache(str(tmp_path / "cache.json"))
+    cache.markOutput("pipeline:A", "f1", [str(part)])
+    assert cache.isCurrent("pipeline:A", "f1", [str(pdf)])
+    cache.save()
+
+    cache = RunCache(str(tmp_path / "cache.json"))
+    assert cache.isCurrent("pipeline:A", "f1", [str(pdf)])
+    os.remove(part)
+    assert not cache.isCurrent("pipeline:A", "f1", [str(pdf)])
+
+
+def test_output_without_files_forgets_them(tmp_path):
+    cache = RunCache(str(tmp_path / "cache.json"))
+    cache.markOutput("pipeline:A", "f1", [str(tmp_path / "A.part2.pdf")])
+    assert not cache.isCurrent("pipeline:A", "f1", [])
+    cache.markOutput("pipeline:A", "f2")
+    assert cache.isCurrent("pipeline:A", "f2", [])
+
+
+def test_entries_of_edited_files_are_dropped_between_runs():
+    cache = RunCache(None, keep_in_memory=True)
+    cache.definitionNames("SELECT * FROM a", lambda sql: {("a",): 1})
+    cache.storePipelineResult("old", PipelineResult("A", "A.json"))
+    cache.pipelineResult("old")
+    cache.save()
+
+    # a watch update after A.json was edited, the catalog isn't read again
+    cache.startRun(reads_catalog=False)
+    cache.pipelineResult("new")
+    cache.storePipelineResult("new", PipelineResult("A", "A.json"))
+    cache.save()
+    assert list(cache.pipelines) == ["new"]
+    assert len(cache.definitions) == 1
+
+    # the catalog changed and the definition is gone
+    cache.startRun()
+    cache.definitionNames("SELECT * FROM b", lambda sql: {("b",): 1})
+    cache.save()
+    assert list(cache.definitions.values()) == [[[["b"], 1]]]
+    assert cache.pipelines == {}
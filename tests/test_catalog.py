@@ -0,0 +1,190 @@
+import sqlite3
+
+import engine
+from catalog import (
+    DEPENDENCIES_QUERY,
+    STORED_PROCEDURES_QUERY,
+    TABLES_QUERY,
+    VIEWS_QUERY,
+    fetchDependencies,
+    iterDatabaseDefinitions,
+    iterDatabaseTables,
+    iterQuery,
+)
+from engine import Config, Engine
+from graph import RELATIONS
+
+TABLES = [("dbo.Orders",), ("dbo.Customers",), ("sales.Invoices",)]
+VIEWS = [
+    (
+        "dbo.vOrders",
+        "CREATE VIEW dbo.vOrders AS SELECT * FROM dbo.Orders o\n"
+        "JOIN Customers c ON c.ID = o.CustomerID",
+    ),
+    (
+        "dbo.vSales",
+        "CREATE VIEW dbo.vSales AS SELECT * FROM dbo.vOrders v\n"
+        "JOIN sales.Invoices i ON i.OrderID = v.ID",
+    ),
+]
+STORED_PROCEDURES = [
+    (
+        "dbo.LoadOrders",
+        "CREATE PROCEDURE dbo.LoadOrders AS\n"
+        "INSERT INTO dbo.Orders SELECT * FROM dbo.vOrders\n"
+        "EXEC dbo.Audit",
+    ),
+    ("dbo.Audit", "CREATE PROCEDURE dbo.Audit AS SELECT 1"),
+    ("dbo.Encrypted", None),  # sys.sql_modules has no definition for encrypted modules
+]
+# what sys.sql_expression_dependencies has for the definitions above
+DEPENDENCIES = [
+    ("dbo.vOrders", "dbo", "Orders"),
+    ("dbo.vOrders", "", "Customers"),
+    ("dbo.vSales", "dbo", "vOrders"),
+    ("dbo.vSales", "sales", "Invoices"),
+    ("dbo.LoadOrders", "dbo", "Orders"),
+    ("dbo.LoadOrders", "dbo", "vOrders"),
+    ("dbo.LoadOrders", "dbo", "Audit"),
+]
+RESULTS = {
+    TABLES_QUERY: TABLES,
+    VIEWS_QUERY: VIEWS,
+    STORED_PROCEDURES_QUERY: STORED_PROCEDURES,
+    DEPENDENCIES_QUERY: DEPENDENCIES,
+}
+
+
+class StubCursor:
+    def __init__(self, connection: "StubConnection"):
+        self.connection = connection
+        self.rows: list[tuple] = []
+        self.closed = False
+
+    def execute(self, query: str):
+        self.rows = list(self.connection.results[query])
+
+    def fetchmany(self, size: int) -> list[tuple]:
+        self.connection.fetch_sizes.append(size)
+        batch, self.rows = self.rows[:size], self.rows[size:]
+        return batch
+
+    def close(self):
+        self.closed = True
+
+
+class StubConnection:
+    # a DB-API connection answering the catalog queries with fixed rows
+    def __init__(self, results: dict[str, list[tuple]]):
+        self.results = results
+        self.fetch_sizes: list[int] = []
+        self.cursors: list[StubCursor] = []
+        self.closed = False
+
+    def cursor(self) -> StubCursor:
+        cursor = StubCursor(self)
+        self.cursors.append(cursor)
+        return cursor
+
+    def close(self):
+        self.closed = True
+
+
+def test_iter_query_fetches_in_batches():
+    connection = StubConnection({"query": [(number,) for number in range(5)]})
+    rows = list(iterQuery(connection, "query", 2))
+    assert rows == [(number,) for number in range(5)]
+    # two full batches, a short one and the empty one that ends the loop
+    assert connection.fetch_sizes == [2, 2, 2, 2]
+    assert connection.cursors[0].closed
+
+
+def test_iter_query_closes_the_cursor_when_stopped_early():
+    connection = StubConnection({"query": [(number,) for number in range(5)]})
+    rows = iterQuery(connection, "query", 2)
+    next(rows)
+    rows.close()
+    assert connection.fetch_sizes == [2]
+    assert connection.cursors[0].closed
+
+
+def test_iter_query_with_sqlite():
+    connection = sqlite3.connect(":memory:")
+    connection.execute("CREATE TABLE objects (name TEXT, definition TEXT)")
+    connection.executemany(
+        "INSERT INTO objects VALUES (?, ?)",
+        [(f"dbo.Object{number}", f"SELECT {number}") for number in range(7)],
+    )
+    rows = list(iterQuery(connection, "SELECT name, definition FROM objects", 3))
+    assert rows == [(f"dbo.Object{number}", f"SELECT {number}") for number in range(7)]
+
+
+def test_database_tables_and_definitions():
+    connection = StubConnection(RESULTS)
+    assert list(iterDatabaseTables(connection, 2)) == [name for name, in TABLES]
+    definitions = list(iterDatabaseDefinitions(connection, STORED_PROCEDURES_QUERY, 2))
+    assert definitions[-1] == ("dbo.Encrypted", "")
+    assert definitions[:2] == STORED_PROCEDURES[:2]
+
+
+def test_fetch_dependencies_shape():
+    dependencies = fetchDependencies(StubConnection(RESULTS), 3)
+    assert dependencies == {
+        "dbo.vorders": {("dbo", "orders"): 1, ("", "customers"): 1},
+        "dbo.vsales": {("dbo", "vorders"): 1, ("sales", "invoices"): 1},
+        "dbo.loadorders": {
+            ("dbo", "orders"): 1,
+            ("dbo", "vorders"): 1,
+            ("dbo", "audit"): 1,
+        },
+    }
+
+
+def databaseEdges(tmp_path, monkeypatch, use_dependencies: bool) -> set[tuple]:
+    connection = StubConnection(RESULTS)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(engine, "connect", lambda connection_string: connection)
+    analysis = Engine(
+        Config(
+            OutputDir=f"dependencies-{use_dependencies}",
+            PipelineDir=str(tmp_path),
+            MssqlSource="database",
+            MssqlConnectionString="stub",
+            MssqlBatchSize=2,
+            MssqlUseDependencies=use_dependencies,
+            Cache=False,
+        )
+    )
+    try:
+        analysis.countReferences()
+    finally:
+        analysis.close()
+    assert connection.closed
+    assert set(connection.fetch_sizes) == {2}
+
+    graph = analysis.graph
+    return {
+        (
+            kind,
+            group,
+            graph.name(kind, source),
+            graph.name(RELATIONS[(kind, group)], target),
+        )
+        for (kind, group), relation in graph.relations.items()
+        for source, target in zip(relation.sources, relation.targets)
+    }
+
+
+def test_dependencies_give_the_same_edges_as_tokenizing(tmp_path, monkeypatch):
+    tokenized = databaseEdges(tmp_path, monkeypatch, use_dependencies=False)
+    from_server = databaseEdges(tmp_path, monkeypatch, use_dependencies=True)
+    assert tokenized == from_server
+    assert tokenized == {
+        ("view", "Tables", "dbo.vorders", "dbo.Orders"),
+        ("view", "Tables", "dbo.vorders", "dbo.Customers"),
+        ("view", "Tables", "dbo.vsales", "sales.Invoices"),
+        ("view", "Views", "dbo.vsales", "dbo.vorders"),
+        ("stored_procedure", "Tables", "dbo.LoadOrders", "dbo.Orders"),
+        ("stored_procedure", "Views", "dbo.LoadOrders", "dbo.vorders"),
+        ("stored_procedure", "Stored Procedures", "dbo.LoadOrders", "dbo.Audit"),
+    }
@@ -0,0 +1,61 @@
+import re
+
+from diagrams import DiagramLimits, MermaidBuilder
+from graph import PIPELINE, STORED_PROCEDURE, TABLE, VIEW, DependencyGraph
+
+VERTEX = re.compile(r'^[NM]\d+\["(.*)"\]')
+EDGE = re.compile(r"^[NM]\d+ (-->|-\.->|-\.-)")
+
+
+def bigPipeline() -> tuple[DependencyGraph, int, set[str]]:
+    # a pipeline running 12 procedures that read 4 tables and a view each, 25 tables
+    graph = DependencyGraph()
+    pipeline = graph.add(PIPELINE, "PL_Big")
+    names = set()
+    for table_index in range(25):
+        names.add(f"dbo.T{table_index}")
+        graph.add(TABLE, f"dbo.T{table_index}")
+    graph.link(PIPELINE, pipeline, "Tables", graph.get(TABLE, "dbo.T0"))
+    for procedure_index in range(12):
+        name = f"dbo.usp_{procedure_index}"
+        names.add(name)
+        procedure = graph.add(STORED_PROCEDURE, name)
+        graph.link(PIPELINE, pipeline, "Stored Procedures", procedure)
+        for offset in range(4):
+            table = graph.get(TABLE, f"dbo.T{(procedure_index * 2 + offset) % 25}")
+            graph.link(STORED_PROCEDURE, procedure, "Tables", table, 2)
+        names.add(f"dbo.v{procedure_index}")
+        view = graph.add(VIEW, f"dbo.v{procedure_index}")
+        graph.link(STORED_PROCEDURE, procedure, "Views", view)
+        graph.link(VIEW, view, "Tables", graph.get(TABLE, f"dbo.T{procedure_index}"))
+    graph.buildIndexes()
+    return graph, pipeline, names
+
+
+def test_every_part_is_within_the_limits_and_nothing_is_lost():
+    graph, pipeline, names = bigPipeline()
+    limits = DiagramLimits(MaxNodes=10, MaxEdges=12, MaxDepth=2)
+    diagrams = MermaidBuilder(graph, limits).build(PIPELINE, pipeline)
+    assert len(diagrams) > 1
+    assert diagrams[0].Name == "PL_Big"
+    assert [diagram.Name for diagram in diagrams[1:]] == [
+        f"PL_Big.part{index}" for index in range(2, len(diagrams) + 1)
+    ]
+
+    drawn = set()
+    for diagram in diagrams:
+        vertices = [VERTEX.match(line) for line in diagram.Lines]
+        vertices = [match.group(1) for match in vertices if match]
+        edges = sum(1 for line in diagram.Lines if EDGE.match(line))
+        assert (diagram.Nodes, diagram.Edges) == (len(vertices), edges)
+        assert diagram.Nodes <= limits.MaxNodes
+        assert diagram.Edges <= limits.MaxEdges
+        drawn.update(vertices)
+    assert names <= drawn
+
+
+def test_small_pipeline_is_one_diagram():
+    graph, pipeline, names = bigPipeline()
+    diagrams = MermaidBuilder(graph, DiagramLimits()).build(PIPELINE, pipeline)
+    assert len(diagrams) == 1
+    assert diagrams[0].Nodes == len(names) + 1
@@ -0,0 +1,123 @@
+from expressions import evaluate, evaluateWith, makeBinding
+from matcher import NameMatcher
+from pipelines import PipelineCatalog, parsePipeline, passParameters
+
+BINDING = makeBinding({"Schema": "etl", "Table": "Orders"}, {"Env": "prod"})
+
+
+def test_plain_text_and_escaping():
+    assert evaluate("dbo.usp_Load", BINDING) == "dbo.usp_Load"
+    assert evaluate("@@concat('a')", BINDING) == "@concat('a')"
+
+
+def test_concat_and_replace():
+    assert evaluate("@concat('a', 'b', 'c')", BINDING) == "abc"
+    assert (
+        evaluate("@replace('usp_X_Load', 'X', 'Orders')", BINDING) == "usp_Orders_Load"
+    )
+    assert evaluate("@concat('it''s', '')", BINDING) == "it's"
+
+
+def test_parameters_and_global_parameters():
+    assert (
+        evaluate("@concat(pipeline().parameters.Schema, '.usp_Load')", BINDING)
+        == "etl.usp_Load"
+    )
+    assert evaluate("@pipeline().globalParameters.Env", BINDING) == "prod"
+    assert evaluate("@pipeline().parameters['Table']", BINDING) == "Orders"
+    assert evaluate("@pipeline()['parameters']['Schema']", BINDING) == "etl"
+
+
+def test_interpolation():
+    assert (
+        evaluate(
+            "SELECT * FROM @{pipeline().parameters.Schema}.@{pipeline().parameters.Table}",
+            BINDING,
+        )
+        == "SELECT * FROM etl.Orders"
+    )
+
+
+def test_unresolved_expressions():
+    assert evaluate("@variables('x')", BINDING) is None
+    assert evaluate("@activity('Lookup').output.value", BINDING) is None
+    assert evaluate("@pipeline().parameters.Missing", BINDING) is None
+    assert evaluate("@concat('a', ", BINDING) is None
+    assert evaluate("SELECT @{variables('x')}", BINDING) is None
+
+
+def test_memo_ignores_parameters_the_expression_doesnt_read():
+    text = "@concat('usp_', pipeline().parameters.System)"
+    evaluateWith.cache_clear()
+    for other in range(10):
+        binding = makeBinding({"System": "Sales", "Other": str(other)}, {})
+        assert evaluate(text, binding) == "usp_Sales"
+    assert evaluateWith.cache_info().misses == 1
+
+
+def executePipeline(pipeline_name: str, parameters: dict) -> dict:
+    return {
+        "name": f"Run {pipeline_name}",
+        "type": "ExecutePipeline",
+        "typeProperties": {
+            "pipeline": {"referenceName": pipeline_name},
+            "parameters": parameters,
+        },
+    }
+
+
+def storedProcedure(name) -> dict:
+    return {
+        "name": "Load",
+        "type": "SqlServerStoredProcedure",
+        "typeProperties": {"storedProcedureName": name},
+    }
+
+
+def test_parameters_are_passed_to_a_child_pipeline():
+    catalog = PipelineCatalog(
+        NameMatcher(["dbo.Orders"]),
+        {"dbo.orders": "dbo.Orders"},
+        {"dbo.usp_Load_Sales", "dbo.usp_Load_Default"},
+    )
+    parent = {
+        "name": "Parent",
+        "properties": {
+            "parameters": {"System": {"type": "String", "defaultValue": "Sales"}},
+            "activities": [
+                executePipeline(
+                    "Child",
+                    {
+                        "System": {
+                            "value": "@pipeline().parameters.System",
+                            "type": "Expression",
+                        }
+                    },
+                )
+            ],
+        },
+    }
+    child = {
+        "name": "Child",
+        "properties": {
+            "parameters": {"System": {"type": "String", "defaultValue": "Default"}},
+            "activities": [
+                storedProcedure(
+                    {
+                        "value": "@concat('dbo.usp_Load_', pipeline().parameters.System)",
+                        "type": "Expression",
+                    }
+                )
+            ],
+        },
+    }
+    results = [
+        parsePipeline(parent, "Parent.json", catalog),
+        parsePipeline(child, "Child.json", catalog),
+    ]
+    assert results[1].StoredProcedures == ["dbo.usp_Load_Default"]
+
+    passed = passParameters(results, catalog)
+    assert passed[1].StoredProcedures == ["dbo.usp_Load_Default", "dbo.usp_Load_Sales"]
+    # the cached result isn't changed
+    assert results[1].StoredProcedures == ["dbo.usp_Load_Default"]
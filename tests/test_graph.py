@@ -0,0 +1,110 @@
+from random import Random
+
+from graph import (
+    PIPELINE,
+    STORED_PROCEDURE,
+    TABLE,
+    VIEW,
+    DependencyGraph,
+    reachableCounts,
+    resolvePipelineOrder,
+)
+
+
+def test_chain_runs_children_first():
+    resolution = resolvePipelineOrder({"A": ["B"], "B": ["C"], "C": []})
+    assert resolution.Order == ["C", "B", "A"]
+    assert resolution.Cycles == []
+    assert resolution.Missing == {}
+
+
+def test_independent_pipelines_keep_their_order():
+    resolution = resolvePipelineOrder({"X": [], "Y": [], "Z": []})
+    assert resolution.Order == ["X", "Y", "Z"]
+
+
+def test_cycle_members_are_reported_and_kept():
+    resolution = resolvePipelineOrder(
+        {"A": ["B"], "B": ["C"], "C": ["A", "D"], "D": [], "E": ["A"], "F": ["F"]}
+    )
+    assert sorted(resolution.Order) == ["A", "B", "C", "D", "E", "F"]
+    assert sorted(sorted(cycle) for cycle in resolution.Cycles) == [
+        ["A", "B", "C"],
+        ["F"],
+    ]
+    cycle = resolution.CycleOf["A"]
+    assert resolution.CycleOf["B"] == resolution.CycleOf["C"] == cycle
+    assert "D" not in resolution.CycleOf and "E" not in resolution.CycleOf
+    # whatever a pipeline runs outside its own cycle still comes before it
+    order = resolution.Order.index
+    assert order("D") < order("A")
+    assert max(order("A"), order("B"), order("C")) < order("E")
+
+
+def test_missing_pipeline_is_reported():
+    resolution = resolvePipelineOrder({"A": ["B", "Gone", "Gone"], "B": []})
+    assert resolution.Order == ["B", "A"]
+    assert resolution.Missing == {"A": ["Gone"]}
+    assert resolution.Cycles == []
+
+
+def closureGraph() -> DependencyGraph:
+    # P runs S, S reads V1 and T3, V1 and V2 read each other, V1 reads T1 and V2 reads
+    # the missing T2, nothing reads T4
+    graph = DependencyGraph()
+    t1, t3 = graph.add(TABLE, "dbo.T1"), graph.add(TABLE, "dbo.T3")
+    t2 = graph.add(TABLE, "dbo.T2", missing=True)
+    graph.add(TABLE, "dbo.T4")
+    v1, v2 = graph.add(VIEW, "dbo.V1"), graph.add(VIEW, "dbo.V2")
+    s = graph.add(STORED_PROCEDURE, "dbo.S")
+    p = graph.add(PIPELINE, "P")
+    graph.link(VIEW, v1, "Views", v2)
+    graph.link(VIEW, v2, "Views", v1)
+    graph.link(VIEW, v1, "Tables", t1)
+    graph.link(VIEW, v2, "Tables", t2)
+    graph.link(STORED_PROCEDURE, s, "Views", v1)
+    graph.link(STORED_PROCEDURE, s, "Tables", t3, 3)
+    graph.link(PIPELINE, p, "Stored Procedures", s)
+    return graph
+
+
+def test_closure_counts():
+    graph = closureGraph()
+    downstream, upstream = graph.closureCounts()
+
+    def counts(per_kind, kind: str, *names: str) -> list[int]:
+        return [per_kind[kind][graph.get(kind, name)] for name in names]
+
+    tables = ("dbo.T1", "dbo.T2", "dbo.T3", "dbo.T4")
+    # the missing T2 isn't counted, an object in a cycle doesn't count itself
+    assert counts(downstream, TABLE, *tables) == [0, 0, 0, 0]
+    assert counts(downstream, VIEW, "dbo.V1", "dbo.V2") == [2, 2]
+    assert counts(downstream, STORED_PROCEDURE, "dbo.S") == [4]
+    assert counts(downstream, PIPELINE, "P") == [5]
+
+    assert counts(upstream, TABLE, *tables) == [4, 4, 2, 0]
+    assert counts(upstream, VIEW, "dbo.V1", "dbo.V2") == [3, 3]
+    assert counts(upstream, STORED_PROCEDURE, "dbo.S") == [1]
+    assert counts(upstream, PIPELINE, "P") == [0]
+
+
+def test_reachable_counts_match_a_search_from_every_node():
+    random = Random(16)
+    size = 300
+    successors = [
+        random.sample(range(size), random.choice([0, 1, 2, 3])) for _ in range(size)
+    ]
+    counted = [random.random() > 0.1 for _ in range(size)]
+
+    def search(start: int) -> int:
+        seen, stack = set(), [start]
+        while stack:
+            for child in successors[stack.pop()]:
+                if child not in seen:
+                    seen.add(child)
+                    stack.append(child)
+        return sum(1 for node in seen - {start} if counted[node])
+
+    assert reachableCounts(successors, counted) == [
+        search(node) for node in range(size)
+    ]
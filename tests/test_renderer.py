@@ -0,0 +1,65 @@
+import os
+import sys
+
+import pytest
+
+import engine
+from renderer import MermaidRenderer, RendererProcess
+
+# answers like render-server.mjs, but hangs on a definition that says so
+FAKE_SERVER = """
+import json, sys, time
+print(json.dumps({"ready": True}), flush=True)
+for line in sys.stdin:
+    request = json.loads(line)
+    if request["definition"] == "hang":
+        time.sleep(60)
+    print(json.dumps({"id": request["id"], "ok": True}), flush=True)
+"""
+
+HANGING_START = "import time; time.sleep(60)"
+
+
+def test_a_hanging_renderer_fails_the_diagram_and_restarts():
+    process = RendererProcess([sys.executable, "-c", FAKE_SERVER], timeout=0.5)
+    try:
+        assert process.render(1, "graph TD", "a.pdf").Ok
+        result = process.render(2, "hang", "b.pdf")
+        assert not result.Ok
+        assert result.RendererFailed
+        assert process.process is None
+
+        assert process.render(3, "graph TD", "c.pdf").Ok
+        assert process.starts == 2
+    finally:
+        process.close()
+
+
+def test_a_renderer_that_never_starts_is_killed():
+    with pytest.raises(RuntimeError, match="didn't answer"):
+        MermaidRenderer([sys.executable, "-c", HANGING_START], 1, 0.5)
+
+
+def test_a_renderer_that_failed_to_start_is_not_started_again(tmp_path, monkeypatch):
+    data_dir = os.path.join(os.path.dirname(__file__), "..", "data")
+    monkeypatch.chdir(tmp_path)
+    starts = []
+    monkeypatch.setattr(engine.shutil, "which", lambda command: command)
+    monkeypatch.setattr(
+        engine, "startRenderer", lambda *arguments: starts.append(arguments)
+    )
+    analysis = engine.Engine(
+        engine.Config(
+            OutputDir="renderer",
+            PipelineDir=os.path.abspath(os.path.join(data_dir, "ADF_example")),
+            MssqlDataDir=os.path.abspath(os.path.join(data_dir, "MSSQL_example")),
+            PipelineWorkers=1,
+            Cache=False,
+        )
+    )
+    analysis.countReferences()
+    analysis.analyzePipelines(fetch=False)
+    for _ in range(2):
+        assert analysis.prepareExport() is not None
+        assert analysis.renderer is None
+    assert len(starts) == 1
@@ -0,0 +1,62 @@
+import pytest
+
+import report
+from engine import Config, EngineError, configFromEnvironment
+
+
+class StubRenderer:
+    def __init__(self, processes: int):
+        self.processes = processes
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def test_threads_share_one_renderer(monkeypatch):
+    started = []
+    used = []
+
+    def startRenderer(processes, config_file, timeout):
+        started.append(StubRenderer(processes))
+        return started[-1]
+
+    def runEngine(config, name_indexes, renderer):
+        used.append(renderer)
+        return config.OutputDir
+
+    monkeypatch.setattr(report.shutil, "which", lambda command: command)
+    monkeypatch.setattr(report, "startRenderer", startRenderer)
+    monkeypatch.setattr(report, "runEngine", runEngine)
+    configs = [
+        Config(OutputDir="a", PipelineDir="", MssqlDataDir="", MermaidRenderers=2),
+        Config(OutputDir="b", PipelineDir="", MssqlDataDir="", MermaidRenderers=3),
+    ]
+    report.runConcurrently(configs, processes=False)
+    assert len(started) == 1
+    assert started[0].processes == 3
+    assert used == [started[0], started[0]]
+    assert started[0].closed
+
+
+def test_different_mermaid_configs_start_their_own():
+    configs = [
+        Config(OutputDir="a", PipelineDir="", MssqlDataDir="", MermaidConfig="a.json"),
+        Config(OutputDir="b", PipelineDir="", MssqlDataDir="", MermaidConfig="b.json"),
+    ]
+    assert report.sharedRenderer(configs) is None
+
+
+def test_profiling_threads_is_rejected():
+    configs = [
+        Config(OutputDir="a", PipelineDir="", MssqlDataDir="", Profile="cprofile"),
+        Config(OutputDir="b", PipelineDir="", MssqlDataDir=""),
+    ]
+    with pytest.raises(EngineError, match="PROFILE needs --processes"):
+        report.runConcurrently(configs, processes=False)
+
+
+def test_a_bad_number_is_an_engine_error():
+    environment = {"OUTPUT_DIR": "a", "PIPELINE_DIR": "p", "MERMAID_RENDERERS": "two"}
+    with pytest.raises(EngineError, match="MERMAID_RENDERERS must be a number"):
+        configFromEnvironment(environment)
@@ -0,0 +1,75 @@
+from graph import PIPELINE, STORED_PROCEDURE, TABLE, VIEW, DependencyGraph
+from snapshot import diffSnapshots, loadSnapshot, printDiff, writeSnapshot
+
+
+def oldGraph() -> DependencyGraph:
+    graph = DependencyGraph()
+    orders, customers = graph.add(TABLE, "dbo.Orders"), graph.add(
+        TABLE, "dbo.Customers"
+    )
+    view = graph.add(VIEW, "dbo.vOrders")
+    graph.hashes[VIEW][view] = "a"
+    load = graph.add(STORED_PROCEDURE, "dbo.usp_Load")
+    graph.link(VIEW, view, "Tables", orders)
+    graph.link(STORED_PROCEDURE, load, "Tables", customers, 2)
+    graph.link(STORED_PROCEDURE, load, "Views", view)
+    graph.link(PIPELINE, graph.add(PIPELINE, "PL_Load"), "Stored Procedures", load)
+    return graph
+
+
+def snapshot(graph: DependencyGraph, path):
+    writeSnapshot(graph, str(path))
+    return loadSnapshot(str(path))
+
+
+def test_added_removed_and_changed(tmp_path):
+    old = snapshot(oldGraph(), tmp_path / "old.json.gz")
+
+    # read in another order, so the IDs differ from the old run's
+    graph = DependencyGraph()
+    invoices = graph.add(TABLE, "dbo.Invoices")
+    customers, orders = graph.add(TABLE, "dbo.Customers"), graph.add(
+        TABLE, "dbo.Orders"
+    )
+    load = graph.add(STORED_PROCEDURE, "dbo.usp_Load")
+    view = graph.add(VIEW, "dbo.vOrders")
+    graph.hashes[VIEW][view] = "b"
+    graph.link(VIEW, view, "Tables", orders)
+    graph.link(STORED_PROCEDURE, load, "Tables", customers, 5)
+    graph.link(STORED_PROCEDURE, load, "Tables", invoices)
+    graph.link(PIPELINE, graph.add(PIPELINE, "PL_Load"), "Stored Procedures", load)
+    new = snapshot(graph, tmp_path / "new.json.gz")
+
+    diff = diffSnapshots(old, new)
+    assert diff.AddedObjects == [(TABLE, "dbo.Invoices")]
+    assert diff.RemovedObjects == []
+    assert diff.ChangedObjects == [(VIEW, "dbo.vOrders", "definition changed")]
+    assert diff.AddedEdges == [
+        ("stored_procedure.Tables", "dbo.usp_Load", "dbo.Invoices", 1)
+    ]
+    assert diff.RemovedEdges == [
+        ("stored_procedure.Views", "dbo.usp_Load", "dbo.vOrders", 1)
+    ]
+    assert diff.CountChanges == [
+        ("stored_procedure.Tables", "dbo.usp_Load", "dbo.Customers", 2, 5)
+    ]
+    assert diff.Totals[TABLE] == (2, 3)
+    assert diff.Totals["stored_procedure.Tables"] == (1, 2)
+    assert diff.Totals["view.Tables"] == (1, 1)
+
+
+def test_unchanged_totals_print_no_header(tmp_path, capsys):
+    old = snapshot(oldGraph(), tmp_path / "old.json.gz")
+    graph = oldGraph()
+    graph.relations[(STORED_PROCEDURE, "Tables")].counts[0] = 3
+    new = snapshot(graph, tmp_path / "new.json.gz")
+
+    diff = diffSnapshots(old, new)
+    assert diff.CountChanges == [
+        ("stored_procedure.Tables", "dbo.usp_Load", "dbo.Customers", 2, 3)
+    ]
+    printDiff(diff)
+    assert "Totals:" not in capsys.readouterr().out
+
+    printDiff(diffSnapshots(new, snapshot(DependencyGraph(), tmp_path / "empty.gz")))
+    assert "Totals:" in capsys.readouterr().out
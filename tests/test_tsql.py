@@ -0,0 +1,41 @@
+from tsql import extractNames, iterNames
+
+
+def names(sql):
+    return [parts for parts, _ in iterNames(sql)]
+
+
+def test_comma_separated_from_list():
+    assert names("SELECT * FROM a, b") == [("a",), ("b",)]
+    assert names("SELECT * FROM dbo.a, b JOIN c ON c.x = b.x") == [
+        ("dbo", "a"),
+        ("b",),
+        ("c",),
+        ("c", "x"),
+        ("b", "x"),
+    ]
+
+
+def test_aliases_keep_the_from_list():
+    assert names("SELECT * FROM a x, b AS y, [c] WHERE x.id = y.id") == [
+        ("a",),
+        ("b",),
+        ("c",),
+        ("x", "id"),
+        ("y", "id"),
+    ]
+
+
+def test_commas_outside_a_from_list():
+    assert names("SELECT a, b FROM t") == [("t",)]
+    assert names("SELECT * FROM t ORDER BY a, b") == [("t",)]
+    assert names("SELECT * FROM t WHERE a IN (x, y)") == [("t",)]
+    assert names("INSERT t (a, b) SELECT c, d FROM s") == [("t",), ("s",)]
+    assert names("UPDATE t SET a = 1, b = 2") == [("t",)]
+
+
+def test_extract_names_counts():
+    assert extractNames("SELECT * FROM a, a; EXEC dbo.p") == {
+        ("a",): 2,
+        ("dbo", "p"): 1,
+    }
@@ -0,0 +1,210 @@
+import re
+from typing import Iterator
+
+DEFAULT_SCHEMA = "dbo"
+
+# Keywords after which a single, unqualified name is an object and not a column or alias
+OBJECT_KEYWORDS = {
+    "from",
+    "join",
+    "into",
+    "update",
+    "insert",
+    "delete",
+    "table",
+    "exec",
+    "execute",
+    "merge",
+    "using",
+}
+
+# Keywords that end a FROM a, b, ... list, a word that isn't one is an alias
+CLAUSE_KEYWORDS = {
+    "where",
+    "on",
+    "group",
+    "order",
+    "having",
+    "union",
+    "except",
+    "intersect",
+    "select",
+    "set",
+    "values",
+    "output",
+    "option",
+    "for",
+    "with",
+    "inner",
+    "left",
+    "right",
+    "full",
+    "cross",
+    "outer",
+    "apply",
+    "pivot",
+    "unpivot",
+    "when",
+    "then",
+    "else",
+    "end",
+    "begin",
+    "if",
+    "while",
+    "return",
+    "declare",
+}
+
+TOKEN_PATTERN = re.compile(
+    r"""
+    (?P<space>\s+)
+    |(?P<comment>--[^\r\n]*)
+    |(?P<block>/\*)
+    |(?P<string>N?'[^']*(?:''[^']*)*(?:'|\Z))
+    |(?P<bracket>\[[^\]]*(?:\]\][^\]]*)*(?:\]|\Z))
+    |(?P<quoted>"[^"]*(?:""[^"]*)*(?:"|\Z))
+    |(?P<word>(?:[^\W\d]|[@\#])[\w@\#$]*)
+    |(?P<number>\d+(?:\.\d*)?(?:[eE][+-]?\d+)?)
+    |(?P<dot>\.)
+    |(?P<other>.)
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+BLOCK_COMMENT_PATTERN = re.compile(r"/\*|\*/")
+
+IDENTIFIER = "identifier"
+KEYWORD_CANDIDATE = "word"
+DOT = "dot"
+OTHER = "other"
+
+
+def skipBlockComment(sql: str, position: int) -> int:
+    # T-SQL block comments nest, so count the depth instead of finding the first */
+    depth = 1
+    while depth > 0:
+        match = BLOCK_COMMENT_PATTERN.search(sql, position)
+        if match is None:
+            return len(sql)
+        depth += 1 if match.group() == "/*" else -1
+        position = match.end()
+    return position
+
+
+def tokenize(sql: str) -> Iterator[tuple[str, str, int]]:
+    """
+    Single pass over the SQL text yielding (kind, value, position the token starts at).
+    Comments and literals are dropped, [bracketed] and "quoted" identifiers are unwrapped.
+    """
+    position = 0
+    length = len(sql)
+    match_token = TOKEN_PATTERN.match
+    while position < length:
+        match = match_token(sql, position)
+        kind = match.lastgroup
+        value = match.group()
+        start = position
+        position = match.end()
+        if kind == "space" or kind == "comment":
+            continue
+        elif kind == "block":
+            position = skipBlockComment(sql, position)
+        elif kind == "string" or kind == "number":
+            yield OTHER, "", start
+        elif kind == "bracket":
+            yield IDENTIFIER, value[1:].removesuffix("]").replace("]]", "]"), start
+        elif kind == "quoted":
+            yield IDENTIFIER, value[1:].removesuffix('"').replace('""', '"'), start
+        elif kind == "word":
+            yield KEYWORD_CANDIDATE, value, start
+        elif kind == "dot":
+            yield DOT, value, start
+        else:
+            yield OTHER, value, start
+
+
+def extractNames(sql: str) -> dict[tuple[str, ...], int]:
+    """
+    Group identifiers into multi-part names, ex. [db].dbo."orders" -> ("db", "dbo", "orders").
+    Every multi-part name is kept, single part names only when they follow an object keyword.
+    Returns {lowercased parts: occurrences}.
+    """
+    names: dict[tuple[str, ...], int] = {}
+    for name, _ in iterNames(sql):
+        names[name] = names.get(name, 0) + 1
+    return names
+
+
+def iterNames(sql: str) -> Iterator[tuple[tuple[str, ...], int]]:
+    # the names extractNames() counts, in order, with the position each one starts at
+    parts: list[str] = []
+    start = 0
+    expecting_part = False
+    in_object_context = False
+    previous_word = ""
+    in_from_list = False  # a name after a comma of FROM a, b is an object too
+
+    for kind, value, position in tokenize(sql):
+        if kind == DOT:
+            if not parts:
+                previous_word = ""
+                continue
+            if expecting_part:
+                parts.append("")  # db..table uses the default schema
+            expecting_part = True
+            continue
+
+        if kind == OTHER:
+            if len(parts) > 1 or (parts and in_object_context):
+                yield tuple(parts), start
+            parts = []
+            expecting_part = False
+            in_from_list = in_from_list and value == ","
+            previous_word = "from" if in_from_list else ""
+            continue
+
+        # identifier or word
+        if expecting_part:
+            parts.append(value.lower())
+            expecting_part = False
+            previous_word = ""
+            continue
+
+        if len(parts) > 1 or (parts and in_object_context):
+            yield tuple(parts), start
+        in_object_context = previous_word in OBJECT_KEYWORDS
+        if in_object_context and previous_word == "from":
+            in_from_list = True
+        previous_word = value.lower() if kind == KEYWORD_CANDIDATE else ""
+        if previous_word in OBJECT_KEYWORDS or previous_word in CLAUSE_KEYWORDS:
+            in_from_list = False
+        if value.startswith("@"):
+            parts = []  # variables are never objects
+        else:
+            parts = [value.lower()]
+            start = position
+    if len(parts) > 1 or (parts and in_object_context):
+        yield tuple(parts), start
+
+
+def qualifiedCandidates(parts: tuple[str, ...]) -> tuple[str, ...]:
+    """
+    Possible schema.object readings of a multi-part name, most likely first.
+    A trailing part can be a column, so a.b.c is either db.schema.object or schema.object.column.
+    """
+
+    def qualify(schema: str, name: str) -> str:
+        return f"{schema or DEFAULT_SCHEMA}.{name}"
+
+    match len(parts):
+        case 1:
+            return (qualify(DEFAULT_SCHEMA, parts[0]),)
+        case 2:
+            return (qualify(parts[0], parts[1]),)
+        case 3:
+            return (qualify(parts[1], parts[2]), qualify(parts[0], parts[1]))
+        case 4:
+            return (qualify(parts[2], parts[3]), qualify(parts[1], parts[2]))
+        case 5:
+            return (qualify(parts[2], parts[3]),)
+    return ()
@@ -0,0 +1,54 @@
+import os
+import time
+from typing import Callable
+
+# once a change is seen, polls this often until the files stop changing
+SETTLE_SECONDS = 0.1
+
+
+def fileState(path: str) -> tuple[int, int] | None:
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class PollingWatcher:
+    """
+    Polls the modification time and size of every file list_files() returns, so it works the
+    same everywhere without OS specific notification APIs. list_files() is called on every
+    poll, new files are picked up and deleted files reported as changed.
+    """
+
+    def __init__(self, list_files: Callable[[], list[str]], interval: float):
+        self.list_files = list_files
+        self.interval = interval
+        self.states = self.scan()
+
+    def scan(self) -> dict[str, tuple[int, int] | None]:
+        return {path: fileState(path) for path in self.list_files()}
+
+    def poll(self) -> set[str]:
+        states = self.scan()
+        changed = {
+            path
+            for path in states.keys() | self.states.keys()
+            if states.get(path) != self.states.get(path)
+        }
+        self.states = states
+        return changed
+
+    def wait(self) -> list[str]:
+        # blocks until something changed, then until a poll comes back clean so files
+        # that are still being written (a git checkout, a CSV export) are read once
+        changed = set()
+        while len(changed) == 0:
+            time.sleep(self.interval)
+            changed = self.poll()
+        while True:
+            time.sleep(SETTLE_SECONDS)
+            more = self.poll()
+            if len(more) == 0:
+                return sorted(changed)
+            changed |= more